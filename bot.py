@@ -6,12 +6,13 @@ Description:
 Version: 6.4.0
 """
 
+import asyncio
 import json
-import logging
 import os
 import platform
 import random
 import sys
+import time
 
 import aiosqlite
 import discord
@@ -19,7 +20,17 @@ from discord.ext import commands, tasks
 from discord.ext.commands import Context
 from dotenv import load_dotenv
 
-from database import DatabaseManager
+from database import SCHEMA_VERSION, DatabaseManager, ensure_schema
+from database.journal import JournaledQueueManager, QueueJournal
+from database.memory import MemoryDatabaseManager
+from database.remote import RemoteDatabaseManager, cluster_storage_problem
+from database.sharding import ShardedDatabaseManager
+from helpers.admission import AdmissionController, AdmissionRejected
+from helpers.command_sync import sync_commands
+from helpers.deferral import LatencyBudget
+from helpers.logger import setup_logging
+from helpers.metrics import MetricsRegistry, MetricsServer, http_trace_config, instrument
+from helpers.watchdog import LoopWatchdog
 
 load_dotenv()
 
@@ -66,64 +77,37 @@ If you want to use prefix commands, make sure to also enable the intent below in
 """
 # intents.message_content = True
 
-# Setup both of the loggers
-
-
-class LoggingFormatter(logging.Formatter):
-    # Colors
-    black = "\x1b[30m"
-    red = "\x1b[31m"
-    green = "\x1b[32m"
-    yellow = "\x1b[33m"
-    blue = "\x1b[34m"
-    gray = "\x1b[38m"
-    # Styles
-    reset = "\x1b[0m"
-    bold = "\x1b[1m"
-
-    COLORS = {
-        logging.DEBUG: gray + bold,
-        logging.INFO: blue + bold,
-        logging.WARNING: yellow + bold,
-        logging.ERROR: red,
-        logging.CRITICAL: red + bold,
-    }
-
-    def format(self, record):
-        log_color = self.COLORS[record.levelno]
-        format = "(black){asctime}(reset) (levelcolor){levelname:<8}(reset) (green){name}(reset) {message}"
-        format = format.replace("(black)", self.black + self.bold)
-        format = format.replace("(reset)", self.reset)
-        format = format.replace("(levelcolor)", log_color)
-        format = format.replace("(green)", self.green + self.bold)
-        formatter = logging.Formatter(format, "%Y-%m-%d %H:%M:%S", style="{")
-        return formatter.format(record)
-
-
-logger = logging.getLogger("discord_bot")
-logger.setLevel(logging.INFO)
-
-# Console handler
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(LoggingFormatter())
-# File handler
-file_handler = logging.FileHandler(filename="discord.log", encoding="utf-8", mode="w")
-file_handler_formatter = logging.Formatter(
-    "[{asctime}] [{levelname:<8}] {name}: {message}", "%Y-%m-%d %H:%M:%S", style="{"
+"""
+Sharding: set `SHARD_COUNT` (and optionally `SHARD_IDS`, comma-separated) or `SHARDED=true` to let
+discord.py pick the shard count. The bot then runs as an `AutoShardedBot`, with one websocket per shard.
+"""
+SHARD_COUNT = int(os.getenv("SHARD_COUNT")) if os.getenv("SHARD_COUNT") else None
+SHARD_IDS = (
+    [int(shard_id) for shard_id in os.getenv("SHARD_IDS").split(",")]
+    if os.getenv("SHARD_IDS")
+    else None
+)
+SHARDED = (
+    SHARD_COUNT is not None
+    or SHARD_IDS is not None
+    or os.getenv("SHARDED", "").lower() in ("1", "true", "yes")
 )
-file_handler.setFormatter(file_handler_formatter)
+BotBase = commands.AutoShardedBot if SHARDED else commands.Bot
 
-# Add the handlers
-logger.addHandler(console_handler)
-logger.addHandler(file_handler)
+# Setup the logger, records are written to the console and files by a background thread
+logger, log_listener = setup_logging()
 
 
-class DiscordBot(commands.Bot):
+class DiscordBot(BotBase):
     def __init__(self) -> None:
+        shard_options = (
+            {"shard_count": SHARD_COUNT, "shard_ids": SHARD_IDS} if SHARDED else {}
+        )
         super().__init__(
             command_prefix=commands.when_mentioned_or(os.getenv("PREFIX")),
             intents=intents,
             help_command=None,
+            **shard_options,
         )
         """
         This creates custom bot variables so that we can access these variables in cogs more easily.
@@ -137,34 +121,267 @@ class DiscordBot(commands.Bot):
         self.database = None
         self.bot_prefix = os.getenv("PREFIX")
         self.invite_link = os.getenv("INVITE_LINK")
+        self.sharded = SHARDED
+        self.ready_shards = set()
+        self.metrics = MetricsRegistry()
+        self.metrics_server = None
+        self.register_metrics()
+        self.http_trace_configs = [http_trace_config(self.http_request_duration)]
+        # discord.py creates its REST session at login, so tracing it from here still
+        # covers every Discord API call.
+        self.http.http_trace = self.http_trace_configs[0]
+        self.watchdog = LoopWatchdog(
+            logger=self.logger,
+            interval=float(os.getenv("LOOP_WATCHDOG_INTERVAL", "0.5")),
+            threshold=float(os.getenv("LOOP_WATCHDOG_THRESHOLD", "0.25")),
+            lag_histogram=self.loop_lag,
+            stall_counter=self.loop_stalls,
+        )
+        self.admission = AdmissionController(
+            user_rate=float(os.getenv("ADMISSION_USER_RATE", "1")),
+            user_burst=float(os.getenv("ADMISSION_USER_BURST", "5")),
+            guild_concurrency=int(os.getenv("ADMISSION_GUILD_CONCURRENCY", "20")),
+            global_concurrency=int(os.getenv("ADMISSION_GLOBAL_CONCURRENCY", "50")),
+            reserve=float(os.getenv("ADMISSION_RESERVE", "1")),
+            rejections=self.admission_rejections,
+        )
+        self.latency_budget = LatencyBudget(
+            margin=float(os.getenv("AUTO_DEFER_MARGIN", "0.5")),
+            deferrals=self.command_deferrals,
+            remaining=self.interaction_budget,
+        )
+        self.before_invoke(self.latency_budget.before_invoke)
 
-    async def init_db(self) -> None:
-        async with aiosqlite.connect(
-            f"{os.path.realpath(os.path.dirname(__file__))}/database/database.db"
-        ) as db:
-            await db.execute("PRAGMA foreign_keys = ON")
-            with open(
-                f"{os.path.realpath(os.path.dirname(__file__))}/database/schema.sql",
-                encoding = "utf-8"
-            ) as file:
-                await db.executescript(file.read())
-            await db.commit()
+    def register_metrics(self) -> None:
+        """
+        Create the metrics the bot records. They are exposed over HTTP when `METRICS_PORT` is set.
+        """
+        self.command_invocations = self.metrics.counter(
+            "discord_bot_command_invocations_total",
+            "Commands invoked, by command name.",
+            ("command",),
+        )
+        self.command_duration = self.metrics.histogram(
+            "discord_bot_command_duration_seconds",
+            "Time from invocation to successful completion, by command name.",
+            ("command",),
+        )
+        self.command_errors = self.metrics.counter(
+            "discord_bot_command_errors_total",
+            "Errors raised by commands, by command name and error type.",
+            ("command", "error"),
+        )
+        self.database_duration = self.metrics.histogram(
+            "discord_bot_database_call_duration_seconds",
+            "Time spent in DatabaseManager calls, by method.",
+            ("method",),
+        )
+        self.http_request_duration = self.metrics.histogram(
+            "discord_bot_http_request_duration_seconds",
+            "Outbound HTTP request time, by host, method and status.",
+            ("host", "method", "status"),
+        )
+        self.gateway_latency = self.metrics.gauge(
+            "discord_bot_gateway_latency_seconds",
+            "Websocket heartbeat latency.",
+        )
+        self.guild_count = self.metrics.gauge(
+            "discord_bot_guilds",
+            "Number of guilds the bot is in.",
+        )
+        self.shard_latency = self.metrics.gauge(
+            "discord_bot_shard_latency_seconds",
+            "Websocket heartbeat latency, by shard.",
+            ("shard",),
+        )
+        self.shard_ready = self.metrics.gauge(
+            "discord_bot_shard_ready",
+            "Whether a shard is connected and ready (1) or not (0).",
+            ("shard",),
+        )
+        self.queue_size = self.metrics.gauge(
+            "discord_bot_queue_size",
+            "Buyers waiting in the queue, by event ID.",
+            ("event_id",),
+        )
+        self.loop_lag = self.metrics.histogram(
+            "discord_bot_event_loop_lag_seconds",
+            "How late the event loop runs a scheduled callback.",
+        )
+        self.loop_stalls = self.metrics.counter(
+            "discord_bot_event_loop_stalls_total",
+            "Times the event loop was blocked for longer than the watchdog threshold.",
+        )
+        self.command_deferrals = self.metrics.counter(
+            "discord_bot_command_auto_deferrals_total",
+            "Slash commands deferred because they were not expected to answer in time, by command name.",
+            ("command",),
+        )
+        self.interaction_budget = self.metrics.histogram(
+            "discord_bot_interaction_budget_remaining_seconds",
+            "Time left before the acknowledgement deadline when a slash command starts, by command name.",
+            ("command",),
+            buckets=(0.25, 0.5, 1.0, 1.5, 2.0, 2.5, 2.75, 3.0),
+        )
+        self.background_task_errors = self.metrics.counter(
+            "discord_bot_background_task_errors_total",
+            "Background tasks that raised, by task group and task name.",
+            ("group", "task"),
+        )
+        self.admission_rejections = self.metrics.counter(
+            "discord_bot_admission_rejections_total",
+            "Commands shed by admission control, by reason.",
+            ("reason",),
+        )
+        self.admission_in_flight = self.metrics.gauge(
+            "discord_bot_admission_in_flight",
+            "Commands currently admitted and running.",
+        )
+        self.admission_waiting = self.metrics.gauge(
+            "discord_bot_admission_waiting",
+            "Commands waiting for a global admission slot.",
+        )
+        self.metrics.add_collector(self.collect_metrics)
+
+    async def collect_metrics(self) -> None:
+        """
+        Refresh the gauges that are sampled at scrape time rather than on the hot path.
+        """
+        if self.latency == self.latency and self.latency != float("inf"):
+            self.gateway_latency.set(self.latency)
+        self.guild_count.set(len(self.guilds))
+        latencies = dict(self.shard_latencies())
+        for shard_id in set(latencies) | self.ready_shards:
+            latency = latencies.get(shard_id)
+            if latency is not None and latency == latency and latency != float("inf"):
+                self.shard_latency.set(latency, shard_id)
+            self.shard_ready.set(1 if shard_id in self.ready_shards else 0, shard_id)
+        self.admission_in_flight.set(self.admission.in_flight)
+        self.admission_waiting.set(self.admission.global_limiter.waiting)
+        if self.database is not None:
+            self.queue_size.clear()
+            for event_id, size in (await self.database.queue_sizes()).items():
+                self.queue_size.set(size, event_id)
+
+    def shard_latencies(self) -> list:
+        """
+        Return `(shard_id, latency)` for every shard run by this process, shard 0 when not sharded.
+        """
+        if self.sharded:
+            return self.latencies
+        return [(0, self.latency)]
+
+    def cache_sizes(self) -> dict:
+        """
+        Return the number of entries held by the bot's in-memory caches.
+        """
+        return {
+            "guilds": len(self.guilds),
+            "members": sum(guild.member_count or 0 for guild in self.guilds),
+            "cached_members": sum(len(guild.members) for guild in self.guilds),
+            "users": len(self.users),
+            "messages": len(self.cached_messages),
+            "emojis": len(self.emojis),
+            "private_channels": len(self.private_channels),
+        }
+
+    async def start_metrics_server(self) -> None:
+        port = os.getenv("METRICS_PORT")
+        if not port:
+            return
+        host = os.getenv("METRICS_HOST", "127.0.0.1")
+        self.metrics_server = MetricsServer(self.metrics, host=host, port=int(port))
+        await self.metrics_server.start()
+        self.logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+
+    async def open_database(self) -> None:
+        """
+        Open the storage used by the cogs.
+
+        When `DATABASE_SOCKET` is set the bot runs as a cluster worker: reads use a local
+        connection and writes are sent to the database owner process listening on that socket.
+        When `DATABASE_SHARDS` is set, guilds are spread over that many database files instead.
+        `DATABASE_BACKEND=memory` keeps everything in memory, snapshotted to `DATABASE_SNAPSHOT`.
+        `QUEUE_ENGINE=journal` serves the buyer queues from an append-only journal on top of any of these.
+        """
+        root = os.path.realpath(os.path.dirname(__file__))
+        socket_path = os.getenv("DATABASE_SOCKET")
+        if socket_path:
+            problem = cluster_storage_problem(os.environ)
+            if problem:
+                raise RuntimeError(problem)
+        shards = int(os.getenv("DATABASE_SHARDS") or 0)
+        if os.getenv("DATABASE_BACKEND", "sqlite").lower() == "memory":
+            self.database = MemoryDatabaseManager(
+                snapshot_path=os.getenv("DATABASE_SNAPSHOT")
+            )
+            self.database.start_autosave(
+                float(os.getenv("DATABASE_SNAPSHOT_INTERVAL", "60"))
+            )
+        elif shards > 1 and not socket_path:
+            self.database = ShardedDatabaseManager(
+                directory=os.getenv("DATABASE_SHARD_DIR", f"{root}/database/shards"),
+                shards=shards,
+                max_open=int(os.getenv("DATABASE_MAX_OPEN_SHARDS", "16")),
+            )
+        elif socket_path:
+            # In cluster mode the database owner process applies the schema.
+            self.database = RemoteDatabaseManager(
+                connection=await aiosqlite.connect(f"{root}/database/database.db"),
+                socket_path=socket_path,
+            )
+            await self.database.connect()
+        else:
+            connection = await aiosqlite.connect(f"{root}/database/database.db")
+            if await ensure_schema(connection):
+                self.logger.info(f"Applied database schema version {SCHEMA_VERSION}")
+            self.database = DatabaseManager(connection=connection)
+        await self.database.enable_foreign_keys()
+
+        if os.getenv("QUEUE_ENGINE", "sqlite").lower() == "journal":
+            journal = QueueJournal(
+                os.getenv("QUEUE_JOURNAL_DIR", f"{root}/database/journal"),
+                flush_interval=float(os.getenv("QUEUE_FSYNC_INTERVAL", "0.005")),
+                snapshot_every=int(os.getenv("QUEUE_SNAPSHOT_EVERY", "100000")),
+            )
+            await journal.open()
+            self.database = JournaledQueueManager(self.database, journal)
+
+    async def sync_commands_on_start(self) -> None:
+        """
+        Sync the global slash commands if they changed since the last sync.
+        """
+        try:
+            synced = await sync_commands(self)
+        except discord.HTTPException as e:
+            self.logger.error(f"Failed to sync slash commands\n{type(e).__name__}: {e}")
+            return
+        if synced:
+            self.logger.info("Synchronized the global slash commands")
+        else:
+            self.logger.info("Global slash commands are up to date, skipped syncing")
 
     async def load_cogs(self) -> None:
         """
         The code in this function is executed whenever the bot will start.
+
+        Cogs are loaded concurrently with each other and with the database being opened, so their
+        `setup` functions must not depend on another cog or use `self.database`.
         """
-        for file in os.listdir(f"{os.path.realpath(os.path.dirname(__file__))}/cogs"):
-            if file.endswith(".py"):
-                extension = file[:-3]
-                try:
-                    await self.load_extension(f"cogs.{extension}")
-                    self.logger.info(f"Loaded extension '{extension}'")
-                except Exception as e:
-                    exception = f"{type(e).__name__}: {e}"
-                    self.logger.error(
-                        f"Failed to load extension {extension}\n{exception}"
-                    )
+        extensions = sorted(
+            file[:-3]
+            for file in os.listdir(f"{os.path.realpath(os.path.dirname(__file__))}/cogs")
+            if file.endswith(".py")
+        )
+        await asyncio.gather(*(self.load_cog(extension) for extension in extensions))
+
+    async def load_cog(self, extension: str) -> None:
+        try:
+            await self.load_extension(f"cogs.{extension}")
+            self.logger.info(f"Loaded extension '{extension}'")
+        except Exception as e:
+            exception = f"{type(e).__name__}: {e}"
+            self.logger.error(f"Failed to load extension {extension}\n{exception}")
 
     @tasks.loop(minutes=1.0)
     async def status_task(self) -> None:
@@ -172,7 +389,14 @@ class DiscordBot(commands.Bot):
         Setup the game status task of the bot.
         """
         statuses = ["with you!", "with Krypton!", "with humans!"]
-        await self.change_presence(activity=discord.Game(random.choice(statuses)))
+        if not self.sharded:
+            await self.change_presence(activity=discord.Game(random.choice(statuses)))
+            return
+        # Only update shards that are connected, a presence update on a reconnecting shard would fail.
+        for shard_id in sorted(self.ready_shards):
+            await self.change_presence(
+                activity=discord.Game(random.choice(statuses)), shard_id=shard_id
+            )
 
     @status_task.before_loop
     async def before_status_task(self) -> None:
@@ -191,16 +415,74 @@ class DiscordBot(commands.Bot):
         self.logger.info(
             f"Running on: {platform.system()} {platform.release()} ({os.name})"
         )
+        if self.sharded:
+            self.logger.info(
+                f"Sharding: {self.shard_count or 'automatic'} shard(s), running {self.shard_ids or 'all'}"
+            )
         self.logger.info("-------------------")
-        await self.init_db()
-        await self.load_cogs()
+        self.watchdog.start()
+        started = time.perf_counter()
+        timings = {}
+
+        async def timed(phase: str, coroutine) -> None:
+            phase_started = time.perf_counter()
+            await coroutine
+            timings[phase] = time.perf_counter() - phase_started
+
+        await asyncio.gather(
+            timed("cogs", self.load_cogs()), timed("database", self.open_database())
+        )
         self.status_task.start()
-        self.database = DatabaseManager(
-            connection=await aiosqlite.connect(
-                f"{os.path.realpath(os.path.dirname(__file__))}/database/database.db"
-            )
+        instrument(self.database, self.database_duration)
+        if os.getenv("SYNC_COMMANDS_ON_START", "false").lower() in ("1", "true", "yes"):
+            await timed("sync", self.sync_commands_on_start())
+        await timed("metrics", self.start_metrics_server())
+        breakdown = ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in timings.items())
+        self.logger.info(
+            f"Startup took {time.perf_counter() - started:.3f}s ({breakdown})"
         )
-        await self.database.enable_foreign_keys()
+
+    async def close(self) -> None:
+        self.watchdog.stop()
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+        await super().close()
+        if self.database is not None:
+            await self.database.close()
+
+    async def on_ready(self) -> None:
+        """
+        The code in this event is executed when every shard of the bot is ready.
+        """
+        if not self.sharded:
+            self.ready_shards.add(0)
+
+    async def on_resumed(self) -> None:
+        if not self.sharded:
+            self.ready_shards.add(0)
+
+    async def on_disconnect(self) -> None:
+        if not self.sharded:
+            self.ready_shards.discard(0)
+
+    async def on_shard_ready(self, shard_id: int) -> None:
+        """
+        The code in this event is executed every time a shard has connected and received its guilds.
+
+        :param shard_id: The ID of the shard that is ready.
+        """
+        self.ready_shards.add(shard_id)
+        self.logger.info(
+            f"Shard {shard_id} is ready ({len(self.ready_shards)} shard(s) ready)"
+        )
+
+    async def on_shard_resumed(self, shard_id: int) -> None:
+        self.ready_shards.add(shard_id)
+        self.logger.info(f"Shard {shard_id} has resumed its session")
+
+    async def on_shard_disconnect(self, shard_id: int) -> None:
+        self.ready_shards.discard(shard_id)
+        self.logger.warning(f"Shard {shard_id} has disconnected")
 
     async def on_message(self, message: discord.Message) -> None:
         """
@@ -212,6 +494,15 @@ class DiscordBot(commands.Bot):
             return
         await self.process_commands(message)
 
+    async def on_command(self, context: Context) -> None:
+        """
+        The code in this event is executed every time a command is invoked, before its checks run.
+
+        :param context: The context of the command that is being invoked.
+        """
+        context.invoked_at = time.perf_counter()
+        self.command_invocations.inc(context.command.qualified_name)
+
     async def on_command_completion(self, context: Context) -> None:
         """
         The code in this event is executed every time a normal command has been *successfully* executed.
@@ -219,6 +510,12 @@ class DiscordBot(commands.Bot):
         :param context: The context of the command that has been executed.
         """
         full_command_name = context.command.qualified_name
+        invoked_at = getattr(context, "invoked_at", None)
+        if invoked_at is not None:
+            self.command_duration.observe(
+                time.perf_counter() - invoked_at, full_command_name
+            )
+        self.latency_budget.observe(context)
         split = full_command_name.split(" ")
         executed_command = str(split[0])
         if context.guild is not None:
@@ -237,7 +534,18 @@ class DiscordBot(commands.Bot):
         :param context: The context of the normal command that failed executing.
         :param error: The error that has been faced.
         """
-        if isinstance(error, commands.CommandOnCooldown):
+        self.command_errors.inc(
+            context.command.qualified_name if context.command else "unknown",
+            type(error).__name__,
+        )
+        if isinstance(error, AdmissionRejected):
+            embed = discord.Embed(
+                description=f"**The bot is busy right now** - Please try again in {round(error.retry_after)} seconds.",
+                color=0xE02B2B,
+            )
+            kwargs = {"ephemeral": True} if context.interaction else {}
+            await context.send(embed=embed, **kwargs)
+        elif isinstance(error, commands.CommandOnCooldown):
             minutes, seconds = divmod(error.retry_after, 60)
             hours, minutes = divmod(minutes, 60)
             hours = hours % 24
@@ -288,4 +596,7 @@ class DiscordBot(commands.Bot):
 
 
 bot = DiscordBot()
-bot.run(os.getenv("TOKEN"))
+try:
+    bot.run(os.getenv("TOKEN"))
+finally:
+    log_listener.stop()
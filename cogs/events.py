@@ -1,11 +1,257 @@
 import os
-from typing import Any, Dict, Optional
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
 import aiohttp
 import discord
+from discord import app_commands
 from discord.ext import commands
 from discord.ext.commands import Context
 
+from database.dates import start_of_day
+from helpers.admission import AdmissionRejected
+from helpers.event_index import EventIndex
+from helpers.join_pipeline import JoinPipeline
+from helpers.queue_status import QueueStatusBoard, StatusMessage
+from helpers.tasks import BackgroundTasks
+from helpers.warmup import warm_up
+
+# Buyers listed on a live queue status message.
+STATUS_HEAD_SIZE = 5
+
+
+class Paginator(discord.ui.View):
+    """
+    Previous and next buttons over pages rendered on demand by a subclass.
+
+    Only the member who opened the paginator can turn its pages, and the buttons
+    are removed once it times out.
+    """
+
+    PAGE_SIZE = 10
+
+    def __init__(self, viewer_id: int, command: str) -> None:
+        super().__init__(timeout=180)
+        self.viewer_id = viewer_id
+        self.command = command
+        self.page = 0
+        self.total = 0
+        self.message: Optional[discord.Message] = None
+
+    @property
+    def pages(self) -> int:
+        return max(1, -(-self.total // self.PAGE_SIZE))
+
+    async def render(self) -> Dict[str, Any]:
+        """Load the current page and return the message arguments showing it."""
+        raise NotImplementedError
+
+    def update_buttons(self) -> None:
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= self.pages - 1
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.viewer_id:
+            await interaction.response.send_message(
+                f"Use `{self.command}` to browse this yourself.", ephemeral=True
+            )
+            return False
+        return True
+
+    async def show_page(self, interaction: discord.Interaction, page: int) -> None:
+        self.page = max(page, 0)
+        message = await self.render()
+        await interaction.response.edit_message(**message, view=self)
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.blurple)
+    async def previous_page(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ) -> None:
+        await self.show_page(interaction, self.page - 1)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.blurple)
+    async def next_page(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ) -> None:
+        await self.show_page(interaction, self.page + 1)
+
+    async def on_timeout(self) -> None:
+        if self.message is None:
+            return
+        try:
+            await self.message.edit(view=None)
+        except discord.HTTPException:
+            # The message was deleted or the interaction token expired.
+            pass
+
+
+class QueuePaginator(Paginator):
+    """
+    Browse an event's queue one page at a time.
+
+    Only the visible page is read from the database and resolved to members, so
+    browsing a long queue costs the same as a short one.
+    """
+
+    PAGE_SIZE = 15
+
+    def __init__(
+        self,
+        bot: commands.Bot,
+        event: Dict[str, Any],
+        guild: discord.Guild,
+        viewer_id: int,
+    ) -> None:
+        super().__init__(viewer_id, "/queue_view")
+        self.bot = bot
+        self.event = event
+        self.guild = guild
+
+    async def render(self) -> Dict[str, Any]:
+        database = self.bot.database
+        self.total = await database.get_queue_size(self.event["id"])
+        self.page = min(self.page, self.pages - 1)
+        start = self.page * self.PAGE_SIZE
+        entries = await database.list_queue(self.event["id"], start, self.PAGE_SIZE)
+
+        lines = []
+        for position, entry in enumerate(entries, start=start + 1):
+            user_id = int(entry["user_id"])
+            member = self.guild.get_member(user_id)
+            display = member.mention if member else f"<@{user_id}>"
+            marker = " ← you" if user_id == self.viewer_id else ""
+            lines.append(f"`{position}.` {display}{marker}")
+
+        self.update_buttons()
+        return {
+            "content": f"Buyers queued for **{discord.utils.escape_markdown(self.event['name'])}** "
+            f"(page {self.page + 1}/{self.pages}, {self.total} buyers):\n" + "\n".join(lines)
+        }
+
+    @discord.ui.button(label="My position", style=discord.ButtonStyle.gray)
+    async def my_position(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ) -> None:
+        position = await self.bot.database.get_queue_position(
+            self.event["id"], interaction.user.id
+        )
+        if not position:
+            await interaction.response.send_message(
+                "You're not in this queue.", ephemeral=True
+            )
+            return
+        await self.show_page(interaction, (position - 1) // self.PAGE_SIZE)
+
+
+class EventListPaginator(Paginator):
+    """Browse the events of a guild, rendered and cached by the events cog."""
+
+    def __init__(
+        self,
+        cog: "EventTicketing",
+        guild_id: int,
+        viewer_id: int,
+        *,
+        upcoming: bool = False,
+        city: Optional[str] = None,
+    ) -> None:
+        super().__init__(viewer_id, "/event list")
+        self.cog = cog
+        self.guild_id = guild_id
+        self.upcoming = upcoming
+        self.city = city
+
+    async def render(self) -> Dict[str, Any]:
+        embed, self.total, self.page = await self.cog.event_list_page(
+            self.guild_id, self.page, upcoming=self.upcoming, city=self.city
+        )
+        self.update_buttons()
+        return {"embed": embed}
+
+
+class QueueButton(
+    discord.ui.DynamicItem[discord.ui.Button],
+    template=r"queue:(?P<action>join|leave|position):(?P<event_id>[0-9]+)",
+):
+    """
+    A Join, Leave or My position button on an event announcement.
+
+    The action and event ID live in the custom ID, so the one registered item
+    handles every announcement, including those posted before a restart.
+    """
+
+    LABELS = {
+        "join": ("Join queue", discord.ButtonStyle.green),
+        "leave": ("Leave queue", discord.ButtonStyle.red),
+        "position": ("My position", discord.ButtonStyle.gray),
+    }
+
+    def __init__(self, action: str, event_id: int) -> None:
+        label, style = self.LABELS[action]
+        super().__init__(
+            discord.ui.Button(
+                label=label, style=style, custom_id=f"queue:{action}:{event_id}"
+            )
+        )
+        self.action = action
+        self.event_id = event_id
+
+    @classmethod
+    async def from_custom_id(
+        cls,
+        interaction: discord.Interaction,
+        item: discord.ui.Button,
+        match: "re.Match[str]",
+    ) -> "QueueButton":
+        return cls(match["action"], int(match["event_id"]))
+
+    @classmethod
+    def view(cls, event_id: int) -> discord.ui.View:
+        """Return the buttons of an event announcement."""
+        view = discord.ui.View(timeout=None)
+        for action in cls.LABELS:
+            view.add_item(cls(action, event_id))
+        return view
+
+    async def callback(self, interaction: discord.Interaction) -> None:
+        cog = interaction.client.get_cog("events")
+        if cog is None or interaction.guild is None:
+            await interaction.response.send_message(
+                "Queues are unavailable right now, please try again later.", ephemeral=True
+            )
+            return
+        await cog.queue_button(interaction, self.action, self.event_id)
+
+
+class EventSearchPaginator(Paginator):
+    """Browse the results of an event search, which are loaded once."""
+
+    def __init__(
+        self,
+        cog: "EventTicketing",
+        query: str,
+        events: List[Dict[str, Any]],
+        viewer_id: int,
+    ) -> None:
+        super().__init__(viewer_id, "/event search")
+        self.cog = cog
+        self.query = query
+        self.events = events
+        self.total = len(events)
+
+    async def render(self) -> Dict[str, Any]:
+        self.page = min(self.page, self.pages - 1)
+        start = self.page * self.PAGE_SIZE
+        embed = discord.Embed(
+            title=f"Events matching “{self.query}”",
+            colour=discord.Colour.blurple(),
+        )
+        await self.cog.add_event_fields(embed, self.events[start : start + self.PAGE_SIZE])
+        embed.set_footer(text=f"Page {self.page + 1}/{self.pages} · {self.total} results")
+        self.update_buttons()
+        return {"embed": embed}
+
 
 class EventTicketing(commands.Cog, name="events"):
     """Ticket queue management for Discord events."""
@@ -13,10 +259,104 @@ class EventTicketing(commands.Cog, name="events"):
     def __init__(self, bot: commands.Bot) -> None:
         self.bot = bot
         self.api_key = os.getenv("EDMTRAIN_API_KEY")
+        self.join_pipeline = JoinPipeline(
+            lambda: self.bot.database,
+            max_window=float(os.getenv("JOIN_BATCH_WINDOW", "0.05")),
+        )
+        # Work that runs after a command has answered, such as notifying buyers.
+        self.background = BackgroundTasks(
+            "events",
+            limit=int(os.getenv("EVENTS_BACKGROUND_LIMIT", "10")),
+            logger=bot.logger,
+            errors=bot.background_task_errors,
+        )
+        # Events by ID. Events are never edited, so entries cannot go stale.
+        self.event_cache: Dict[int, Dict[str, Any]] = {}
+        # The events of a guild with their queue sizes, dropped on event creation and queue changes.
+        self.guild_events: Dict[int, List[Dict[str, Any]]] = {}
+        # Autocomplete indexes per guild, built on first use and extended by new events.
+        self.event_indexes: Dict[int, EventIndex] = {}
+        # Rendered event list pages per guild, dropped on event creation and queue changes.
+        self.event_pages: Dict[int, Dict[Tuple[bool, str, int], Tuple[discord.Embed, int, int]]] = {}
+        # Live queue status messages, edited at most every QUEUE_STATUS_INTERVAL seconds.
+        self.status_board = QueueStatusBoard(
+            self.render_queue_status,
+            self._publish_status,
+            interval=float(os.getenv("QUEUE_STATUS_INTERVAL", "5")),
+            logger=bot.logger,
+        )
+        self.button_actions = {
+            "join": self._button_join,
+            "leave": self._button_leave,
+            "position": self._button_position,
+        }
+
+    async def cog_load(self) -> None:
+        self.bot.add_dynamic_items(QueueButton)
+        self.background.spawn(self.restore_status_messages(), name="restore_status_messages")
+        if float(os.getenv("WARMUP_TIMEOUT", "10")) > 0:
+            self.background.spawn(self.warm_up(), name="warm_up")
+
+    async def warm_up(self) -> None:
+        await self.bot.wait_until_ready()
+        report = await warm_up(
+            self.bot,
+            self.event_cache,
+            timeout=float(os.getenv("WARMUP_TIMEOUT", "10")),
+            max_entries=int(os.getenv("WARMUP_MAX_QUEUE_ENTRIES", "200000")),
+            concurrency=int(os.getenv("WARMUP_CONCURRENCY", "4")),
+            activity_days=float(os.getenv("WARMUP_ACTIVITY_DAYS", "7")),
+        )
+        self.bot.logger.info(f"Warm-up loaded {report}")
 
     async def cog_unload(self) -> None:
-        # Placeholder for future cleanup (e.g. persistent sessions)
-        return
+        self.bot.remove_dynamic_items(QueueButton)
+        await self.status_board.close()
+        await self.join_pipeline.close()
+        await self.background.close()
+
+    async def restore_status_messages(self) -> None:
+        await self.bot.wait_until_ready()
+        today = start_of_day()
+        for row in await self.bot.database.list_status_messages():
+            event_id = int(row["event_id"])
+            event = None
+            if row["guild_id"] is not None:
+                guild_id = int(row["guild_id"])
+                if not self._owns_guild(guild_id):
+                    # Another shard process keeps this message up to date.
+                    continue
+                event = await self._lookup_event(guild_id, event_id)
+            if event is None or (event.get("starts_at") or today) < today:
+                await self.bot.database.remove_status_message(event_id)
+                continue
+            # A message deleted meanwhile is dropped by its first refresh.
+            self.status_board.track(
+                StatusMessage(event_id, int(row["channel_id"]), int(row["message_id"]))
+            )
+            # What the message shows is unknown after a restart, refresh it once.
+            self.status_board.changed(event_id)
+
+    def _owns_guild(self, guild_id: int) -> bool:
+        """Return whether this process runs the shard of a guild."""
+        shard_ids = getattr(self.bot, "shard_ids", None)
+        shard_count = getattr(self.bot, "shard_count", None)
+        if not shard_ids or not shard_count:
+            return True
+        return (guild_id >> 22) % shard_count in shard_ids
+
+    async def cog_before_invoke(self, context: Context) -> None:
+        # Rejections raise AdmissionRejected, which the bot's error handler reports.
+        await self.bot.admission.admit(context)
+
+    async def cog_after_invoke(self, context: Context) -> None:
+        self.bot.admission.release(context)
+
+    async def cog_command_error(self, context: Context, error: Exception) -> None:
+        # Slash invocations of hybrid commands only run after_invoke when the callback completed,
+        # and no invocation reaches it when a later before-invoke hook (such as the bot's deferral)
+        # fails. Release here covers both, it does nothing if after_invoke already released.
+        self.bot.admission.release(context)
 
     @commands.hybrid_group(
         name="event",
@@ -27,7 +367,39 @@ class EventTicketing(commands.Cog, name="events"):
     async def event_group(self, context: Context) -> None:
         await self._send_event_list(context)
 
+    @event_group.command(name="list", description="Browse the events of this server.")
+    @app_commands.describe(
+        upcoming="Only show events dated today or later",
+        city="Only show events in this city",
+    )
+    @commands.guild_only()
+    async def event_list(
+        self, context: Context, upcoming: bool = False, city: Optional[str] = None
+    ) -> None:
+        await self._send_event_list(context, upcoming=upcoming, city=city)
+
+    @event_group.command(
+        name="search", description="Search the events of this server by name, venue or city."
+    )
+    @app_commands.describe(query="Words to look for, the start of a word is enough")
+    @commands.guild_only()
+    async def event_search(self, context: Context, *, query: str) -> None:
+        events = await self.bot.database.search_events(context.guild.id, query)
+        if not events:
+            kwargs = {"ephemeral": True} if context.interaction else {}
+            await context.send("No events match this search.", **kwargs)
+            return
+        paginator = EventSearchPaginator(
+            self, discord.utils.escape_markdown(query[:80]), events, context.author.id
+        )
+        message = await paginator.render()
+        if paginator.total <= EventSearchPaginator.PAGE_SIZE:
+            await context.send(**message)
+            return
+        paginator.message = await context.send(**message, view=paginator)
+
     @event_group.command(name="create", description="Create a manual event.")
+    @app_commands.describe(announce="Post the event with buttons to join its queue")
     @commands.guild_only()
     async def event_create(
         self,
@@ -37,6 +409,7 @@ class EventTicketing(commands.Cog, name="events"):
         venue: Optional[str] = None,
         city: Optional[str] = None,
         url: Optional[str] = None,
+        announce: bool = False,
     ) -> None:
         event_id = await self.bot.database.create_event(
             guild_id=context.guild.id,
@@ -48,13 +421,20 @@ class EventTicketing(commands.Cog, name="events"):
             city=city,
             url=url,
         )
-        await context.send(
-            f"Created event **{discord.utils.escape_markdown(name)}** with ID `{event_id}`."
+        self._event_added(context.guild.id, event_id, name)
+        await self._send_created(
+            context,
+            event_id,
+            f"Created event **{discord.utils.escape_markdown(name)}** with ID `{event_id}`.",
+            announce,
         )
 
     @event_group.command(name="import", description="Import an EDMTrain event by ID.")
+    @app_commands.describe(announce="Post the event with buttons to join its queue")
     @commands.guild_only()
-    async def event_import(self, context: Context, edmtrain_id: int) -> None:
+    async def event_import(
+        self, context: Context, edmtrain_id: int, announce: bool = False
+    ) -> None:
         if context.interaction and not context.interaction.response.is_done():
             await context.interaction.response.defer()
 
@@ -97,8 +477,12 @@ class EventTicketing(commands.Cog, name="events"):
             city=event_data.get("city"),
             url=event_data.get("url"),
         )
-        await context.send(
-            f"Imported EDMTrain event **{discord.utils.escape_markdown(event_data['name'])}** as `{event_id}`."
+        self._event_added(context.guild.id, event_id, event_data["name"])
+        await self._send_created(
+            context,
+            event_id,
+            f"Imported EDMTrain event **{discord.utils.escape_markdown(event_data['name'])}** as `{event_id}`.",
+            announce,
         )
 
     @commands.hybrid_command(
@@ -110,10 +494,15 @@ class EventTicketing(commands.Cog, name="events"):
         if event is None:
             return
 
-        added, position = await self.bot.database.add_buyer_to_queue(
-            event_id, context.author.id
-        )
-        if added:
+        added, position = await self.join_pipeline.join(event_id, context.author.id)
+        if not position:
+            kwargs = {"ephemeral": True} if context.interaction else {}
+            await context.send(
+                f"I couldn't add you to the queue for **{discord.utils.escape_markdown(event['name'])}**, please try again.",
+                **kwargs,
+            )
+        elif added:
+            self._queue_changed(event)
             await context.send(
                 f"You joined the queue for **{discord.utils.escape_markdown(event['name'])}** at position `{position}`."
             )
@@ -134,10 +523,37 @@ class EventTicketing(commands.Cog, name="events"):
             return
 
         await self.bot.database.remove_buyer_from_queue(event_id, context.author.id)
+        self._queue_changed(event)
         await context.send(
             f"Removed you from the queue for **{discord.utils.escape_markdown(event['name'])}**."
         )
 
+    @commands.hybrid_command(
+        name="queue_position",
+        description="Check your position in the buying queue for an event.",
+        extras={"ephemeral_defer": True},
+    )
+    @commands.guild_only()
+    async def queue_position(self, context: Context, event_id: int) -> None:
+        event = await self._get_event(context, event_id)
+        if event is None:
+            return
+
+        position = await self.bot.database.get_queue_position(
+            event_id, context.author.id
+        )
+        kwargs = {"ephemeral": True} if context.interaction else {}
+        if position:
+            await context.send(
+                f"You're at position `{position}` in the queue for **{discord.utils.escape_markdown(event['name'])}**.",
+                **kwargs,
+            )
+        else:
+            await context.send(
+                f"You're not in the queue for **{discord.utils.escape_markdown(event['name'])}**.",
+                **kwargs,
+            )
+
     @commands.hybrid_command(
         name="queue_view", description="View the queue for an event."
     )
@@ -147,27 +563,55 @@ class EventTicketing(commands.Cog, name="events"):
         if event is None:
             return
 
-        queue_entries = await self.bot.database.list_queue(event_id)
-        if not queue_entries:
+        paginator = QueuePaginator(self.bot, event, context.guild, context.author.id)
+        message = await paginator.render()
+        if paginator.total == 0:
             await context.send(
                 f"No one is waiting to buy a ticket for **{discord.utils.escape_markdown(event['name'])}** yet."
             )
             return
+        if paginator.total <= QueuePaginator.PAGE_SIZE:
+            await context.send(**message)
+            return
+        paginator.message = await context.send(**message, view=paginator)
 
-        lines = []
-        for position, entry in enumerate(queue_entries, start=1):
-            user_id = int(entry["user_id"])
-            member = context.guild.get_member(user_id)
-            display = member.mention if member else f"<@{user_id}>"
-            lines.append(f"`{position}.` {display}")
+    @commands.hybrid_command(
+        name="queue_status",
+        description="Post a live status message for an event's queue in this channel.",
+        extras={"ephemeral_defer": True},
+    )
+    @app_commands.describe(stop="Stop updating the event's status message")
+    @commands.guild_only()
+    @commands.has_permissions(manage_messages=True)
+    async def queue_status(
+        self, context: Context, event_id: int, stop: bool = False
+    ) -> None:
+        event = await self._get_event(context, event_id)
+        if event is None:
+            return
 
-        message = "\n".join(lines[:15])
-        if len(lines) > 15:
-            message += f"\n…and {len(lines) - 15} more"
+        name = discord.utils.escape_markdown(event["name"])
+        kwargs = {"ephemeral": True} if context.interaction else {}
+        if stop:
+            if self.status_board.untrack(event_id) is None:
+                await context.send(f"**{name}** has no live status message.", **kwargs)
+                return
+            await self.bot.database.remove_status_message(event_id)
+            await context.send(f"Stopped updating the status message of **{name}**.", **kwargs)
+            return
 
-        await context.send(
-            f"Buyers queued for **{discord.utils.escape_markdown(event['name'])}**:\n{message}"
+        content = await self.render_queue_status(event_id)
+        message = await context.channel.send(content)
+        try:
+            await message.pin()
+        except discord.HTTPException:
+            # The message is updated whether or not it could be pinned.
+            pass
+        await self.bot.database.set_status_message(event_id, message.channel.id, message.id)
+        self.status_board.track(
+            StatusMessage(event_id, message.channel.id, message.id, content)
         )
+        await context.send(f"Posted a live status message for **{name}**.", **kwargs)
 
     @commands.hybrid_command(
         name="ticket_sell",
@@ -189,12 +633,45 @@ class EventTicketing(commands.Cog, name="events"):
             f"Ticket listed for **{discord.utils.escape_markdown(event['name'])}** at ${price:,.2f}."
         )
 
-        await self._notify_next_buyer(context, event, price)
+        self.background.spawn(
+            self._notify_next_buyer(context, event, price), name="notify_next_buyer"
+        )
+
+    @queue_join.autocomplete("event_id")
+    @queue_leave.autocomplete("event_id")
+    @queue_position.autocomplete("event_id")
+    @queue_view.autocomplete("event_id")
+    @queue_status.autocomplete("event_id")
+    @ticket_sell.autocomplete("event_id")
+    async def event_id_autocomplete(
+        self, interaction: discord.Interaction, current: str
+    ) -> List[app_commands.Choice[int]]:
+        if interaction.guild is None:
+            return []
+        index = await self._event_index(interaction.guild.id)
+        choices = []
+        for event_id, name in index.search(current):
+            suffix = f" (#{event_id})"
+            # Choice names are limited to 100 characters.
+            choices.append(
+                app_commands.Choice(name=name[: 100 - len(suffix)] + suffix, value=event_id)
+            )
+        return choices
+
+    async def _lookup_event(
+        self, guild_id: int, event_id: int
+    ) -> Optional[Dict[str, Any]]:
+        event = self.event_cache.get(event_id)
+        if event is None or event["guild_id"] != str(guild_id):
+            event = await self.bot.database.get_event(guild_id, event_id)
+            if event is not None:
+                self.event_cache[event_id] = event
+        return event
 
     async def _get_event(
         self, context: Context, event_id: int
     ) -> Optional[Dict[str, Any]]:
-        event = await self.bot.database.get_event(context.guild.id, event_id)
+        event = await self._lookup_event(context.guild.id, event_id)
         if event is None:
             kwargs = {"ephemeral": True} if context.interaction else {}
             await context.send(
@@ -202,43 +679,247 @@ class EventTicketing(commands.Cog, name="events"):
             )
         return event
 
-    async def _send_event_list(self, context: Context) -> None:
-        events = await self.bot.database.list_events_with_stats(context.guild.id)
-        if not events:
-            await context.send(
-                "There are no events yet. Use `/event create` or `/event import` to add one."
+    async def queue_button(
+        self, interaction: discord.Interaction, action: str, event_id: int
+    ) -> None:
+        """
+        Answer a click on an announcement's queue button.
+
+        Clicks go through the same admission control and automatic deferral as the queue commands.
+        """
+        name = f"queue_button {action}"
+        try:
+            async with self.bot.admission.admitted(interaction):
+                started = time.perf_counter()
+                await self.bot.latency_budget.defer_component(
+                    interaction, name, ephemeral=True
+                )
+                event = await self._lookup_event(interaction.guild.id, event_id)
+                if event is None:
+                    message = "This event no longer exists."
+                else:
+                    message = await self.button_actions[action](event, interaction.user.id)
+                self.bot.latency_budget.record(name, time.perf_counter() - started)
+        except AdmissionRejected as error:
+            message = f"The bot is busy right now, please try again in {round(error.retry_after)} seconds."
+        except Exception:
+            # A failing database, journal or Discord call still gets the click an answer.
+            self.bot.logger.exception(
+                f"Could not {action} the queue of event {event_id} from a button"
             )
+            message = "Queues are unavailable right now, please try again later."
+        if interaction.response.is_done():
+            await interaction.followup.send(message, ephemeral=True)
+        else:
+            await interaction.response.send_message(message, ephemeral=True)
+
+    async def _button_join(self, event: Dict[str, Any], user_id: int) -> str:
+        added, position = await self.join_pipeline.join(event["id"], user_id)
+        name = discord.utils.escape_markdown(event["name"])
+        if not position:
+            return f"I couldn't add you to the queue for **{name}**, please try again."
+        if not added:
+            return f"You're already in the queue for **{name}** at position `{position}`."
+        self._queue_changed(event)
+        return f"You joined the queue for **{name}** at position `{position}`."
+
+    async def _button_leave(self, event: Dict[str, Any], user_id: int) -> str:
+        name = discord.utils.escape_markdown(event["name"])
+        if not await self.bot.database.get_queue_position(event["id"], user_id):
+            return f"You're not in the queue for **{name}**."
+        await self.bot.database.remove_buyer_from_queue(event["id"], user_id)
+        self._queue_changed(event)
+        return f"Removed you from the queue for **{name}**."
+
+    async def _button_position(self, event: Dict[str, Any], user_id: int) -> str:
+        name = discord.utils.escape_markdown(event["name"])
+        position = await self.bot.database.get_queue_position(event["id"], user_id)
+        if not position:
+            return f"You're not in the queue for **{name}**."
+        size = await self.bot.database.get_queue_size(event["id"])
+        return f"You're at position `{position}` of {size} in the queue for **{name}**."
+
+    async def _send_created(
+        self, context: Context, event_id: int, confirmation: str, announce: bool
+    ) -> None:
+        if not announce:
+            await context.send(confirmation)
             return
-
+        event = await self._lookup_event(context.guild.id, event_id)
         embed = discord.Embed(
-            title="Ticketed events",
+            title=event["name"],
+            description="\n".join(self._event_details(event)) or None,
             colour=discord.Colour.blurple(),
         )
+        embed.set_footer(text=f"Event ID {event_id}")
+        await context.send(confirmation, embed=embed, view=QueueButton.view(event_id))
+
+    async def add_event_fields(
+        self, embed: discord.Embed, events: List[Dict[str, Any]]
+    ) -> None:
+        """
+        Add a field per event to an embed, with its details and queue length.
+
+        Queue lengths come with the listed events, or from the guild's cached event list for
+        search results, so counting a queue never loads its members.
+        """
+        sizes: Dict[int, int] = {}
+        if any("queue_size" not in event for event in events):
+            for listed in await self._guild_events(int(events[0]["guild_id"])):
+                sizes[listed["id"]] = listed["queue_size"]
         for event in events:
-            lines = []
-            if event.get("date"):
-                lines.append(f"Date: {event['date']}")
-            if event.get("venue"):
-                venue_line = event["venue"]
-                if event.get("city"):
-                    venue_line += f" — {event['city']}"
-                lines.append(venue_line)
-            if event.get("url"):
-                lines.append(f"[Event link]({event['url']})")
-            lines.append(f"Queue length: {event['queue_size']}")
+            lines = self._event_details(event)
+            queue_size = event.get("queue_size", sizes.get(event["id"], 0))
+            lines.append(f"Queue length: {queue_size}")
             embed.add_field(
                 name=f"`{event['id']}` — {event['name']}",
                 value="\n".join(lines) or "No details provided.",
                 inline=False,
             )
 
-        await context.send(embed=embed)
+    def _event_details(self, event: Dict[str, Any]) -> List[str]:
+        lines = []
+        if event.get("date"):
+            lines.append(f"Date: {event['date']}")
+        if event.get("venue"):
+            venue_line = event["venue"]
+            if event.get("city"):
+                venue_line += f" — {event['city']}"
+            lines.append(venue_line)
+        if event.get("url"):
+            lines.append(f"[Event link]({event['url']})")
+        return lines
+
+    async def render_queue_status(self, event_id: int) -> str:
+        """Return the content of an event's live status message."""
+        database = self.bot.database
+        event = self.event_cache.get(event_id)
+        name = discord.utils.escape_markdown(event["name"]) if event else f"event {event_id}"
+        size = await database.get_queue_size(event_id)
+        lines = [f"**Queue for {name}** — {size} buyer{'' if size == 1 else 's'} waiting"]
+        head = await database.list_queue(event_id, 0, STATUS_HEAD_SIZE)
+        if head:
+            lines.append("Next up:")
+            lines.extend(
+                f"`{position}.` <@{entry['user_id']}>"
+                for position, entry in enumerate(head, start=1)
+            )
+        return "\n".join(lines)
+
+    async def _publish_status(self, message: StatusMessage, content: str) -> bool:
+        channel = self.bot.get_partial_messageable(message.channel_id)
+        try:
+            await channel.get_partial_message(message.message_id).edit(content=content)
+        except discord.NotFound:
+            await self.bot.database.remove_status_message(message.event_id)
+            return False
+        return True
+
+    def _event_added(self, guild_id: int, event_id: int, name: str) -> None:
+        self.guild_events.pop(guild_id, None)
+        self.event_pages.pop(guild_id, None)
+        index = self.event_indexes.get(guild_id)
+        if index is not None:
+            index.add(event_id, name)
+
+    async def _guild_events(self, guild_id: int) -> List[Dict[str, Any]]:
+        events = self.guild_events.get(guild_id)
+        if events is None:
+            events = await self.bot.database.list_events_with_stats(guild_id)
+            self.guild_events[guild_id] = events
+        return events
+
+    async def _event_index(self, guild_id: int) -> EventIndex:
+        index = self.event_indexes.get(guild_id)
+        if index is None:
+            index = EventIndex(await self._guild_events(guild_id))
+            # Another keystroke may have built it while the events were loading.
+            index = self.event_indexes.setdefault(guild_id, index)
+        return index
+
+    def _queue_changed(self, event: Dict[str, Any]) -> None:
+        guild_id = int(event["guild_id"])
+        self.guild_events.pop(guild_id, None)
+        self.event_pages.pop(guild_id, None)
+        self.status_board.changed(event["id"])
+
+    async def _send_event_list(
+        self, context: Context, *, upcoming: bool = False, city: Optional[str] = None
+    ) -> None:
+        paginator = EventListPaginator(
+            self, context.guild.id, context.author.id, upcoming=upcoming, city=city
+        )
+        message = await paginator.render()
+        if paginator.total == 0:
+            if upcoming or city:
+                await context.send("No events match these filters.")
+            else:
+                await context.send(
+                    "There are no events yet. Use `/event create` or `/event import` to add one."
+                )
+            return
+        if paginator.total <= EventListPaginator.PAGE_SIZE:
+            await context.send(**message)
+            return
+        paginator.message = await context.send(**message, view=paginator)
+
+    async def event_list_page(
+        self,
+        guild_id: int,
+        page: int,
+        *,
+        upcoming: bool = False,
+        city: Optional[str] = None,
+    ) -> Tuple[discord.Embed, int, int]:
+        """
+        Return a page of a guild's event list, from the cache when nothing changed since it was rendered.
+
+        :return: The embed, the number of matching events and the page shown, which is
+            clamped to the last page.
+        """
+        key = (upcoming, (city or "").casefold(), page)
+        pages = self.event_pages.setdefault(guild_id, {})
+        cached = pages.get(key)
+        if cached is not None:
+            return cached
+
+        if upcoming:
+            # Served by the guild and start time index instead of scanning every event of the guild.
+            events = await self.bot.database.list_upcoming_events(guild_id)
+        else:
+            events = await self._guild_events(guild_id)
+        matching = [
+            event
+            for event in events
+            if not city or (event.get("city") or "").casefold() == key[1]
+        ]
+        total = len(matching)
+        last_page = max(0, -(-total // EventListPaginator.PAGE_SIZE) - 1)
+        page = min(page, last_page)
+
+        embed = discord.Embed(
+            title="Ticketed events",
+            colour=discord.Colour.blurple(),
+        )
+        start = page * EventListPaginator.PAGE_SIZE
+        await self.add_event_fields(
+            embed, matching[start : start + EventListPaginator.PAGE_SIZE]
+        )
+        embed.set_footer(text=f"Page {page + 1}/{last_page + 1} · {total} events")
+
+        # City filters are free text, so keep the number of cached variants bounded.
+        if len(pages) >= 64:
+            pages.clear()
+        pages[key] = pages[key[:2] + (page,)] = (embed, total, page)
+        return embed, total, page
 
     async def _fetch_edmtrain_event(self, edmtrain_id: int) -> Optional[Dict[str, Any]]:
         params = {"eventId": edmtrain_id, "client": self.api_key}
         url = "https://edmtrain.com/api/events"
         try:
-            async with aiohttp.ClientSession() as session:
+            async with aiohttp.ClientSession(
+                trace_configs=self.bot.http_trace_configs
+            ) as session:
                 async with session.get(url, params=params, timeout=15) as response:
                     if response.status != 200:
                         return None
@@ -6,43 +6,80 @@ Description:
 Version: 6.4.0
 """
 
+import asyncio
+import io
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from typing import Literal, Optional
+
 import discord
 from discord import app_commands
 from discord.ext import commands
 from discord.ext.commands import Context
 
+from helpers.admission import AdmissionController
+from helpers.command_sync import sync_commands
+from helpers.memory import MemoryTracker, format_size
+from helpers.profiler import ProfileResult, SamplingProfiler
+
+# Discord rejects attachments over this size for bots in unboosted guilds.
+MAX_ATTACHMENT_SIZE = 8 * 1024 * 1024
+
 
 class Owner(commands.Cog, name="owner"):
     def __init__(self, bot) -> None:
         self.bot = bot
+        self.profiler = None
+        self.profile_task = None
+        self.memory_tracker = MemoryTracker()
+
+    async def cog_unload(self) -> None:
+        if self.profile_task is not None:
+            self.profile_task.cancel()
+        if self.profiler is not None and self.profiler.running:
+            self.profiler.stop()
 
     @commands.command(
         name="sync",
         description="Synchonizes the slash commands.",
     )
-    @app_commands.describe(scope="The scope of the sync. Can be `global` or `guild`")
+    @app_commands.describe(
+        scope="The scope of the sync. Can be `global` or `guild`",
+        force="Sync even if the commands did not change since the last sync",
+    )
     @commands.is_owner()
-    async def sync(self, context: Context, scope: str) -> None:
+    async def sync(
+        self, context: Context, scope: str, force: Optional[Literal["force"]] = None
+    ) -> None:
         """
-        Synchonizes the slash commands.
+        Synchonizes the slash commands, unless they did not change since the last sync.
 
         :param context: The command context.
         :param scope: The scope of the sync. Can be `global` or `guild`.
+        :param force: Pass `force` to sync even if the commands did not change.
         """
 
         if scope == "global":
-            await context.bot.tree.sync()
+            synced = await sync_commands(context.bot, force=force is not None)
             embed = discord.Embed(
-                description="Slash commands have been globally synchronized.",
+                description="Slash commands have been globally synchronized."
+                if synced
+                else "Slash commands are already up to date globally, use `sync global force` to sync anyway.",
                 color=0xBEBEFE,
             )
             await context.send(embed=embed)
             return
         elif scope == "guild":
             context.bot.tree.copy_global_to(guild=context.guild)
-            await context.bot.tree.sync(guild=context.guild)
+            synced = await sync_commands(
+                context.bot, context.guild, force=force is not None
+            )
             embed = discord.Embed(
-                description="Slash commands have been synchronized in this guild.",
+                description="Slash commands have been synchronized in this guild."
+                if synced
+                else "Slash commands are already up to date in this guild, use `sync guild force` to sync anyway.",
                 color=0xBEBEFE,
             )
             await context.send(embed=embed)
@@ -70,7 +107,8 @@ class Owner(commands.Cog, name="owner"):
 
         if scope == "global":
             context.bot.tree.clear_commands(guild=None)
-            await context.bot.tree.sync()
+            # Record the empty tree so the next sync uploads the commands again.
+            await sync_commands(context.bot, force=True)
             embed = discord.Embed(
                 description="Slash commands have been globally unsynchronized.",
                 color=0xBEBEFE,
@@ -79,7 +117,7 @@ class Owner(commands.Cog, name="owner"):
             return
         elif scope == "guild":
             context.bot.tree.clear_commands(guild=context.guild)
-            await context.bot.tree.sync(guild=context.guild)
+            await sync_commands(context.bot, context.guild, force=True)
             embed = discord.Embed(
                 description="Slash commands have been unsynchronized in this guild.",
                 color=0xBEBEFE,
@@ -215,6 +253,305 @@ class Owner(commands.Cog, name="owner"):
         embed = discord.Embed(description=message, color=0xBEBEFE)
         await context.send(embed=embed)
 
+    @commands.hybrid_group(
+        name="profile",
+        description="Sample where the bot spends its CPU time.",
+    )
+    @commands.is_owner()
+    async def profile(self, context: Context) -> None:
+        """
+        Sample where the bot spends its CPU time.
+
+        :param context: The hybrid command context.
+        """
+        if context.invoked_subcommand is None:
+            embed = discord.Embed(
+                description="Please specify a subcommand.\n\n**Subcommands:**\n`start` - Start the CPU profiler.\n`stop` - Stop the CPU profiler and send the results.",
+                color=0xE02B2B,
+            )
+            await context.send(embed=embed)
+
+    @profile.command(
+        name="start",
+        description="Start the CPU profiler for a number of seconds.",
+    )
+    @app_commands.describe(seconds="How long to profile for, up to 600 seconds.")
+    @commands.is_owner()
+    async def profile_start(self, context: Context, seconds: int = 30) -> None:
+        """
+        Start the sampling profiler. The results are sent once the duration has elapsed.
+
+        :param context: The hybrid command context.
+        :param seconds: How long to profile for. Default is 30 seconds.
+        """
+        if self.profiler is not None and self.profiler.running:
+            embed = discord.Embed(
+                description="The profiler is already running.", color=0xE02B2B
+            )
+            await context.send(embed=embed)
+            return
+        # Interaction follow-ups stop working after 15 minutes.
+        seconds = max(1, min(seconds, 600))
+        self.profiler = SamplingProfiler(
+            interval=float(os.getenv("PROFILE_INTERVAL", "0.01"))
+        )
+        self.profiler.start()
+        self.profile_task = asyncio.create_task(self.finish_profile(context, seconds))
+        embed = discord.Embed(
+            description=f"Profiling for {seconds} seconds...", color=0xBEBEFE
+        )
+        await context.send(embed=embed)
+
+    @profile.command(
+        name="stop",
+        description="Stop the CPU profiler and send the results.",
+    )
+    @commands.is_owner()
+    async def profile_stop(self, context: Context) -> None:
+        """
+        Stop the sampling profiler before its duration has elapsed and send the results.
+
+        :param context: The hybrid command context.
+        """
+        if self.profiler is None or not self.profiler.running:
+            embed = discord.Embed(
+                description="The profiler is not running.", color=0xE02B2B
+            )
+            await context.send(embed=embed)
+            return
+        self.profile_task.cancel()
+        self.profile_task = None
+        await self.send_profile(context, self.profiler.stop())
+
+    async def finish_profile(self, context: Context, seconds: int) -> None:
+        await asyncio.sleep(seconds)
+        self.profile_task = None
+        await self.send_profile(context, self.profiler.stop())
+
+    async def send_profile(self, context: Context, result: ProfileResult) -> None:
+        """
+        Write the collapsed stacks and pstats files and send them with a summary.
+
+        Files are kept under `PROFILE_DIR` when it is set, otherwise they are removed once sent.
+        """
+        directory = os.getenv("PROFILE_DIR")
+        keep = directory is not None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        else:
+            directory = tempfile.mkdtemp(prefix="profile-")
+        name = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        collapsed_path = os.path.join(directory, f"{name}.collapsed")
+        pstats_path = os.path.join(directory, f"{name}.pstats")
+        await asyncio.to_thread(result.write_collapsed, collapsed_path)
+        await asyncio.to_thread(result.write_pstats, pstats_path)
+
+        top = "\n".join(
+            f"`{count * 100 // max(result.samples, 1):>3}%` {function}"
+            for function, count in result.top(10)
+        )
+        embed = discord.Embed(
+            title="CPU profile",
+            description=top or "No samples were collected.",
+            color=0xBEBEFE,
+        )
+        embed.add_field(name="Duration", value=f"{result.duration:.1f}s")
+        embed.add_field(name="Samples", value=str(result.samples))
+
+        paths = [collapsed_path, pstats_path]
+        if sum(os.path.getsize(path) for path in paths) > MAX_ATTACHMENT_SIZE:
+            keep = True
+            embed.add_field(
+                name="Files", value=f"Too large to attach, saved in `{directory}`."
+            )
+            await context.send(embed=embed)
+        else:
+            if keep:
+                embed.add_field(name="Files", value=f"Saved in `{directory}`.")
+            await context.send(
+                embed=embed, files=[discord.File(path) for path in paths]
+            )
+        if not keep:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    @commands.hybrid_group(
+        name="memory",
+        description="Track the memory growth of the bot.",
+    )
+    @commands.is_owner()
+    async def memory(self, context: Context) -> None:
+        """
+        Track the memory growth of the bot.
+
+        :param context: The hybrid command context.
+        """
+        if context.invoked_subcommand is None:
+            embed = discord.Embed(
+                description="Please specify a subcommand.\n\n**Subcommands:**\n`start` - Start tracing allocations and take a baseline.\n`baseline` - Take a new baseline.\n`diff` - Report the growth since the baseline.\n`stop` - Stop tracing allocations.",
+                color=0xE02B2B,
+            )
+            await context.send(embed=embed)
+
+    @memory.command(
+        name="start",
+        description="Start tracing allocations and take a baseline snapshot.",
+    )
+    @commands.is_owner()
+    async def memory_start(self, context: Context) -> None:
+        """
+        Start tracing allocations and take a baseline snapshot.
+
+        :param context: The hybrid command context.
+        """
+        await context.defer()
+        await asyncio.to_thread(self.memory_tracker.start)
+        embed = discord.Embed(
+            description="Memory tracing started, the baseline has been taken.",
+            color=0xBEBEFE,
+        )
+        await context.send(embed=embed)
+
+    @memory.command(
+        name="baseline",
+        description="Take a new baseline snapshot.",
+    )
+    @commands.is_owner()
+    async def memory_baseline(self, context: Context) -> None:
+        """
+        Take a new baseline snapshot to diff future reports against.
+
+        :param context: The hybrid command context.
+        """
+        if not self.memory_tracker.tracing:
+            embed = discord.Embed(
+                description="Memory tracing is not running, use `memory start` first.",
+                color=0xE02B2B,
+            )
+            await context.send(embed=embed)
+            return
+        await context.defer()
+        await asyncio.to_thread(self.memory_tracker.reset_baseline)
+        embed = discord.Embed(
+            description="A new baseline has been taken.", color=0xBEBEFE
+        )
+        await context.send(embed=embed)
+
+    @memory.command(
+        name="diff",
+        description="Report the memory growth since the baseline.",
+    )
+    @commands.is_owner()
+    async def memory_diff(self, context: Context) -> None:
+        """
+        Report the top allocation sites, object types and cache sizes compared to the baseline.
+
+        :param context: The hybrid command context.
+        """
+        if not self.memory_tracker.tracing:
+            embed = discord.Embed(
+                description="Memory tracing is not running, use `memory start` first.",
+                color=0xE02B2B,
+            )
+            await context.send(embed=embed)
+            return
+        await context.defer()
+        report = await asyncio.to_thread(
+            self.memory_tracker.report, self.bot.cache_sizes()
+        )
+        embed = discord.Embed(title="Memory growth", color=0xBEBEFE)
+        embed.add_field(
+            name="RSS",
+            value=format_size(report.rss) if report.rss is not None else "Unknown",
+        )
+        embed.add_field(name="Traced", value=format_size(report.traced[0]))
+        embed.add_field(
+            name="Top allocation sites",
+            value="\n".join(f"`{line.strip()[:90]}`" for line in report.allocations[:5])
+            or "None",
+            inline=False,
+        )
+        embed.add_field(
+            name="Object types",
+            value="\n".join(
+                f"`{name}`: {count} ({growth:+d})"
+                for name, count, growth in report.types[:5]
+            )
+            or "None",
+            inline=False,
+        )
+        embed.add_field(
+            name="Caches",
+            value="\n".join(f"{name}: {size}" for name, size in report.caches.items()),
+            inline=False,
+        )
+        file = discord.File(
+            io.BytesIO(report.render().encode("utf-8")), filename="memory.txt"
+        )
+        await context.send(embed=embed, file=file)
+
+    @memory.command(
+        name="stop",
+        description="Stop tracing allocations.",
+    )
+    @commands.is_owner()
+    async def memory_stop(self, context: Context) -> None:
+        """
+        Stop tracing allocations and drop the baseline.
+
+        :param context: The hybrid command context.
+        """
+        self.memory_tracker.stop()
+        embed = discord.Embed(description="Memory tracing stopped.", color=0xBEBEFE)
+        await context.send(embed=embed)
+
+    @commands.hybrid_command(
+        name="admission",
+        description="Show or change the admission control limits.",
+    )
+    @app_commands.describe(
+        setting="The limit to change, leave empty to show every limit",
+        value="The new value of the limit",
+    )
+    @app_commands.choices(
+        setting=[
+            app_commands.Choice(name=name, value=name)
+            for name in AdmissionController.SETTINGS
+        ]
+    )
+    @commands.is_owner()
+    async def admission(
+        self, context: Context, setting: str = None, value: float = None
+    ) -> None:
+        """
+        Show or change the admission control limits while the bot is running.
+
+        :param context: The hybrid command context.
+        :param setting: The limit to change, leave empty to show every limit.
+        :param value: The new value of the limit.
+        """
+        controller = self.bot.admission
+        if setting is not None:
+            if value is None:
+                embed = discord.Embed(
+                    description=f"Please provide a new value for `{setting}`.",
+                    color=0xE02B2B,
+                )
+                await context.send(embed=embed)
+                return
+            try:
+                controller.configure(setting, value)
+            except ValueError as error:
+                embed = discord.Embed(description=str(error), color=0xE02B2B)
+                await context.send(embed=embed)
+                return
+        embed = discord.Embed(title="Admission control", color=0xBEBEFE)
+        for name, current in controller.settings().items():
+            embed.add_field(name=name, value=f"`{current:g}`", inline=True)
+        embed.set_footer(
+            text=f"{controller.in_flight} commands running, {controller.global_limiter.waiting} waiting"
+        )
+        await context.send(embed=embed)
+
 
 async def setup(bot) -> None:
     await bot.add_cog(Owner(bot))
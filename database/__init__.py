@@ -4,17 +4,194 @@ Database helpers for the Discord event ticket queue bot.
 
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import json
+import os
+import time
+from typing import Any, Collection, Dict, List, Optional, Protocol, Sequence, Tuple
 
 import aiosqlite
 
+from database.dates import SECONDS_PER_DAY, parse_event_date, start_of_day
+from database.search import (
+    SEARCH_LIMIT,
+    SEARCH_SCAN_LIMIT,
+    fts_query,
+    rank_events,
+    search_terms,
+)
+from database.structures import RankedQueue
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "schema.sql")
+
+# Stored in the database's user_version. Bump it whenever schema.sql changes so that
+# existing databases apply the script again on their next start.
+SCHEMA_VERSION = 6
+
+# Rows inserted by one multi-row INSERT, kept well under SQLite's bound-parameter limit.
+QUEUE_BATCH_LIMIT = 400
+
+
+# Columns added to tables after their creation, as (table, column, definition). schema.sql
+# creates them in new databases, older databases get them before the script runs.
+ADDED_COLUMNS = [("events", "starts_at", "INTEGER")]
+
+
+async def ensure_schema(connection: aiosqlite.Connection) -> bool:
+    """
+    Apply `schema.sql` unless the database already records `SCHEMA_VERSION`.
+
+    :param connection: The connection to the database to check.
+    :return: Whether the schema script was run.
+    """
+    async with connection.execute("PRAGMA user_version") as cursor:
+        (version,) = await cursor.fetchone()
+    if version >= SCHEMA_VERSION:
+        return False
+    for table, column, definition in ADDED_COLUMNS:
+        async with connection.execute(f"PRAGMA table_info({table})") as cursor:
+            columns = [row[1] for row in await cursor.fetchall()]
+        if columns and column not in columns:
+            await connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    with open(SCHEMA_PATH, encoding="utf-8") as file:
+        script = file.read()
+    await connection.executescript(script)
+
+    # Parse the dates of events created before starts_at existed.
+    async with connection.execute(
+        "SELECT id, date FROM events WHERE starts_at IS NULL AND date IS NOT NULL"
+    ) as cursor:
+        undated = await cursor.fetchall()
+    parsed = [(parse_event_date(row[1]), row[0]) for row in undated]
+    await connection.executemany(
+        "UPDATE events SET starts_at=? WHERE id=?",
+        [(starts_at, event_id) for starts_at, event_id in parsed if starts_at is not None],
+    )
+    await connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    await connection.commit()
+    return True
+
+
+class StorageBackend(Protocol):
+    """
+    The storage surface the cogs rely on.
+
+    `DatabaseManager` is the SQLite implementation; `database.memory.MemoryDatabaseManager`
+    keeps everything in memory. Rows are returned as dictionaries, except warnings which are
+    `(user_id, server_id, moderator_id, reason, created_at epoch, id)` sequences.
+    """
+
+    async def add_warn(
+        self, user_id: int, server_id: int, moderator_id: int, reason: str
+    ) -> int: ...
+
+    async def remove_warn(self, warn_id: int, user_id: int, server_id: int) -> int: ...
+
+    async def get_warnings(self, user_id: int, server_id: int) -> List[Sequence[Any]]: ...
+
+    async def create_event(
+        self,
+        *,
+        guild_id: int,
+        name: str,
+        created_by: int,
+        source: str,
+        source_id: Optional[str] = None,
+        date: Optional[str] = None,
+        venue: Optional[str] = None,
+        city: Optional[str] = None,
+        url: Optional[str] = None,
+    ) -> int: ...
+
+    async def get_event(self, guild_id: int, event_id: int) -> Optional[Dict[str, Any]]: ...
+
+    async def get_event_by_source(
+        self, guild_id: int, source: str, source_id: str
+    ) -> Optional[Dict[str, Any]]: ...
+
+    async def list_events_with_stats(self, guild_id: int) -> List[Dict[str, Any]]: ...
+
+    async def list_active_events(
+        self, since: str, event_ids: Collection[int] = ()
+    ) -> List[Dict[str, Any]]: ...
+
+    async def list_upcoming_events(
+        self, guild_id: int, *, days: Optional[float] = None, now: Optional[float] = None
+    ) -> List[Dict[str, Any]]: ...
+
+    async def list_past_events(
+        self, guild_id: int, *, limit: Optional[int] = None, now: Optional[float] = None
+    ) -> List[Dict[str, Any]]: ...
+
+    async def search_events(
+        self, guild_id: int, text: str, limit: int = SEARCH_LIMIT
+    ) -> List[Dict[str, Any]]: ...
+
+    async def add_buyer_to_queue(self, event_id: int, user_id: int) -> Tuple[bool, int]: ...
+
+    async def add_buyers_to_queue(
+        self, event_id: int, user_ids: Sequence[int]
+    ) -> List[Tuple[bool, int]]: ...
+
+    async def remove_buyer_from_queue(self, event_id: int, user_id: int) -> None: ...
+
+    async def get_queue_position(self, event_id: int, user_id: int) -> int: ...
+
+    async def get_queue_size(self, event_id: int) -> int: ...
+
+    async def get_next_buyer(self, event_id: int) -> Optional[Dict[str, Any]]: ...
+
+    async def list_queue(
+        self, event_id: int, offset: int = 0, limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]: ...
+
+    async def queue_sizes(self) -> Dict[int, int]: ...
+
+    async def add_ticket_listing(
+        self, event_id: int, seller_id: int, price: float
+    ) -> int: ...
+
+    async def list_tickets(self, event_id: int) -> List[Dict[str, Any]]: ...
+
+    async def get_command_hash(self, scope: str) -> Optional[str]: ...
+
+    async def set_command_hash(self, scope: str, digest: str) -> None: ...
+
+    async def set_status_message(
+        self, event_id: int, channel_id: int, message_id: int
+    ) -> None: ...
+
+    async def remove_status_message(self, event_id: int) -> None: ...
+
+    async def list_status_messages(self) -> List[Dict[str, Any]]: ...
+
+    async def close(self) -> None: ...
+
 
 class DatabaseManager:
     """Asynchronous helper around the SQLite connection."""
 
-    def __init__(self, *, connection: aiosqlite.Connection) -> None:
+    def __init__(
+        self,
+        *,
+        connection: aiosqlite.Connection,
+        id_stride: int = 1,
+        id_offset: int = 1,
+    ) -> None:
+        """
+        :param connection: The SQLite connection to use.
+        :param id_stride: Space between two event IDs. When greater than one, event IDs are
+            allocated as `id_offset + k * id_stride`, so several database files can hand out
+            IDs that never collide.
+        :param id_offset: The first event ID, when `id_stride` is greater than one.
+        """
         self.connection = connection
         self.connection.row_factory = aiosqlite.Row
+        self.id_stride = id_stride
+        self.id_offset = id_offset
+        # Queue members per event, loaded on first use and updated by every queue write.
+        self._queue_members: Dict[int, RankedQueue[str]] = {}
+        self._queue_loads: Dict[int, asyncio.Future] = {}
 
     async def enable_foreign_keys(self) -> None:
         await self.connection.execute("PRAGMA foreign_keys = ON")
@@ -108,19 +285,28 @@ class DatabaseManager:
     ) -> int:
         """Create a new event and return its identifier."""
 
+        if self.id_stride > 1:
+            # Every ID in this file is congruent to the offset, so MAX(id) + stride keeps it that way.
+            id_value = "(SELECT COALESCE(MAX(id), ?) + ? FROM events)"
+            id_params: Tuple[Any, ...] = (self.id_offset - self.id_stride, self.id_stride)
+        else:
+            id_value = "NULL"
+            id_params = ()
         await self.connection.execute(
-            """
+            f"""
             INSERT OR IGNORE INTO events
-            (guild_id, name, created_by, source, source_id, date, venue, city, url)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            (id, guild_id, name, created_by, source, source_id, date, starts_at, venue, city, url)
+            VALUES ({id_value}, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """,
             (
+                *id_params,
                 str(guild_id),
                 name,
                 str(created_by),
                 source,
                 source_id,
                 date,
+                parse_event_date(date),
                 venue,
                 city,
                 url,
@@ -177,7 +363,7 @@ class DatabaseManager:
             LEFT JOIN buyer_queue q ON q.event_id = e.id
             WHERE e.guild_id=?
             GROUP BY e.id
-            ORDER BY e.created_at ASC
+            ORDER BY e.starts_at IS NULL, e.starts_at ASC, e.created_at ASC, e.id ASC
             """,
             (str(guild_id),),
         )
@@ -185,24 +371,263 @@ class DatabaseManager:
             result = await cursor.fetchall()
             return [dict(row) for row in result]
 
+    async def list_upcoming_events(
+        self, guild_id: int, *, days: Optional[float] = None, now: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Return a guild's events starting today or later, soonest first, with their queue sizes.
+
+        :param days: Only return events starting within this many days from now.
+        :param now: The current epoch, for tests.
+        """
+        if now is None:
+            now = time.time()
+        end = now + days * SECONDS_PER_DAY if days is not None else None
+        rows = await self.connection.execute(
+            """
+            SELECT e.*, COUNT(q.id) as queue_size
+            FROM events e
+            LEFT JOIN buyer_queue q ON q.event_id = e.id
+            WHERE e.guild_id=? AND e.starts_at >= ? AND (? IS NULL OR e.starts_at <= ?)
+            GROUP BY e.id
+            ORDER BY e.starts_at ASC, e.id ASC
+            """,
+            (
+                str(guild_id),
+                start_of_day(now),
+                end,
+                end,
+            ),
+        )
+        async with rows as cursor:
+            result = await cursor.fetchall()
+            return [dict(row) for row in result]
+
+    async def list_past_events(
+        self, guild_id: int, *, limit: Optional[int] = None, now: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Return a guild's events that started before today, most recent first.
+
+        :param limit: The most events to return.
+        :param now: The current epoch, for tests.
+        """
+        rows = await self.connection.execute(
+            """
+            SELECT * FROM events
+            WHERE guild_id=? AND starts_at < ?
+            ORDER BY starts_at DESC, id DESC
+            LIMIT ?
+            """,
+            (
+                str(guild_id),
+                start_of_day(now),
+                -1 if limit is None else limit,
+            ),
+        )
+        async with rows as cursor:
+            result = await cursor.fetchall()
+            return [dict(row) for row in result]
+
+    async def search_events(
+        self, guild_id: int, text: str, limit: int = SEARCH_LIMIT
+    ) -> List[Dict[str, Any]]:
+        """
+        Return a guild's events matching a search on their name, venue and city, best first.
+
+        See `database.search` for how events are matched and ranked.
+        """
+        query = fts_query(guild_id, text, every_word=True)
+        if query is None:
+            return []
+        events = await self._scan_search(query)
+        if not events and len(search_terms(text)) > 1:
+            # No event has every word, rank those that have some of them.
+            events = await self._scan_search(fts_query(guild_id, text))
+        return rank_events(events, text, limit)
+
+    async def _scan_search(self, query: str) -> List[Dict[str, Any]]:
+        rows = await self.connection.execute(
+            """
+            SELECT e.* FROM events_fts
+            JOIN events e ON e.id = events_fts.rowid
+            WHERE events_fts MATCH ?
+            LIMIT ?
+            """,
+            (
+                query,
+                SEARCH_SCAN_LIMIT,
+            ),
+        )
+        async with rows as cursor:
+            return [dict(row) for row in await cursor.fetchall()]
+
+    async def list_active_events(
+        self, since: str, event_ids: Collection[int] = ()
+    ) -> List[Dict[str, Any]]:
+        """
+        Return the events of every guild that are dated today or later, or that were created,
+        joined or had a ticket listed since a timestamp.
+
+        :param since: A UTC timestamp in the `CURRENT_TIMESTAMP` format.
+        :param event_ids: Events to return as active regardless, such as those joined in a queue journal.
+        """
+        rows = await self.connection.execute(
+            """
+            SELECT e.* FROM events e
+            WHERE e.starts_at >= :today
+               OR e.created_at >= :since
+               OR e.id IN (SELECT value FROM json_each(:event_ids))
+               OR EXISTS (
+                   SELECT 1 FROM buyer_queue q WHERE q.event_id = e.id AND q.joined_at >= :since
+               )
+               OR EXISTS (
+                   SELECT 1 FROM tickets t WHERE t.event_id = e.id AND t.created_at >= :since
+               )
+            ORDER BY e.id ASC
+            """,
+            {"since": since, "today": start_of_day(), "event_ids": json.dumps(list(event_ids))},
+        )
+        async with rows as cursor:
+            result = await cursor.fetchall()
+            return [dict(row) for row in result]
+
+    async def _members(self, event_id: int) -> RankedQueue[str]:
+        """
+        Return the in-memory membership index of an event's queue, loading it on first use.
+
+        Concurrent callers share a single load, so no write can land between the read and
+        the index being installed.
+        """
+        members = self._queue_members.get(event_id)
+        if members is not None:
+            return members
+        load = self._queue_loads.get(event_id)
+        if load is None:
+            load = self._queue_loads[event_id] = asyncio.ensure_future(
+                self._load_members(event_id)
+            )
+        try:
+            return await asyncio.shield(load)
+        finally:
+            if self._queue_loads.get(event_id) is load and load.done():
+                del self._queue_loads[event_id]
+
+    async def _load_members(self, event_id: int) -> RankedQueue[str]:
+        rows = await self.connection.execute(
+            "SELECT user_id FROM buyer_queue WHERE event_id=? ORDER BY id ASC",
+            (event_id,),
+        )
+        members: RankedQueue[str] = RankedQueue()
+        async with rows as cursor:
+            for row in await cursor.fetchall():
+                members.append(row[0])
+        self._queue_members[event_id] = members
+        return members
+
     async def add_buyer_to_queue(
         self, event_id: int, user_id: int
     ) -> Tuple[bool, int]:
+        members = await self._members(event_id)
+        user = str(user_id)
+        position = members.rank(user)
+        if position:
+            return False, position
+        # Reserve the position before the insert so concurrent joins keep arrival order.
+        position = members.append(user)
         try:
             cursor = await self.connection.execute(
                 "INSERT INTO buyer_queue(event_id, user_id) VALUES (?, ?)",
                 (
                     event_id,
-                    str(user_id),
+                    user,
                 ),
             )
             await self.connection.commit()
             await cursor.close()
-            position = await self._queue_position(event_id, str(user_id))
             return True, position
         except aiosqlite.IntegrityError:
-            position = await self._queue_position(event_id, str(user_id))
+            # The index disagrees with the table (or the event is gone), rebuild it next time.
+            self._queue_members.pop(event_id, None)
+            position = await self._queue_position(event_id, user)
             return False, position
+        except BaseException:
+            self._queue_members.pop(event_id, None)
+            raise
+
+    async def add_buyers_to_queue(
+        self, event_id: int, user_ids: Sequence[int]
+    ) -> List[Tuple[bool, int]]:
+        """
+        Add several buyers to a queue in the given order with a single commit.
+
+        Positions come from the tail of the membership index, so the whole batch costs one
+        INSERT per `QUEUE_BATCH_LIMIT` new buyers.
+
+        :return: `(added, position)` for every user, in the order given.
+        """
+        members = await self._members(event_id)
+        results: List[Tuple[bool, int]] = []
+        new_rows: List[Tuple[int, str]] = []
+        for user_id in user_ids:
+            user = str(user_id)
+            position = members.rank(user)
+            if position:
+                results.append((False, position))
+                continue
+            results.append((True, members.append(user)))
+            new_rows.append((event_id, user))
+        if not new_rows:
+            return results
+
+        inserted = 0
+        try:
+            for start in range(0, len(new_rows), QUEUE_BATCH_LIMIT):
+                chunk = new_rows[start : start + QUEUE_BATCH_LIMIT]
+                await self.connection.execute(
+                    "INSERT INTO buyer_queue(event_id, user_id) VALUES "
+                    + ", ".join(["(?, ?)"] * len(chunk)),
+                    [value for row in chunk for value in row],
+                )
+                inserted += len(chunk)
+            await self.connection.commit()
+        except aiosqlite.IntegrityError:
+            # The index disagrees with the table. A failed chunk inserts none of its rows, so it
+            # and the chunks after it are retried one row at a time to only skip the offending ones.
+            self._queue_members.pop(event_id, None)
+            skipped = set()
+            for row in new_rows[inserted:]:
+                try:
+                    await self.connection.execute(
+                        "INSERT INTO buyer_queue(event_id, user_id) VALUES (?, ?)", row
+                    )
+                except aiosqlite.IntegrityError:
+                    skipped.add(row[1])
+            await self.connection.commit()
+            retried = {user for _, user in new_rows[inserted:]}
+            positions: Dict[str, int] = {}
+            for user in retried:
+                positions[user] = await self._queue_position(event_id, user)
+            return [
+                (added and str(user_id) not in skipped, positions[str(user_id)])
+                if str(user_id) in retried
+                else (added, position)
+                for user_id, (added, position) in zip(user_ids, results)
+            ]
+        except BaseException:
+            self._queue_members.pop(event_id, None)
+            raise
+        return results
+
+    async def get_queue_size(self, event_id: int) -> int:
+        """Return the number of buyers queued for an event, loading its membership index if needed."""
+
+        return len(await self._members(event_id))
+
+    async def get_queue_position(self, event_id: int, user_id: int) -> int:
+        """Return the 1-based queue position of a user, or 0 when they are not queued."""
+
+        return (await self._members(event_id)).rank(str(user_id))
 
     async def _queue_position(self, event_id: int, user_id: str) -> int:
         rows = await self.connection.execute(
@@ -223,14 +648,22 @@ class DatabaseManager:
             return int(result[0]) if result and result[0] is not None else 0
 
     async def remove_buyer_from_queue(self, event_id: int, user_id: int) -> None:
-        await self.connection.execute(
-            "DELETE FROM buyer_queue WHERE event_id=? AND user_id=?",
-            (
-                event_id,
-                str(user_id),
-            ),
-        )
-        await self.connection.commit()
+        members = await self._members(event_id)
+        user = str(user_id)
+        if not members.remove(user):
+            return
+        try:
+            await self.connection.execute(
+                "DELETE FROM buyer_queue WHERE event_id=? AND user_id=?",
+                (
+                    event_id,
+                    user,
+                ),
+            )
+            await self.connection.commit()
+        except BaseException:
+            self._queue_members.pop(event_id, None)
+            raise
 
     async def get_next_buyer(self, event_id: int) -> Optional[Dict[str, Any]]:
         rows = await self.connection.execute(
@@ -241,15 +674,61 @@ class DatabaseManager:
             result = await cursor.fetchone()
             return dict(result) if result else None
 
-    async def list_queue(self, event_id: int) -> List[Dict[str, Any]]:
+    async def list_queue(
+        self, event_id: int, offset: int = 0, limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Return the queue of an event in order.
+
+        :param offset: The number of entries to skip from the head.
+        :param limit: The most entries to return, all of them when `None`.
+        """
+        members = self._queue_members.get(event_id)
+        start = members.select(offset + 1) if offset and members is not None else None
+        if start is not None:
+            # Seek to the first row of the page through the (event_id, user_id) index and
+            # read forward on (event_id, id), instead of stepping over `offset` rows.
+            rows = await self.connection.execute(
+                """
+                SELECT * FROM buyer_queue
+                WHERE event_id=? AND id >= (
+                    SELECT id FROM buyer_queue WHERE event_id=? AND user_id=?
+                )
+                ORDER BY id ASC LIMIT ?
+                """,
+                (
+                    event_id,
+                    event_id,
+                    start[0],
+                    -1 if limit is None else limit,
+                ),
+            )
+            async with rows as cursor:
+                result = await cursor.fetchall()
+            if result:
+                return [dict(row) for row in result]
         rows = await self.connection.execute(
-            "SELECT * FROM buyer_queue WHERE event_id=? ORDER BY id ASC",
-            (event_id,),
+            "SELECT * FROM buyer_queue WHERE event_id=? ORDER BY id ASC LIMIT ? OFFSET ?",
+            (
+                event_id,
+                -1 if limit is None else limit,
+                offset,
+            ),
         )
         async with rows as cursor:
             result = await cursor.fetchall()
             return [dict(row) for row in result]
 
+    async def queue_sizes(self) -> Dict[int, int]:
+        """Return the number of queued buyers for every event with a non-empty queue."""
+
+        rows = await self.connection.execute(
+            "SELECT event_id, COUNT(*) FROM buyer_queue GROUP BY event_id"
+        )
+        async with rows as cursor:
+            result = await cursor.fetchall()
+            return {int(row[0]): int(row[1]) for row in result}
+
     async def add_ticket_listing(
         self, event_id: int, seller_id: int, price: float
     ) -> int:
@@ -273,5 +752,77 @@ class DatabaseManager:
             result = await cursor.fetchall()
             return [dict(row) for row in result]
 
+    async def get_command_hash(self, scope: str) -> Optional[str]:
+        """Return the hash of the command tree last synced for a scope, if any."""
+
+        rows = await self.connection.execute(
+            "SELECT hash FROM command_sync WHERE scope=?", (scope,)
+        )
+        async with rows as cursor:
+            result = await cursor.fetchone()
+            return result[0] if result else None
+
+    async def set_command_hash(self, scope: str, digest: str) -> None:
+        await self.connection.execute(
+            """
+            INSERT INTO command_sync(scope, hash) VALUES (?, ?)
+            ON CONFLICT(scope) DO UPDATE SET hash=excluded.hash, synced_at=CURRENT_TIMESTAMP
+            """,
+            (
+                scope,
+                digest,
+            ),
+        )
+        await self.connection.commit()
+
+    async def set_status_message(
+        self, event_id: int, channel_id: int, message_id: int
+    ) -> None:
+        """Record the live queue status message of an event, replacing any previous one."""
+
+        await self.connection.execute(
+            """
+            INSERT INTO queue_status_messages(event_id, channel_id, message_id) VALUES (?, ?, ?)
+            ON CONFLICT(event_id) DO UPDATE SET
+                channel_id=excluded.channel_id, message_id=excluded.message_id
+            """,
+            (
+                event_id,
+                str(channel_id),
+                str(message_id),
+            ),
+        )
+        await self.connection.commit()
+
+    async def remove_status_message(self, event_id: int) -> None:
+        await self.connection.execute(
+            "DELETE FROM queue_status_messages WHERE event_id=?", (event_id,)
+        )
+        await self.connection.commit()
+
+    async def list_status_messages(self) -> List[Dict[str, Any]]:
+        """
+        Return every live queue status message, with the guild of its event (None when the event is gone).
+        """
+        rows = await self.connection.execute(
+            """
+            SELECT m.event_id, m.channel_id, m.message_id, e.guild_id
+            FROM queue_status_messages AS m
+            LEFT JOIN events AS e ON e.id = m.event_id
+            ORDER BY m.event_id ASC
+            """
+        )
+        async with rows as cursor:
+            result = await cursor.fetchall()
+            return [
+                {
+                    "event_id": row[0],
+                    "channel_id": row[1],
+                    "message_id": row[2],
+                    "guild_id": row[3],
+                }
+                for row in result
+            ]
+
     async def close(self) -> None:
         await self.connection.close()
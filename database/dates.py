@@ -0,0 +1,71 @@
+"""
+Event date parsing.
+
+`events.date` keeps whatever text the event was created with, for display. It
+is also parsed into `events.starts_at`, seconds since the epoch in UTC, which
+is what events are sorted and filtered by. Dates without a time start at
+midnight UTC and times without an offset are taken as UTC.
+"""
+
+from __future__ import annotations
+
+import re
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+# Tried in order after ISO 8601, once weekdays and ordinal suffixes are removed.
+DATE_FORMATS = (
+    "%m/%d/%Y %H:%M",
+    "%m/%d/%Y",
+    "%B %d %Y %I:%M %p",
+    "%B %d %Y %H:%M",
+    "%B %d %Y",
+    "%b %d %Y",
+    "%d %B %Y",
+    "%d %b %Y",
+)
+
+_WEEKDAY = re.compile(
+    r"^(mon|tue|tues|wed|thu|thur|thurs|fri|sat|sun)[a-z]*\.?,?\s+", re.IGNORECASE
+)
+_ORDINAL = re.compile(r"(\d)(st|nd|rd|th)\b", re.IGNORECASE)
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def parse_event_date(text: Optional[str]) -> Optional[int]:
+    """
+    Return when an event starts, in seconds since the epoch, or None if the text is not a date.
+
+    Accepts ISO 8601 dates and times, such as EDMTrain's `date` and `startDate`, US style
+    dates ("06/14/2025") and written dates ("Saturday, June 14th, 2025").
+    """
+    if not text:
+        return None
+    text = text.strip()
+    try:
+        parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        cleaned = _ORDINAL.sub(r"\1", _WEEKDAY.sub("", text)).replace(",", " ")
+        cleaned = " ".join(cleaned.split())
+        for pattern in DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(cleaned, pattern)
+                break
+            except ValueError:
+                continue
+        else:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def start_of_day(now: Optional[float] = None) -> int:
+    """Return the epoch of midnight UTC on the day of `now`, today by default."""
+    if now is None:
+        now = time.time()
+    return int(now) - int(now) % SECONDS_PER_DAY
@@ -0,0 +1,493 @@
+"""
+Append-only journal with snapshots, used as a buyer queue persistence engine.
+
+Queues are kept in memory as `RankedQueue`s. Every join and leave is appended
+to a binary journal as a fixed-size record; records are buffered for a few
+milliseconds and written with a single fsync (group commit). A change is only
+applied to the in-memory queue, and its call only returns, once its record is
+on disk, so a failed write leaves the queues as they were. Once enough records have accumulated the
+queues are compacted into a snapshot and a new journal generation is started.
+Startup loads the latest snapshot and replays the journals written since.
+
+Files in the journal directory:
+- `queues-<generation>.snapshot` – every queued entry, in queue order
+- `queues-<generation>.journal` – the records appended since that snapshot
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import glob
+import logging
+import os
+import struct
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Callable, Collection, Dict, List, Optional, Sequence, Tuple
+
+from database import StorageBackend
+from database.search import SEARCH_LIMIT
+from database.structures import RankedQueue
+
+JOIN = 1
+LEAVE = 2
+
+# op, event ID, user ID, entry ID, joined at (epoch seconds), CRC32 of the preceding fields.
+RECORD = struct.Struct("<BqqqdI")
+PAYLOAD = struct.Struct("<Bqqqd")
+# magic, generation, next entry ID
+SNAPSHOT_HEADER = struct.Struct("<4sqq")
+SNAPSHOT_MAGIC = b"QSNP"
+
+
+def _pack(op: int, event_id: int, user_id: int, entry_id: int, joined_at: float) -> bytes:
+    payload = PAYLOAD.pack(op, event_id, user_id, entry_id, joined_at)
+    return payload + struct.pack("<I", zlib.crc32(payload))
+
+
+def _epoch(timestamp: str) -> float:
+    return datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+
+
+def _timestamp(epoch: float) -> str:
+    # Same format as SQLite's CURRENT_TIMESTAMP.
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class QueueJournal:
+    def __init__(
+        self,
+        directory: str,
+        *,
+        flush_interval: float = 0.005,
+        snapshot_every: int = 100_000,
+    ) -> None:
+        """
+        :param directory: The directory holding the journal and snapshot files.
+        :param flush_interval: How long records are buffered before being written together, in seconds.
+        :param snapshot_every: How many records trigger a compaction into a new snapshot.
+        """
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+        self.queues: Dict[int, RankedQueue] = {}
+        self.next_id = 1
+        self.generation = 0
+        self._records = 0
+        self._file: Optional[BinaryIO] = None
+        # Bytes of the current journal known to be intact, where a failed write is cut back to.
+        self._size = 0
+        self._buffer = bytearray()
+        self._waiters: List[Tuple[asyncio.Future, Callable[[], Any]]] = []
+        # Joins and leaves whose records are not on disk yet, by event and user.
+        self._joining: Counter = Counter()
+        self._leaving: Counter = Counter()
+        self.logger = logging.getLogger("discord_bot")
+        self._flusher: Optional[asyncio.Task] = None
+
+    def _path(self, generation: int, kind: str) -> str:
+        return os.path.join(self.directory, f"queues-{generation}.{kind}")
+
+    @staticmethod
+    def _generation_of(path: str) -> int:
+        return int(os.path.basename(path).split("-", 1)[1].split(".", 1)[0])
+
+    async def open(self) -> None:
+        """
+        Load the latest snapshot, replay the journals written after it and open the journal for appending.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        await asyncio.to_thread(self._load)
+
+    def _load(self) -> None:
+        snapshots = sorted(
+            glob.glob(self._path("*", "snapshot")), key=self._generation_of
+        )
+        if snapshots:
+            self._read_snapshot(snapshots[-1])
+        journals = sorted(
+            (
+                path
+                for path in glob.glob(self._path("*", "journal"))
+                if self._generation_of(path) >= self.generation
+            ),
+            key=self._generation_of,
+        )
+        for path in journals:
+            valid_length = self._replay(path)
+            self.generation = self._generation_of(path)
+        if journals and valid_length < os.path.getsize(journals[-1]):
+            # Drop a record torn by a crash so new records are not appended after garbage.
+            os.truncate(journals[-1], valid_length)
+        self._open_journal()
+
+    def _open_journal(self) -> None:
+        # Unbuffered, so a failed write leaves nothing behind to be written later.
+        self._file = open(self._path(self.generation, "journal"), "ab", buffering=0)
+        self._size = os.fstat(self._file.fileno()).st_size
+
+    def _read_snapshot(self, path: str) -> None:
+        with open(path, "rb") as file:
+            magic, self.generation, self.next_id = SNAPSHOT_HEADER.unpack(
+                file.read(SNAPSHOT_HEADER.size)
+            )
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"{path} is not a queue snapshot")
+            self._apply_records(file.read())
+
+    def _replay(self, path: str) -> int:
+        with open(path, "rb") as file:
+            data = file.read()
+        valid_length = self._apply_records(data)
+        self._records += valid_length // RECORD.size
+        return valid_length
+
+    def _apply_records(self, data: bytes) -> int:
+        offset = 0
+        while offset + RECORD.size <= len(data):
+            op, event_id, user_id, entry_id, joined_at, checksum = RECORD.unpack_from(
+                data, offset
+            )
+            if zlib.crc32(data[offset : offset + PAYLOAD.size]) != checksum:
+                break
+            self._apply(op, event_id, user_id, entry_id, joined_at)
+            offset += RECORD.size
+        return offset
+
+    def _apply(
+        self, op: int, event_id: int, user_id: int, entry_id: int, joined_at: float
+    ) -> None:
+        queue = self.queues.setdefault(event_id, RankedQueue())
+        user = str(user_id)
+        if op == JOIN and user not in queue:
+            queue.append(user, self._entry(event_id, user, entry_id, joined_at))
+            self.next_id = max(self.next_id, entry_id + 1)
+        elif op == LEAVE:
+            queue.remove(user)
+
+    @staticmethod
+    def _entry(event_id: int, user: str, entry_id: int, joined_at: float) -> Dict[str, Any]:
+        return {"id": entry_id, "event_id": event_id, "user_id": user, "joined_at": joined_at}
+
+    async def join(self, event_id: int, user_id: int) -> Tuple[bool, int]:
+        """
+        Append a user to an event's queue.
+
+        :return: Whether the user was added, and their position.
+        """
+        queue = self.queues.setdefault(event_id, RankedQueue())
+        user = str(user_id)
+        key = (event_id, user)
+        if user in queue and key not in self._leaving:
+            return False, queue.rank(user)
+        entry_id = self.next_id
+        self.next_id += 1
+        joined_at = time.time()
+        entry = self._entry(event_id, user, entry_id, joined_at)
+
+        def apply() -> Tuple[bool, int]:
+            # A concurrent join of the same user may have been written first.
+            if user in queue:
+                return False, queue.rank(user)
+            return True, queue.append(user, entry)
+
+        return await self._append_pending(
+            self._joining, key, _pack(JOIN, event_id, int(user_id), entry_id, joined_at), apply
+        )
+
+    async def leave(self, event_id: int, user_id: int) -> None:
+        queue = self.queues.get(event_id)
+        user = str(user_id)
+        key = (event_id, user)
+        if (queue is None or user not in queue) and key not in self._joining:
+            return
+        await self._append_pending(
+            self._leaving,
+            key,
+            _pack(LEAVE, event_id, int(user_id), 0, 0.0),
+            functools.partial(self._apply, LEAVE, event_id, int(user_id), 0, 0.0),
+        )
+
+    async def _append_pending(
+        self,
+        pending: Counter,
+        key: Tuple[int, str],
+        record: bytes,
+        apply: Callable[[], Any],
+    ) -> Any:
+        # Until its record is applied, the change is invisible in the queues but counted here.
+        pending[key] += 1
+        try:
+            return await self._append(record, apply)
+        finally:
+            pending[key] -= 1
+            if not pending[key]:
+                del pending[key]
+
+    def last_joined(self, event_id: int) -> Optional[float]:
+        """Return when the most recent member of an event's queue joined, in epoch seconds."""
+        queue = self.queues.get(event_id)
+        last = queue.select(len(queue)) if queue else None
+        return last[1]["joined_at"] if last else None
+
+    def position(self, event_id: int, user_id: int) -> int:
+        queue = self.queues.get(event_id)
+        return queue.rank(str(user_id)) if queue is not None else 0
+
+    def entries(
+        self, event_id: int, offset: int = 0, limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        queue = self.queues.get(event_id)
+        if queue is None:
+            return []
+        count = len(queue) if limit is None else limit
+        return [
+            {**entry, "joined_at": _timestamp(entry["joined_at"])}
+            for _, entry in queue.slice(offset + 1, count)
+        ]
+
+    def head(self, event_id: int) -> Optional[Dict[str, Any]]:
+        queue = self.queues.get(event_id)
+        head = queue.head() if queue is not None else None
+        return {**head[1], "joined_at": _timestamp(head[1]["joined_at"])} if head else None
+
+    async def _append(self, record: bytes, apply: Callable[[], Any]) -> Any:
+        """
+        Write a record with the next group commit, then apply its change to memory.
+
+        :return: What `apply` returned.
+        """
+        self._buffer += record
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append((waiter, apply))
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_later())
+        return await waiter
+
+    async def _flush_later(self) -> None:
+        try:
+            while self._buffer:
+                await asyncio.sleep(self.flush_interval)
+                try:
+                    await self._flush()
+                except Exception:
+                    # Only that batch failed, records appended since are still written.
+                    self.logger.exception("Could not write the queue journal")
+        finally:
+            self._flusher = None
+
+    async def _flush(self) -> None:
+        data, self._buffer = bytes(self._buffer), bytearray()
+        waiters, self._waiters = self._waiters, []
+        try:
+            await asyncio.to_thread(self._write, self._file, data)
+        except Exception as e:
+            # Cut off a partly written batch, replay would stop at it and drop every later record.
+            try:
+                await asyncio.to_thread(self._file.truncate, self._size)
+            except OSError:
+                self.logger.exception("Could not truncate the queue journal")
+            for waiter, _ in waiters:
+                if not waiter.done():
+                    waiter.set_exception(e)
+            raise
+        self._size += len(data)
+        # Changes are applied in record order, and before a compaction snapshots the queues.
+        for waiter, apply in waiters:
+            result = apply()
+            if not waiter.done():
+                waiter.set_result(result)
+        self._records += len(data) // RECORD.size
+        if self._records >= self.snapshot_every:
+            await self._compact()
+
+    @staticmethod
+    def _write(file: BinaryIO, data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            view = view[file.write(view) :]
+        os.fsync(file.fileno())
+
+    async def _compact(self) -> None:
+        """
+        Write every queue to a new snapshot and start a new journal generation.
+        """
+        # The state is captured and the journal switched on the loop, so no record can fall in between.
+        header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, self.generation + 1, self.next_id)
+        body = b"".join(
+            _pack(JOIN, event_id, int(user), entry["id"], entry["joined_at"])
+            for event_id, queue in self.queues.items()
+            for user, entry in queue
+        )
+        previous = self._file
+        self.generation += 1
+        self._records = 0
+        self._open_journal()
+        await asyncio.to_thread(self._write_snapshot, self.generation, header + body, previous)
+
+    def _write_snapshot(self, generation: int, data: bytes, previous: BinaryIO) -> None:
+        previous.close()
+        temporary = self._path(generation, "snapshot.tmp")
+        with open(temporary, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self._path(generation, "snapshot"))
+        for kind in ("snapshot", "journal"):
+            for path in glob.glob(self._path("*", kind)):
+                if self._generation_of(path) < generation:
+                    os.remove(path)
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            await self._flusher
+        if self._buffer:
+            await self._flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class JournaledQueueManager:
+    """
+    Serves the buyer queue from a `QueueJournal` and everything else from another backend.
+
+    Events are validated by the cogs before queue calls, the queue itself holds no reference
+    to the events table.
+    """
+
+    def __init__(self, backend: StorageBackend, journal: QueueJournal) -> None:
+        self.backend = backend
+        self.journal = journal
+
+    async def enable_foreign_keys(self) -> None:
+        enable = getattr(self.backend, "enable_foreign_keys", None)
+        if enable is not None:
+            await enable()
+
+    async def add_buyer_to_queue(self, event_id: int, user_id: int) -> Tuple[bool, int]:
+        return await self.journal.join(event_id, user_id)
+
+    async def add_buyers_to_queue(
+        self, event_id: int, user_ids: Sequence[int]
+    ) -> List[Tuple[bool, int]]:
+        # Every record is appended before the first flush, so the batch shares one group commit.
+        return list(
+            await asyncio.gather(
+                *(self.journal.join(event_id, user_id) for user_id in user_ids)
+            )
+        )
+
+    async def remove_buyer_from_queue(self, event_id: int, user_id: int) -> None:
+        await self.journal.leave(event_id, user_id)
+
+    async def get_queue_position(self, event_id: int, user_id: int) -> int:
+        return self.journal.position(event_id, user_id)
+
+    async def get_queue_size(self, event_id: int) -> int:
+        return len(self.journal.queues.get(event_id, ()))
+
+    async def get_next_buyer(self, event_id: int) -> Optional[Dict[str, Any]]:
+        return self.journal.head(event_id)
+
+    async def list_queue(
+        self, event_id: int, offset: int = 0, limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        return self.journal.entries(event_id, offset, limit)
+
+    async def queue_sizes(self) -> Dict[int, int]:
+        return {
+            event_id: len(queue)
+            for event_id, queue in self.journal.queues.items()
+            if len(queue)
+        }
+
+    async def list_events_with_stats(self, guild_id: int) -> List[Dict[str, Any]]:
+        events = await self.backend.list_events_with_stats(guild_id)
+        for event in events:
+            event["queue_size"] = len(self.journal.queues.get(event["id"], ()))
+        return events
+
+    async def list_active_events(
+        self, since: str, event_ids: Collection[int] = ()
+    ) -> List[Dict[str, Any]]:
+        # The backend holds no queue entries, recent joins are only known to the journal.
+        joined_since = _epoch(since)
+        recent = {
+            event_id
+            for event_id in self.journal.queues
+            if (self.journal.last_joined(event_id) or 0) >= joined_since
+        }
+        return await self.backend.list_active_events(since, recent.union(event_ids))
+
+    async def list_upcoming_events(
+        self, guild_id: int, *, days: Optional[float] = None, now: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        events = await self.backend.list_upcoming_events(guild_id, days=days, now=now)
+        for event in events:
+            event["queue_size"] = len(self.journal.queues.get(event["id"], ()))
+        return events
+
+    async def list_past_events(
+        self, guild_id: int, *, limit: Optional[int] = None, now: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        return await self.backend.list_past_events(guild_id, limit=limit, now=now)
+
+    async def search_events(
+        self, guild_id: int, text: str, limit: int = SEARCH_LIMIT
+    ) -> List[Dict[str, Any]]:
+        return await self.backend.search_events(guild_id, text, limit)
+
+    async def add_warn(
+        self, user_id: int, server_id: int, moderator_id: int, reason: str
+    ) -> int:
+        return await self.backend.add_warn(user_id, server_id, moderator_id, reason)
+
+    async def remove_warn(self, warn_id: int, user_id: int, server_id: int) -> int:
+        return await self.backend.remove_warn(warn_id, user_id, server_id)
+
+    async def get_warnings(self, user_id: int, server_id: int) -> List[Any]:
+        return await self.backend.get_warnings(user_id, server_id)
+
+    async def create_event(self, **kwargs: Any) -> int:
+        return await self.backend.create_event(**kwargs)
+
+    async def get_event(self, guild_id: int, event_id: int) -> Optional[Dict[str, Any]]:
+        return await self.backend.get_event(guild_id, event_id)
+
+    async def get_event_by_source(
+        self, guild_id: int, source: str, source_id: str
+    ) -> Optional[Dict[str, Any]]:
+        return await self.backend.get_event_by_source(guild_id, source, source_id)
+
+    async def add_ticket_listing(
+        self, event_id: int, seller_id: int, price: float
+    ) -> int:
+        return await self.backend.add_ticket_listing(event_id, seller_id, price)
+
+    async def list_tickets(self, event_id: int) -> List[Dict[str, Any]]:
+        return await self.backend.list_tickets(event_id)
+
+    async def get_command_hash(self, scope: str) -> Optional[str]:
+        return await self.backend.get_command_hash(scope)
+
+    async def set_command_hash(self, scope: str, digest: str) -> None:
+        await self.backend.set_command_hash(scope, digest)
+
+    async def set_status_message(
+        self, event_id: int, channel_id: int, message_id: int
+    ) -> None:
+        await self.backend.set_status_message(event_id, channel_id, message_id)
+
+    async def remove_status_message(self, event_id: int) -> None:
+        await self.backend.remove_status_message(event_id)
+
+    async def list_status_messages(self) -> List[Dict[str, Any]]:
+        return await self.backend.list_status_messages()
+
+    async def close(self) -> None:
+        await self.journal.close()
+        await self.backend.close()
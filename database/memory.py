@@ -0,0 +1,391 @@
+"""
+Pure in-memory storage engine.
+
+`MemoryDatabaseManager` implements the same surface as `DatabaseManager` with
+dictionaries and `RankedQueue`s, so tests and benchmarks can skip SQLite
+entirely. State can optionally be snapshotted to a JSON file and reloaded on
+start; anything written after the last snapshot is lost on a crash.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import Any, Collection, Dict, List, Optional, Sequence, Tuple
+
+from database.dates import SECONDS_PER_DAY, parse_event_date, start_of_day
+from database.search import SEARCH_LIMIT, rank_events
+from database.structures import RankedQueue
+
+
+def _timestamp() -> str:
+    # Same format as SQLite's CURRENT_TIMESTAMP.
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _epoch(timestamp: str) -> str:
+    parsed = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
+    return str(int(parsed.replace(tzinfo=timezone.utc).timestamp()))
+
+
+def _chronological(event: Dict[str, Any]) -> Tuple[bool, int, str, int]:
+    # Like ORDER BY starts_at in SQLite, with undated events last.
+    starts_at = event["starts_at"]
+    return (starts_at is None, starts_at or 0, event["created_at"], event["id"])
+
+
+class MemoryDatabaseManager:
+    """In-memory implementation of the storage surface of `DatabaseManager`."""
+
+    def __init__(self, *, snapshot_path: Optional[str] = None) -> None:
+        """
+        :param snapshot_path: Optional JSON file the state is loaded from and saved to.
+        """
+        self.snapshot_path = snapshot_path
+        self._events: Dict[int, Dict[str, Any]] = {}
+        self._events_by_guild: Dict[str, List[int]] = {}
+        self._events_by_source: Dict[Tuple[str, str, str], int] = {}
+        self._events_by_name: Dict[Tuple[str, str], int] = {}
+        self._queues: Dict[int, RankedQueue] = {}
+        self._tickets: Dict[int, List[Dict[str, Any]]] = {}
+        self._warns: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        self._sequences = {"events": 0, "buyer_queue": 0, "tickets": 0}
+        self._command_hashes: Dict[str, str] = {}
+        self._status_messages: Dict[int, Dict[str, Any]] = {}
+        self._autosave: Optional[asyncio.Task] = None
+        if snapshot_path and os.path.exists(snapshot_path):
+            with open(snapshot_path, encoding="utf-8") as file:
+                self._restore(json.load(file))
+
+    def _next_id(self, table: str) -> int:
+        self._sequences[table] += 1
+        return self._sequences[table]
+
+    async def enable_foreign_keys(self) -> None:
+        # References are always checked by this engine.
+        return
+
+    async def add_warn(
+        self, user_id: int, server_id: int, moderator_id: int, reason: str
+    ) -> int:
+        warns = self._warns.setdefault((str(user_id), str(server_id)), [])
+        warn_id = warns[-1]["id"] + 1 if warns else 1
+        warns.append(
+            {
+                "id": warn_id,
+                "moderator_id": str(moderator_id),
+                "reason": reason,
+                "created_at": _timestamp(),
+            }
+        )
+        return warn_id
+
+    async def remove_warn(self, warn_id: int, user_id: int, server_id: int) -> int:
+        warns = self._warns.get((str(user_id), str(server_id)), [])
+        warns[:] = [warn for warn in warns if warn["id"] != warn_id]
+        return len(warns)
+
+    async def get_warnings(self, user_id: int, server_id: int) -> List[tuple]:
+        return [
+            (
+                str(user_id),
+                str(server_id),
+                warn["moderator_id"],
+                warn["reason"],
+                _epoch(warn["created_at"]),
+                warn["id"],
+            )
+            for warn in self._warns.get((str(user_id), str(server_id)), [])
+        ]
+
+    async def create_event(
+        self,
+        *,
+        guild_id: int,
+        name: str,
+        created_by: int,
+        source: str,
+        source_id: Optional[str] = None,
+        date: Optional[str] = None,
+        venue: Optional[str] = None,
+        city: Optional[str] = None,
+        url: Optional[str] = None,
+    ) -> int:
+        guild = str(guild_id)
+        # Like the UNIQUE constraint in SQLite, a NULL source ID never conflicts.
+        source_key = (guild, source, source_id) if source_id is not None else None
+        if source_key is None or source_key not in self._events_by_source:
+            event = {
+                "id": self._next_id("events"),
+                "guild_id": guild,
+                "name": name,
+                "date": date,
+                "starts_at": parse_event_date(date),
+                "venue": venue,
+                "city": city,
+                "url": url,
+                "source": source,
+                "source_id": source_id,
+                "created_by": str(created_by),
+                "created_at": _timestamp(),
+            }
+            self._add_event(event)
+        return self._events_by_name[(guild, name)]
+
+    def _add_event(self, event: Dict[str, Any]) -> None:
+        self._events[event["id"]] = event
+        self._events_by_guild.setdefault(event["guild_id"], []).append(event["id"])
+        if event["source_id"] is not None:
+            self._events_by_source[
+                (event["guild_id"], event["source"], event["source_id"])
+            ] = event["id"]
+        self._events_by_name[(event["guild_id"], event["name"])] = event["id"]
+
+    async def get_event(self, guild_id: int, event_id: int) -> Optional[Dict[str, Any]]:
+        event = self._events.get(event_id)
+        if event is None or event["guild_id"] != str(guild_id):
+            return None
+        return dict(event)
+
+    async def get_event_by_source(
+        self, guild_id: int, source: str, source_id: str
+    ) -> Optional[Dict[str, Any]]:
+        event_id = self._events_by_source.get((str(guild_id), source, source_id))
+        return dict(self._events[event_id]) if event_id is not None else None
+
+    async def list_events_with_stats(self, guild_id: int) -> List[Dict[str, Any]]:
+        events = [self._events[event_id] for event_id in self._events_by_guild.get(str(guild_id), [])]
+        return [
+            {**event, "queue_size": len(self._queues.get(event["id"], ()))}
+            for event in sorted(events, key=_chronological)
+        ]
+
+    async def search_events(
+        self, guild_id: int, text: str, limit: int = SEARCH_LIMIT
+    ) -> List[Dict[str, Any]]:
+        events = [self._events[event_id] for event_id in self._events_by_guild.get(str(guild_id), [])]
+        return [dict(event) for event in rank_events(events, text, limit)]
+
+    async def list_upcoming_events(
+        self, guild_id: int, *, days: Optional[float] = None, now: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        if now is None:
+            now = time.time()
+        start = start_of_day(now)
+        end = now + days * SECONDS_PER_DAY if days is not None else float("inf")
+        events = [
+            event
+            for event in map(self._events.get, self._events_by_guild.get(str(guild_id), []))
+            if event["starts_at"] is not None and start <= event["starts_at"] <= end
+        ]
+        return [
+            {**event, "queue_size": len(self._queues.get(event["id"], ()))}
+            for event in sorted(events, key=_chronological)
+        ]
+
+    async def list_past_events(
+        self, guild_id: int, *, limit: Optional[int] = None, now: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        start = start_of_day(now)
+        events = [
+            event
+            for event in map(self._events.get, self._events_by_guild.get(str(guild_id), []))
+            if event["starts_at"] is not None and event["starts_at"] < start
+        ]
+        events.sort(key=_chronological, reverse=True)
+        return [dict(event) for event in events[:limit]]
+
+    async def list_active_events(
+        self, since: str, event_ids: Collection[int] = ()
+    ) -> List[Dict[str, Any]]:
+        today = start_of_day()
+        event_ids = set(event_ids)
+
+        def active(event: Dict[str, Any]) -> bool:
+            if (event["starts_at"] or 0) >= today or event["created_at"] >= since:
+                return True
+            if event["id"] in event_ids:
+                return True
+            queue = self._queues.get(event["id"], ())
+            if any(entry["joined_at"] >= since for _, entry in queue):
+                return True
+            return any(
+                listing["created_at"] >= since
+                for listing in self._tickets.get(event["id"], ())
+            )
+
+        return [dict(event) for event_id, event in sorted(self._events.items()) if active(event)]
+
+    async def add_buyer_to_queue(self, event_id: int, user_id: int) -> Tuple[bool, int]:
+        if event_id not in self._events:
+            return False, 0
+        queue = self._queues.setdefault(event_id, RankedQueue())
+        user = str(user_id)
+        if user in queue:
+            return False, queue.rank(user)
+        entry = {
+            "id": self._next_id("buyer_queue"),
+            "event_id": event_id,
+            "user_id": user,
+            "joined_at": _timestamp(),
+        }
+        return True, queue.append(user, entry)
+
+    async def add_buyers_to_queue(
+        self, event_id: int, user_ids: Sequence[int]
+    ) -> List[Tuple[bool, int]]:
+        return [await self.add_buyer_to_queue(event_id, user_id) for user_id in user_ids]
+
+    async def remove_buyer_from_queue(self, event_id: int, user_id: int) -> None:
+        queue = self._queues.get(event_id)
+        if queue is not None:
+            queue.remove(str(user_id))
+
+    async def get_queue_size(self, event_id: int) -> int:
+        return len(self._queues.get(event_id, ()))
+
+    async def get_queue_position(self, event_id: int, user_id: int) -> int:
+        queue = self._queues.get(event_id)
+        return queue.rank(str(user_id)) if queue is not None else 0
+
+    async def get_next_buyer(self, event_id: int) -> Optional[Dict[str, Any]]:
+        queue = self._queues.get(event_id)
+        head = queue.head() if queue is not None else None
+        return dict(head[1]) if head else None
+
+    async def list_queue(
+        self, event_id: int, offset: int = 0, limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        queue = self._queues.get(event_id)
+        if queue is None:
+            return []
+        count = len(queue) if limit is None else limit
+        return [dict(entry) for _, entry in queue.slice(offset + 1, count)]
+
+    async def queue_sizes(self) -> Dict[int, int]:
+        return {event_id: len(queue) for event_id, queue in self._queues.items() if len(queue)}
+
+    async def add_ticket_listing(
+        self, event_id: int, seller_id: int, price: float
+    ) -> int:
+        if event_id not in self._events:
+            raise sqlite3.IntegrityError("FOREIGN KEY constraint failed")
+        listing_id = self._next_id("tickets")
+        self._tickets.setdefault(event_id, []).append(
+            {
+                "id": listing_id,
+                "event_id": event_id,
+                "seller_id": str(seller_id),
+                "price": float(price),
+                "status": "available",
+                "created_at": _timestamp(),
+            }
+        )
+        return listing_id
+
+    async def list_tickets(self, event_id: int) -> List[Dict[str, Any]]:
+        return [dict(listing) for listing in self._tickets.get(event_id, [])]
+
+    async def get_command_hash(self, scope: str) -> Optional[str]:
+        return self._command_hashes.get(scope)
+
+    async def set_command_hash(self, scope: str, digest: str) -> None:
+        self._command_hashes[scope] = digest
+
+    async def set_status_message(
+        self, event_id: int, channel_id: int, message_id: int
+    ) -> None:
+        self._status_messages[event_id] = {
+            "event_id": event_id,
+            "channel_id": str(channel_id),
+            "message_id": str(message_id),
+        }
+
+    async def remove_status_message(self, event_id: int) -> None:
+        self._status_messages.pop(event_id, None)
+
+    async def list_status_messages(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                **self._status_messages[event_id],
+                "guild_id": self._events[event_id]["guild_id"] if event_id in self._events else None,
+            }
+            for event_id in sorted(self._status_messages)
+        ]
+
+    def start_autosave(self, interval: float) -> None:
+        """
+        Snapshot the state every `interval` seconds until the manager is closed.
+        """
+        if self.snapshot_path and self._autosave is None:
+            self._autosave = asyncio.create_task(self._autosave_loop(interval))
+
+    async def _autosave_loop(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self.save_snapshot()
+
+    async def save_snapshot(self) -> None:
+        """
+        Write the state to the snapshot file, atomically replacing the previous snapshot.
+        """
+        if not self.snapshot_path:
+            return
+        # Serialize on the loop so the state cannot change mid-snapshot, write in a thread.
+        payload = json.dumps(self._dump())
+        await asyncio.to_thread(self._write_snapshot, payload)
+
+    def _write_snapshot(self, payload: str) -> None:
+        temporary = f"{self.snapshot_path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            file.write(payload)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.snapshot_path)
+
+    def _dump(self) -> Dict[str, Any]:
+        return {
+            "sequences": self._sequences,
+            "events": list(self._events.values()),
+            "buyer_queue": [entry for queue in self._queues.values() for _, entry in queue],
+            "tickets": [listing for listings in self._tickets.values() for listing in listings],
+            "warns": [
+                {"user_id": user_id, "server_id": server_id, **warn}
+                for (user_id, server_id), warns in self._warns.items()
+                for warn in warns
+            ],
+            "command_sync": self._command_hashes,
+            "queue_status_messages": list(self._status_messages.values()),
+        }
+
+    def _restore(self, state: Dict[str, Any]) -> None:
+        self._sequences.update(state.get("sequences", {}))
+        for event in sorted(state.get("events", []), key=lambda event: event["id"]):
+            # Snapshots from before starts_at existed only have the date text.
+            event.setdefault("starts_at", parse_event_date(event.get("date")))
+            self._add_event(event)
+        for entry in sorted(state.get("buyer_queue", []), key=lambda entry: entry["id"]):
+            self._queues.setdefault(entry["event_id"], RankedQueue()).append(
+                entry["user_id"], entry
+            )
+        for listing in state.get("tickets", []):
+            self._tickets.setdefault(listing["event_id"], []).append(listing)
+        for warn in state.get("warns", []):
+            key = (warn.pop("user_id"), warn.pop("server_id"))
+            self._warns.setdefault(key, []).append(warn)
+        self._command_hashes.update(state.get("command_sync", {}))
+        for message in state.get("queue_status_messages", []):
+            self._status_messages[message["event_id"]] = message
+
+    async def close(self) -> None:
+        if self._autosave is not None:
+            self._autosave.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._autosave
+            self._autosave = None
+        await self.save_snapshot()
@@ -0,0 +1,304 @@
+"""
+Single-writer database service for running the bot as several processes.
+
+SQLite only allows one writer at a time, so in cluster mode one process owns
+the database and serves `DatabaseManager` writes over a Unix socket, while
+every worker reads through its own local connection. Run the owner with::
+
+    python -m database.remote --database database/database.db --socket database/database.sock
+
+The wire format is one JSON object per line. Requests carry an ``id``, a
+``method`` and its ``args``/``kwargs``; responses echo the ``id`` with either a
+``result`` or an ``error``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import signal
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import aiosqlite
+
+from database import DatabaseManager, ensure_schema
+
+# Methods of DatabaseManager that write and must therefore go through the owner process.
+WRITE_METHODS = frozenset(
+    {
+        "add_warn",
+        "remove_warn",
+        "create_event",
+        "add_buyer_to_queue",
+        "add_buyers_to_queue",
+        "remove_buyer_from_queue",
+        "add_ticket_listing",
+        "set_command_hash",
+        "set_status_message",
+        "remove_status_message",
+    }
+)
+
+# Allow large payloads on one line, the default stream limit is 64 KiB.
+STREAM_LIMIT = 1024 * 1024
+
+
+def cluster_storage_problem(environment: Mapping[str, str]) -> Optional[str]:
+    """
+    Return why the configured storage cannot be shared by cluster workers, if it cannot.
+
+    Workers only share state through the database owner, so storage that lives inside each
+    worker process would give every worker its own queues and positions.
+    """
+    if environment.get("DATABASE_BACKEND", "sqlite").lower() == "memory":
+        return "DATABASE_BACKEND=memory cannot be used in cluster mode, use the SQLite backend"
+    if environment.get("QUEUE_ENGINE", "sqlite").lower() == "journal":
+        return "QUEUE_ENGINE=journal cannot be used in cluster mode, use the SQLite queue engine"
+    return None
+
+
+class RemoteDatabaseError(RuntimeError):
+    """Raised in a worker when the database owner failed to run a call."""
+
+
+class DatabaseServer:
+    """Serves the write methods of a `DatabaseManager` on a Unix socket."""
+
+    def __init__(self, manager: DatabaseManager, socket_path: str) -> None:
+        self.manager = manager
+        self.socket_path = socket_path
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        # A socket file left behind by a crashed owner would make the bind fail.
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(
+            self._handle, path=self.socket_path, limit=STREAM_LIMIT
+        )
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.socket_path)
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                task = asyncio.create_task(self._dispatch(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def _dispatch(self, line: bytes, writer: asyncio.StreamWriter) -> None:
+        request = json.loads(line)
+        response: Dict[str, Any] = {"id": request.get("id")}
+        method = request.get("method")
+        try:
+            if method not in WRITE_METHODS:
+                raise RemoteDatabaseError(f"{method!r} cannot be called remotely")
+            response["result"] = await getattr(self.manager, method)(
+                *request.get("args", ()), **request.get("kwargs", {})
+            )
+        except Exception as e:
+            response["error"] = f"{type(e).__name__}: {e}"
+        if not writer.is_closing():
+            writer.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+class RemoteDatabaseManager(DatabaseManager):
+    """
+    A `DatabaseManager` for cluster workers.
+
+    Reads run on the local connection given to the constructor; every method in
+    `WRITE_METHODS` is forwarded to the database owner process.
+    """
+
+    def __init__(self, *, connection: aiosqlite.Connection, socket_path: str) -> None:
+        super().__init__(connection=connection)
+        self.socket_path = socket_path
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._connect_lock = asyncio.Lock()
+
+    async def connect(self, *, timeout: float = 30.0) -> None:
+        """
+        Connect to the database owner, retrying while it is starting up.
+
+        :param timeout: How long to wait for the owner's socket, in seconds.
+        """
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while True:
+                try:
+                    reader, self._writer = await asyncio.open_unix_connection(
+                        self.socket_path, limit=STREAM_LIMIT
+                    )
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    if loop.time() >= deadline:
+                        raise
+                    await asyncio.sleep(0.1)
+            self._listener = asyncio.create_task(self._listen(reader))
+
+    async def _listen(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while line := await reader.readline():
+                response = json.loads(line)
+                future = self._pending.pop(response["id"], None)
+                if future is None or future.done():
+                    continue
+                if "error" in response:
+                    future.set_exception(RemoteDatabaseError(response["error"]))
+                else:
+                    future.set_result(response.get("result"))
+        finally:
+            self._writer = None
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(
+                        ConnectionError("Lost the connection to the database owner")
+                    )
+
+    async def _call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        if self._writer is None or self._writer.is_closing():
+            await self.connect()
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        payload = {"id": request_id, "method": method, "args": args, "kwargs": kwargs}
+        self._writer.write(json.dumps(payload).encode("utf-8") + b"\n")
+        await self._writer.drain()
+        return await future
+
+    async def add_warn(
+        self, user_id: int, server_id: int, moderator_id: int, reason: str
+    ) -> int:
+        return await self._call("add_warn", user_id, server_id, moderator_id, reason)
+
+    async def remove_warn(self, warn_id: int, user_id: int, server_id: int) -> int:
+        return await self._call("remove_warn", warn_id, user_id, server_id)
+
+    async def create_event(
+        self,
+        *,
+        guild_id: int,
+        name: str,
+        created_by: int,
+        source: str,
+        source_id: Optional[str] = None,
+        date: Optional[str] = None,
+        venue: Optional[str] = None,
+        city: Optional[str] = None,
+        url: Optional[str] = None,
+    ) -> int:
+        return await self._call(
+            "create_event",
+            guild_id=guild_id,
+            name=name,
+            created_by=created_by,
+            source=source,
+            source_id=source_id,
+            date=date,
+            venue=venue,
+            city=city,
+            url=url,
+        )
+
+    async def add_buyer_to_queue(self, event_id: int, user_id: int) -> Tuple[bool, int]:
+        added, position = await self._call("add_buyer_to_queue", event_id, user_id)
+        return bool(added), int(position)
+
+    async def add_buyers_to_queue(
+        self, event_id: int, user_ids: Sequence[int]
+    ) -> List[Tuple[bool, int]]:
+        results = await self._call("add_buyers_to_queue", event_id, list(user_ids))
+        return [(bool(added), int(position)) for added, position in results]
+
+    async def remove_buyer_from_queue(self, event_id: int, user_id: int) -> None:
+        await self._call("remove_buyer_from_queue", event_id, user_id)
+
+    async def get_queue_size(self, event_id: int) -> int:
+        # There is no local membership index, see get_queue_position.
+        rows = await self.connection.execute(
+            "SELECT COUNT(*) FROM buyer_queue WHERE event_id=?", (event_id,)
+        )
+        async with rows as cursor:
+            return (await cursor.fetchone())[0]
+
+    async def get_queue_position(self, event_id: int, user_id: int) -> int:
+        # Queue writes happen in the owner process, so this process cannot keep a membership index.
+        return await self._queue_position(event_id, str(user_id))
+
+    async def add_ticket_listing(
+        self, event_id: int, seller_id: int, price: float
+    ) -> int:
+        return await self._call("add_ticket_listing", event_id, seller_id, price)
+
+    async def set_command_hash(self, scope: str, digest: str) -> None:
+        await self._call("set_command_hash", scope, digest)
+
+    async def set_status_message(
+        self, event_id: int, channel_id: int, message_id: int
+    ) -> None:
+        await self._call("set_status_message", event_id, channel_id, message_id)
+
+    async def remove_status_message(self, event_id: int) -> None:
+        await self._call("remove_status_message", event_id)
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        if self._listener is not None:
+            self._listener.cancel()
+        await super().close()
+
+
+async def serve(database_path: str, socket_path: str) -> None:
+    """
+    Own the database: apply the schema, switch to WAL so workers can read while it writes, and serve writes.
+    """
+    connection = await aiosqlite.connect(database_path)
+    await connection.execute("PRAGMA journal_mode=WAL")
+    await ensure_schema(connection)
+    manager = DatabaseManager(connection=connection)
+    await manager.enable_foreign_keys()
+
+    server = DatabaseServer(manager, socket_path)
+    await server.start()
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopped.set)
+    try:
+        await stopped.wait()
+    finally:
+        await server.close()
+        await manager.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database", required=True, help="The SQLite database file.")
+    parser.add_argument("--socket", required=True, help="The Unix socket to listen on.")
+    arguments = parser.parse_args()
+    asyncio.run(serve(arguments.database, arguments.socket))
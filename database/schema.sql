@@ -15,6 +15,7 @@ CREATE TABLE IF NOT EXISTS `events` (
   `venue` TEXT,
   `city` TEXT,
   `url` TEXT,
+  `starts_at` INTEGER,
   `source` TEXT NOT NULL,
   `source_id` TEXT,
   `created_by` TEXT NOT NULL,
@@ -40,3 +41,46 @@ CREATE TABLE IF NOT EXISTS `tickets` (
   `created_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
   FOREIGN KEY(`event_id`) REFERENCES `events`(`id`) ON DELETE CASCADE
 );
+
+CREATE TABLE IF NOT EXISTS `command_sync` (
+  `scope` TEXT PRIMARY KEY,
+  `hash` TEXT NOT NULL,
+  `synced_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS `queue_status_messages` (
+  `event_id` INTEGER PRIMARY KEY,
+  `channel_id` TEXT NOT NULL,
+  `message_id` TEXT NOT NULL,
+  FOREIGN KEY(`event_id`) REFERENCES `events`(`id`) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS `idx_buyer_queue_event_order` ON `buyer_queue` (`event_id`, `id`);
+
+CREATE INDEX IF NOT EXISTS `idx_events_guild_starts_at` ON `events` (`guild_id`, `starts_at`);
+CREATE INDEX IF NOT EXISTS `idx_events_starts_at` ON `events` (`starts_at`);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS `events_fts` USING fts5(
+  `guild_id`, `name`, `venue`, `city`,
+  content='events', content_rowid='id', prefix='1 2 3 4 5 6 7 8'
+);
+
+CREATE TRIGGER IF NOT EXISTS `events_fts_insert` AFTER INSERT ON `events` BEGIN
+  INSERT INTO `events_fts`(rowid, `guild_id`, `name`, `venue`, `city`)
+  VALUES (new.`id`, new.`guild_id`, new.`name`, new.`venue`, new.`city`);
+END;
+
+CREATE TRIGGER IF NOT EXISTS `events_fts_delete` AFTER DELETE ON `events` BEGIN
+  INSERT INTO `events_fts`(`events_fts`, rowid, `guild_id`, `name`, `venue`, `city`)
+  VALUES ('delete', old.`id`, old.`guild_id`, old.`name`, old.`venue`, old.`city`);
+END;
+
+CREATE TRIGGER IF NOT EXISTS `events_fts_update` AFTER UPDATE ON `events` BEGIN
+  INSERT INTO `events_fts`(`events_fts`, rowid, `guild_id`, `name`, `venue`, `city`)
+  VALUES ('delete', old.`id`, old.`guild_id`, old.`name`, old.`venue`, old.`city`);
+  INSERT INTO `events_fts`(rowid, `guild_id`, `name`, `venue`, `city`)
+  VALUES (new.`id`, new.`guild_id`, new.`name`, new.`venue`, new.`city`);
+END;
+
+-- Index the events that existed before the search index.
+INSERT INTO `events_fts`(`events_fts`) VALUES ('rebuild');
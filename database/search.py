@@ -0,0 +1,88 @@
+"""
+Full-text event search.
+
+`events_fts` is an FTS5 index over the guild, name, venue and city of every
+event, kept in sync with `events` by triggers in `schema.sql`. A search asks
+the index for the guild's events containing every one of its words as a
+prefix, and only when there are none for those containing any of them, then
+ranks them here, preferring matches in the name. Asking for full matches first
+keeps them from being cut off by `SEARCH_SCAN_LIMIT` in very large guilds. SQLite's bm25 ranking and long prefix lookups both read the postings of
+every guild, while prefix-indexed lookups restricted to one guild do not, so
+the cost of a search follows the size of the guild rather than of the whole
+table. Measure it with::
+
+    python -m database.search_benchmark --sizes 1000 10000 100000
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+# The most results a search returns.
+SEARCH_LIMIT = 100
+
+# The most matching events a search ranks, bounding the work for very large guilds.
+SEARCH_SCAN_LIMIT = 5000
+
+# The longest prefix length in the `prefix` option of `events_fts`. Longer words are looked
+# up by their indexed prefix and checked when ranking.
+PREFIX_INDEX_LENGTH = 8
+
+# How much a word matching each column counts towards the rank.
+WEIGHTS = {"name": 2, "venue": 1, "city": 1}
+
+_WORD = re.compile(r"\w+")
+
+
+def search_terms(text: str) -> List[str]:
+    """Return the distinct words of a search, lowercased, in order."""
+    return list(dict.fromkeys(word.casefold() for word in _WORD.findall(text)))
+
+
+def fts_query(guild_id: int, text: str, *, every_word: bool = False) -> Optional[str]:
+    """
+    Build the FTS5 MATCH expression finding a guild's events that contain any word of a search.
+
+    :param every_word: Only find events containing every word instead.
+    :return: None when the search has no words.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return None
+    prefixes = dict.fromkeys(term[:PREFIX_INDEX_LENGTH] for term in terms)
+    words = (" AND " if every_word else " OR ").join(f'"{prefix}"*' for prefix in prefixes)
+    return f'guild_id : "{guild_id}" AND ({words})'
+
+
+def rank_events(
+    events: Iterable[Dict[str, Any]], text: str, limit: int = SEARCH_LIMIT
+) -> List[Dict[str, Any]]:
+    """
+    Order events by how well they match a search, best first.
+
+    Every word of the search is matched as a prefix, so "red roc" finds "Red Rocks". Events
+    matching every word come first and the others are only returned when none does.
+    """
+    terms = search_terms(text)
+    scored = []
+    for event in events:
+        words = {column: search_terms(event.get(column) or "") for column in WEIGHTS}
+        matched = score = 0
+        for term in terms:
+            weight = max(
+                (
+                    WEIGHTS[column]
+                    for column, column_words in words.items()
+                    if any(word.startswith(term) for word in column_words)
+                ),
+                default=0,
+            )
+            matched += weight > 0
+            score += weight
+        if matched:
+            scored.append((matched, score, event))
+    if any(matched == len(terms) for matched, _, _ in scored):
+        scored = [entry for entry in scored if entry[0] == len(terms)]
+    scored.sort(key=lambda entry: (-entry[0], -entry[1], entry[2]["id"]))
+    return [event for _, _, event in scored[:limit]]
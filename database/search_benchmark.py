@@ -0,0 +1,74 @@
+"""
+Event search latency as the events table grows.
+
+Run it with::
+
+    python -m database.search_benchmark --sizes 1000 10000 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from typing import Sequence
+
+import aiosqlite
+
+from database import DatabaseManager, ensure_schema
+
+
+async def benchmark(
+    sizes: Sequence[int], *, guild_size: int = 500, searches: int = 200
+) -> None:
+    """
+    Print the mean search latency as the events table grows to each size.
+
+    New events go to new guilds of `guild_size` events, as the table grows with
+    the number of guilds rather than with the size of each one.
+    """
+    connection = await aiosqlite.connect(":memory:")
+    connection.row_factory = aiosqlite.Row
+    await ensure_schema(connection)
+    manager = DatabaseManager(connection=connection)
+    venues = ["Red Rocks Amphitheatre", "Gorge Amphitheatre", "Brooklyn Mirage", "Echostage"]
+    cities = ["Morrison", "George", "New York", "Washington"]
+    count = 0
+    try:
+        for size in sorted(sizes):
+            rows = [
+                (
+                    str(number // guild_size),
+                    f"Artist {number} Live",
+                    venues[number % len(venues)],
+                    cities[number % len(cities)],
+                )
+                for number in range(count, size)
+            ]
+            await connection.executemany(
+                "INSERT INTO events(guild_id, name, venue, city, source, created_by) "
+                "VALUES (?, ?, ?, ?, 'manual', '0')",
+                rows,
+            )
+            await connection.commit()
+            count = size
+
+            started = time.perf_counter()
+            guilds = -(-size // guild_size)
+            for number in range(searches):
+                await manager.search_events(number % guilds, "red rocks")
+            elapsed = (time.perf_counter() - started) / searches
+            print(f"{size:>9} events: {elapsed * 1000:.2f} ms per search")
+    finally:
+        await manager.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark event search.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--guild-size", type=int, default=500)
+    parser.add_argument("--searches", type=int, default=200)
+    arguments = parser.parse_args()
+    asyncio.run(
+        benchmark(arguments.sizes, guild_size=arguments.guild_size, searches=arguments.searches)
+    )
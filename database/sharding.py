@@ -0,0 +1,348 @@
+"""
+Per-guild database sharding.
+
+Guilds are spread over several SQLite files by hashing their ID, so a busy
+guild only holds the write lock of its own file. Event IDs stay globally
+unique and carry their shard: shard `k` of `n` allocates the IDs
+`k + 1, k + 1 + n, k + 1 + 2n, ...`, so commands that only know an event ID
+are routed without a lookup.
+
+Split an existing database with::
+
+    python -m database.sharding --source database/database.db --directory database/shards --shards 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import os
+import sqlite3
+import zlib
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Collection, Dict, List, Optional, Sequence, Tuple
+
+import aiosqlite
+
+from database import SCHEMA_PATH, SCHEMA_VERSION, DatabaseManager, ensure_schema
+from database.dates import parse_event_date
+from database.search import SEARCH_LIMIT
+
+
+def shard_for_guild(guild_id: int, shards: int) -> int:
+    # crc32 of the decimal ID mixes the snowflake bits and is stable across processes.
+    return zlib.crc32(str(guild_id).encode("ascii")) % shards
+
+
+def shard_for_event(event_id: int, shards: int) -> int:
+    return (int(event_id) - 1) % shards
+
+
+class ShardedDatabaseManager:
+    """
+    Routes `DatabaseManager` calls to one of several shard files.
+
+    Connections are opened on first use and at most `max_open` of them are kept;
+    the least recently used idle connection is closed to make room for a new one.
+    """
+
+    def __init__(self, *, directory: str, shards: int, max_open: int = 16) -> None:
+        """
+        :param directory: The directory holding the shard files.
+        :param shards: The number of shard files. Changing it requires a new split.
+        :param max_open: The maximum number of connections kept open at once.
+        """
+        self.directory = directory
+        self.shards = shards
+        self.max_open = max(1, max_open)
+        self._managers: "OrderedDict[int, DatabaseManager]" = OrderedDict()
+        self._users: Dict[int, int] = {}
+        self._initialized: set = set()
+        self._lock = asyncio.Lock()
+
+    def path_for_shard(self, shard: int) -> str:
+        return os.path.join(self.directory, f"shard-{shard}.db")
+
+    async def _open(self, shard: int) -> DatabaseManager:
+        os.makedirs(self.directory, exist_ok=True)
+        connection = await aiosqlite.connect(self.path_for_shard(shard))
+        if shard not in self._initialized:
+            await ensure_schema(connection)
+            self._initialized.add(shard)
+        manager = DatabaseManager(
+            connection=connection, id_stride=self.shards, id_offset=shard + 1
+        )
+        await manager.enable_foreign_keys()
+        return manager
+
+    @contextlib.asynccontextmanager
+    async def _shard(self, shard: int) -> AsyncIterator[DatabaseManager]:
+        async with self._lock:
+            manager = self._managers.get(shard)
+            if manager is None:
+                await self._evict()
+                manager = self._managers[shard] = await self._open(shard)
+            self._managers.move_to_end(shard)
+            self._users[shard] = self._users.get(shard, 0) + 1
+        try:
+            yield manager
+        finally:
+            self._users[shard] -= 1
+
+    async def _evict(self) -> None:
+        # Connections with calls in flight are never closed, so the cap can be briefly exceeded.
+        for shard in list(self._managers):
+            if len(self._managers) < self.max_open:
+                return
+            if self._users.get(shard, 0) == 0:
+                await self._managers.pop(shard).close()
+
+    @property
+    def open_shards(self) -> List[int]:
+        return list(self._managers)
+
+    async def _by_guild(self, guild_id: int, method: str, /, *args: Any, **kwargs: Any) -> Any:
+        async with self._shard(shard_for_guild(guild_id, self.shards)) as manager:
+            return await getattr(manager, method)(*args, **kwargs)
+
+    async def _by_event(self, event_id: int, method: str, /, *args: Any, **kwargs: Any) -> Any:
+        async with self._shard(shard_for_event(event_id, self.shards)) as manager:
+            return await getattr(manager, method)(*args, **kwargs)
+
+    async def enable_foreign_keys(self) -> None:
+        # Applied to every shard connection when it is opened.
+        return
+
+    async def add_warn(
+        self, user_id: int, server_id: int, moderator_id: int, reason: str
+    ) -> int:
+        return await self._by_guild(
+            server_id, "add_warn", user_id, server_id, moderator_id, reason
+        )
+
+    async def remove_warn(self, warn_id: int, user_id: int, server_id: int) -> int:
+        return await self._by_guild(server_id, "remove_warn", warn_id, user_id, server_id)
+
+    async def get_warnings(self, user_id: int, server_id: int) -> List[aiosqlite.Row]:
+        return await self._by_guild(server_id, "get_warnings", user_id, server_id)
+
+    async def create_event(self, *, guild_id: int, **kwargs: Any) -> int:
+        return await self._by_guild(guild_id, "create_event", guild_id=guild_id, **kwargs)
+
+    async def get_event(self, guild_id: int, event_id: int) -> Optional[Dict[str, Any]]:
+        if shard_for_event(event_id, self.shards) != shard_for_guild(guild_id, self.shards):
+            return None
+        return await self._by_guild(guild_id, "get_event", guild_id, event_id)
+
+    async def get_event_by_source(
+        self, guild_id: int, source: str, source_id: str
+    ) -> Optional[Dict[str, Any]]:
+        return await self._by_guild(
+            guild_id, "get_event_by_source", guild_id, source, source_id
+        )
+
+    async def list_events_with_stats(self, guild_id: int) -> List[Dict[str, Any]]:
+        return await self._by_guild(guild_id, "list_events_with_stats", guild_id)
+
+    async def list_upcoming_events(
+        self, guild_id: int, *, days: Optional[float] = None, now: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        return await self._by_guild(
+            guild_id, "list_upcoming_events", guild_id, days=days, now=now
+        )
+
+    async def list_past_events(
+        self, guild_id: int, *, limit: Optional[int] = None, now: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        return await self._by_guild(
+            guild_id, "list_past_events", guild_id, limit=limit, now=now
+        )
+
+    async def search_events(
+        self, guild_id: int, text: str, limit: int = SEARCH_LIMIT
+    ) -> List[Dict[str, Any]]:
+        return await self._by_guild(guild_id, "search_events", guild_id, text, limit)
+
+    async def list_active_events(
+        self, since: str, event_ids: Collection[int] = ()
+    ) -> List[Dict[str, Any]]:
+        # Only shard files that exist can hold events, missing ones are not created.
+        events: List[Dict[str, Any]] = []
+        for shard in range(self.shards):
+            if os.path.exists(self.path_for_shard(shard)):
+                async with self._shard(shard) as manager:
+                    events.extend(await manager.list_active_events(since, event_ids))
+        return sorted(events, key=lambda event: event["id"])
+
+    async def add_buyer_to_queue(self, event_id: int, user_id: int) -> Tuple[bool, int]:
+        return await self._by_event(event_id, "add_buyer_to_queue", event_id, user_id)
+
+    async def add_buyers_to_queue(
+        self, event_id: int, user_ids: Sequence[int]
+    ) -> List[Tuple[bool, int]]:
+        return await self._by_event(event_id, "add_buyers_to_queue", event_id, user_ids)
+
+    async def remove_buyer_from_queue(self, event_id: int, user_id: int) -> None:
+        await self._by_event(event_id, "remove_buyer_from_queue", event_id, user_id)
+
+    async def get_queue_size(self, event_id: int) -> int:
+        return await self._by_event(event_id, "get_queue_size", event_id)
+
+    async def get_queue_position(self, event_id: int, user_id: int) -> int:
+        return await self._by_event(event_id, "get_queue_position", event_id, user_id)
+
+    async def get_next_buyer(self, event_id: int) -> Optional[Dict[str, Any]]:
+        return await self._by_event(event_id, "get_next_buyer", event_id)
+
+    async def list_queue(
+        self, event_id: int, offset: int = 0, limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        return await self._by_event(event_id, "list_queue", event_id, offset, limit)
+
+    async def queue_sizes(self) -> Dict[int, int]:
+        sizes: Dict[int, int] = {}
+        for shard in range(self.shards):
+            # Do not create files for shards that never received a guild.
+            if not os.path.exists(self.path_for_shard(shard)):
+                continue
+            async with self._shard(shard) as manager:
+                sizes.update(await manager.queue_sizes())
+        return sizes
+
+    async def add_ticket_listing(
+        self, event_id: int, seller_id: int, price: float
+    ) -> int:
+        return await self._by_event(
+            event_id, "add_ticket_listing", event_id, seller_id, price
+        )
+
+    async def list_tickets(self, event_id: int) -> List[Dict[str, Any]]:
+        return await self._by_event(event_id, "list_tickets", event_id)
+
+    async def get_command_hash(self, scope: str) -> Optional[str]:
+        # Bot-wide settings live in the first shard.
+        async with self._shard(0) as manager:
+            return await manager.get_command_hash(scope)
+
+    async def set_command_hash(self, scope: str, digest: str) -> None:
+        async with self._shard(0) as manager:
+            await manager.set_command_hash(scope, digest)
+
+    async def set_status_message(
+        self, event_id: int, channel_id: int, message_id: int
+    ) -> None:
+        await self._by_event(
+            event_id, "set_status_message", event_id, channel_id, message_id
+        )
+
+    async def remove_status_message(self, event_id: int) -> None:
+        await self._by_event(event_id, "remove_status_message", event_id)
+
+    async def list_status_messages(self) -> List[Dict[str, Any]]:
+        messages: List[Dict[str, Any]] = []
+        for shard in range(self.shards):
+            if os.path.exists(self.path_for_shard(shard)):
+                async with self._shard(shard) as manager:
+                    messages.extend(await manager.list_status_messages())
+        return sorted(messages, key=lambda message: message["event_id"])
+
+    async def close(self) -> None:
+        async with self._lock:
+            while self._managers:
+                _, manager = self._managers.popitem()
+                await manager.close()
+
+
+def split_database(source: str, directory: str, shards: int) -> Dict[int, int]:
+    """
+    Copy a single database into shard files, renumbering events so their ID encodes their shard.
+
+    :param source: The existing database file.
+    :param directory: The directory to write the shard files to. Existing shard files must be empty.
+    :param shards: The number of shards.
+    :return: The mapping from old to new event IDs.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(SCHEMA_PATH, encoding="utf-8") as file:
+        schema = file.read()
+
+    origin = sqlite3.connect(source)
+    origin.row_factory = sqlite3.Row
+    targets = []
+    for shard in range(shards):
+        target = sqlite3.connect(os.path.join(directory, f"shard-{shard}.db"))
+        target.executescript(schema)
+        target.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        if target.execute("SELECT COUNT(*) FROM events").fetchone()[0]:
+            raise RuntimeError(f"Shard {shard} already contains events")
+        targets.append(target)
+
+    mapping: Dict[int, int] = {}
+    next_ids = [shard + 1 for shard in range(shards)]
+    event_shards: Dict[int, int] = {}
+    for event in origin.execute("SELECT * FROM events ORDER BY id"):
+        shard = shard_for_guild(int(event["guild_id"]), shards)
+        mapping[event["id"]] = next_ids[shard]
+        event_shards[event["id"]] = shard
+        next_ids[shard] += shards
+        row = dict(event)
+        row["id"] = mapping[event["id"]]
+        if row.get("starts_at") is None:
+            # Databases from before starts_at existed only have the date text.
+            row["starts_at"] = parse_event_date(row.get("date"))
+        _insert(targets[shard], "events", row)
+
+    for table in ("buyer_queue", "tickets"):
+        for entry in origin.execute(f"SELECT * FROM {table} ORDER BY id"):
+            row = dict(entry)
+            if row["event_id"] not in mapping:
+                continue
+            shard = event_shards[row["event_id"]]
+            row["event_id"] = mapping[row["event_id"]]
+            del row["id"]
+            _insert(targets[shard], table, row)
+
+    # Live status messages follow their event. Databases created before they existed have no table.
+    if origin.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'queue_status_messages'"
+    ).fetchone():
+        for message in origin.execute("SELECT * FROM queue_status_messages"):
+            row = dict(message)
+            if row["event_id"] not in mapping:
+                continue
+            shard = event_shards[row["event_id"]]
+            row["event_id"] = mapping[row["event_id"]]
+            _insert(targets[shard], "queue_status_messages", row)
+
+    for warn in origin.execute("SELECT * FROM warns"):
+        _insert(targets[shard_for_guild(int(warn["server_id"]), shards)], "warns", dict(warn))
+
+    for target in targets:
+        target.commit()
+        target.close()
+    origin.close()
+    return mapping
+
+
+def _insert(connection: sqlite3.Connection, table: str, row: Dict[str, Any]) -> None:
+    columns = ", ".join(row)
+    placeholders = ", ".join("?" for _ in row)
+    connection.execute(
+        f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", tuple(row.values())
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Split a single database into per-guild shard files."
+    )
+    parser.add_argument("--source", required=True, help="The existing database file.")
+    parser.add_argument("--directory", required=True, help="Where to write the shard files.")
+    parser.add_argument("--shards", required=True, type=int, help="The number of shards.")
+    arguments = parser.parse_args()
+    event_ids = split_database(arguments.source, arguments.directory, arguments.shards)
+    print(f"Split {len(event_ids)} events into {arguments.shards} shards.")
+    for old_id, new_id in event_ids.items():
+        if old_id != new_id:
+            print(f"Event {old_id} is now {new_id}")
@@ -0,0 +1,121 @@
+"""
+In-memory data structures shared by the storage engines.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Generic, Hashable, Iterator, List, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+
+
+class RankedQueue(Generic[K]):
+    """
+    A FIFO queue of unique keys with O(log n) rank and select.
+
+    Every appended key takes the next slot of a Fenwick tree counting the live
+    slots, so the position of a key is a prefix sum and the key at a position
+    is found by descending the tree. Removed slots are left empty and the tree
+    is rebuilt once more than half of its slots are empty.
+    """
+
+    def __init__(self) -> None:
+        self._tree: List[int] = [0]
+        self._slots: List[Optional[Tuple[K, Any]]] = []
+        self._slot_of: Dict[K, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._slot_of
+
+    def __iter__(self) -> Iterator[Tuple[K, Any]]:
+        for item in self._slots:
+            if item is not None:
+                yield item
+
+    def get(self, key: K) -> Any:
+        slot = self._slot_of.get(key)
+        return None if slot is None else self._slots[slot][1]
+
+    def append(self, key: K, value: Any = None) -> int:
+        """
+        Add a key at the tail.
+
+        :return: The 1-based position of the key.
+        """
+        if key in self._slot_of:
+            raise KeyError(f"{key!r} is already queued")
+        self._slots.append((key, value))
+        index = len(self._slots)
+        # A new Fenwick node covers the slots (index - lowbit(index), index].
+        lowbit = index & -index
+        self._tree.append(1 + self._prefix(index - 1) - self._prefix(index - lowbit))
+        self._slot_of[key] = index - 1
+        return len(self._slot_of)
+
+    def remove(self, key: K) -> bool:
+        slot = self._slot_of.pop(key, None)
+        if slot is None:
+            return False
+        self._slots[slot] = None
+        index = slot + 1
+        while index < len(self._tree):
+            self._tree[index] -= 1
+            index += index & -index
+        if len(self._slots) > 32 and len(self._slot_of) * 2 < len(self._slots):
+            self._compact()
+        return True
+
+    def rank(self, key: K) -> int:
+        """Return the 1-based position of a key, or 0 when it is not queued."""
+        slot = self._slot_of.get(key)
+        return 0 if slot is None else self._prefix(slot + 1)
+
+    def select(self, position: int) -> Optional[Tuple[K, Any]]:
+        """Return the `(key, value)` at a 1-based position, or `None` when out of range."""
+        return self._slots[self._find(position)] if 0 < position <= len(self) else None
+
+    def slice(self, start: int, count: int) -> List[Tuple[K, Any]]:
+        """Return up to `count` items starting at the 1-based position `start`."""
+        if count <= 0 or start > len(self):
+            return []
+        start = max(start, 1)
+        items = []
+        slot = self._find(start)
+        while slot < len(self._slots) and len(items) < count:
+            if self._slots[slot] is not None:
+                items.append(self._slots[slot])
+            slot += 1
+        return items
+
+    def head(self) -> Optional[Tuple[K, Any]]:
+        return self.select(1)
+
+    def _prefix(self, index: int) -> int:
+        total = 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+    def _find(self, position: int) -> int:
+        # Descend the tree for the smallest slot whose prefix sum reaches `position`.
+        index = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            nxt = index + step
+            if nxt < len(self._tree) and self._tree[nxt] < position:
+                index = nxt
+                position -= self._tree[nxt]
+            step >>= 1
+        return index
+
+    def _compact(self) -> None:
+        items = [item for item in self._slots if item is not None]
+        self._tree = [0]
+        self._slots = []
+        self._slot_of = {}
+        for key, value in items:
+            self.append(key, value)
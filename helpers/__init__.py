@@ -0,0 +1,3 @@
+"""
+Shared runtime helpers for the Discord event ticket queue bot.
+"""
@@ -0,0 +1,276 @@
+"""
+Admission control and load shedding for command bursts.
+
+Each command first takes a token from its author's token bucket, then a slot
+from its guild's concurrency limiter and from the global one. When no slot is
+free the command waits, but only for as long as it could still answer before
+Discord's 3-second interaction deadline; past that, or right away when the
+expected wait is already longer, it is shed with a `AdmissionRejected` error
+telling the user when to try again.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import math
+import time
+from collections import deque
+from types import SimpleNamespace
+from typing import AsyncIterator, Callable, Deque, Dict, Optional, Tuple
+
+import discord
+
+from discord.ext import commands
+from discord.ext.commands import Context
+
+from helpers.deferral import INTERACTION_DEADLINE, remaining_budget
+from helpers.metrics import Counter
+
+
+class AdmissionRejected(commands.CommandError):
+    """Raised when a command is refused by admission control."""
+
+    def __init__(self, reason: str, retry_after: float) -> None:
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"Command rejected ({reason}), retry after {retry_after:.1f}s")
+
+
+class TokenBuckets:
+    """Per-key token buckets refilled at `rate` tokens per second up to `burst` tokens."""
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[int, Tuple[float, float]] = {}
+
+    def take(self, key: int) -> float:
+        """
+        Take a token for a key.
+
+        :return: 0 when a token was taken, otherwise the seconds until one is available.
+        """
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / self.rate if self.rate > 0 else math.inf
+        self._buckets[key] = (tokens - 1, now)
+        if len(self._buckets) > 10_000:
+            self._prune(now)
+        return 0.0
+
+    def _prune(self, now: float) -> None:
+        # A bucket idle long enough to be full again carries no state worth keeping.
+        refill_time = self.burst / self.rate if self.rate > 0 else math.inf
+        for key, (_, updated) in list(self._buckets.items()):
+            if now - updated >= refill_time:
+                del self._buckets[key]
+
+
+class ConcurrencyLimiter:
+    """A FIFO semaphore whose capacity can be changed while it is in use."""
+
+    def __init__(self, capacity: Callable[[], int]) -> None:
+        self._capacity = capacity
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Smoothed time a slot is held, used to estimate how long a new caller would wait.
+        self.average_hold = 0.5
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, timeout: float) -> bool:
+        if self.in_flight < self._capacity() and not self._waiters:
+            self.in_flight += 1
+            return True
+        if timeout <= 0 or self.estimated_wait() > timeout:
+            # A slot is not expected in time, waiting would only hold the caller longer.
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+            return True
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait timed out.
+                return True
+            waiter.cancel()
+            return False
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self, held_for: float) -> None:
+        self.average_hold += 0.1 * (held_for - self.average_hold)
+        self.in_flight -= 1
+        self.wake()
+
+    def wake(self) -> None:
+        while self._waiters and self.in_flight < self._capacity():
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def estimated_wait(self) -> float:
+        capacity = max(self._capacity(), 1)
+        return self.average_hold * (self.waiting + 1) / capacity
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        *,
+        user_rate: float = 1.0,
+        user_burst: float = 5.0,
+        guild_concurrency: int = 20,
+        global_concurrency: int = 50,
+        reserve: float = 1.0,
+        rejections: Optional[Counter] = None,
+    ) -> None:
+        """
+        :param user_rate: Commands per second a user regains.
+        :param user_burst: Commands a user can run back to back.
+        :param guild_concurrency: Commands running at once in a single guild.
+        :param global_concurrency: Commands running at once across every guild.
+        :param reserve: Seconds kept before the interaction deadline for the command itself.
+        :param rejections: Optional counter labelled by rejection reason.
+        """
+        self.user_buckets = TokenBuckets(user_rate, user_burst)
+        self.guild_concurrency = guild_concurrency
+        self.global_concurrency = global_concurrency
+        self.reserve = reserve
+        self.rejections = rejections
+        self.global_limiter = ConcurrencyLimiter(lambda: self.global_concurrency)
+        self._guild_limiters: Dict[int, ConcurrencyLimiter] = {}
+
+    SETTINGS = (
+        "user_rate",
+        "user_burst",
+        "guild_concurrency",
+        "global_concurrency",
+        "reserve",
+    )
+
+    def settings(self) -> Dict[str, float]:
+        return {
+            "user_rate": self.user_buckets.rate,
+            "user_burst": self.user_buckets.burst,
+            "guild_concurrency": self.guild_concurrency,
+            "global_concurrency": self.global_concurrency,
+            "reserve": self.reserve,
+        }
+
+    def configure(self, name: str, value: float) -> None:
+        """
+        Change a limit while the bot is running.
+
+        :param name: One of `SETTINGS`.
+        :param value: The new value.
+        """
+        if name not in self.SETTINGS:
+            raise ValueError(f"Unknown setting {name!r}")
+        if value < 0:
+            raise ValueError("Limits cannot be negative")
+        if name == "user_rate":
+            self.user_buckets.rate = value
+        elif name == "user_burst":
+            self.user_buckets.burst = value
+        elif name in ("guild_concurrency", "global_concurrency"):
+            setattr(self, name, int(value))
+        else:
+            setattr(self, name, value)
+        # A raised capacity frees waiting commands right away.
+        self.global_limiter.wake()
+        for limiter in self._guild_limiters.values():
+            limiter.wake()
+
+    @property
+    def in_flight(self) -> int:
+        return self.global_limiter.in_flight
+
+    def _reject(self, reason: str, retry_after: float) -> AdmissionRejected:
+        if self.rejections is not None:
+            self.rejections.inc(reason)
+        return AdmissionRejected(reason, max(1.0, math.ceil(retry_after)))
+
+    def _wait_budget(self, context: Context) -> float:
+        if context.interaction is None:
+            return INTERACTION_DEADLINE - self.reserve
+        return remaining_budget(context.interaction) - self.reserve
+
+    async def admit(self, context: Context) -> None:
+        """
+        Admit a command or raise `AdmissionRejected`. Every admitted command must be released.
+        """
+        if getattr(context, "admission", None) is not None:
+            return
+        retry_after = self.user_buckets.take(context.author.id)
+        if retry_after:
+            raise self._reject("user_rate", retry_after)
+
+        budget = self._wait_budget(context)
+        guild_id = context.guild.id if context.guild else 0
+        guild_limiter = self._guild_limiters.get(guild_id)
+        if guild_limiter is None:
+            guild_limiter = self._guild_limiters[guild_id] = ConcurrencyLimiter(
+                lambda: self.guild_concurrency
+            )
+        started = time.monotonic()
+        if not await guild_limiter.acquire(budget):
+            self._discard_idle(guild_id)
+            raise self._reject("guild_busy", guild_limiter.estimated_wait())
+        try:
+            admitted = await self.global_limiter.acquire(
+                budget - (time.monotonic() - started)
+            )
+        except BaseException:
+            guild_limiter.release(0.0)
+            self._discard_idle(guild_id)
+            raise
+        if not admitted:
+            guild_limiter.release(0.0)
+            self._discard_idle(guild_id)
+            raise self._reject("overloaded", self.global_limiter.estimated_wait())
+        context.admission = (guild_id, time.monotonic())
+
+    def release(self, context: Context) -> None:
+        """
+        Release the slots of an admitted command. Calling it again, or for a rejected command, does nothing.
+        """
+        admission = getattr(context, "admission", None)
+        if admission is None:
+            return
+        context.admission = None
+        guild_id, admitted_at = admission
+        held_for = time.monotonic() - admitted_at
+        self.global_limiter.release(held_for)
+        self._guild_limiters[guild_id].release(held_for)
+        self._discard_idle(guild_id)
+
+    @contextlib.asynccontextmanager
+    async def admitted(self, interaction: discord.Interaction) -> AsyncIterator[None]:
+        """
+        Hold admission slots for a component interaction, such as a button click, while the block runs.
+
+        Raises `AdmissionRejected` like `admit`.
+        """
+        request = SimpleNamespace(
+            author=interaction.user, guild=interaction.guild, interaction=interaction
+        )
+        await self.admit(request)
+        try:
+            yield
+        finally:
+            self.release(request)
+
+    def _discard_idle(self, guild_id: int) -> None:
+        limiter = self._guild_limiters.get(guild_id)
+        if limiter is not None and limiter.in_flight == 0 and not limiter.waiting:
+            del self._guild_limiters[guild_id]
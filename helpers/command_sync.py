@@ -0,0 +1,66 @@
+"""
+Slash command syncing that skips command trees Discord already has.
+
+Syncing uploads the whole command tree and is heavily rate limited, so the
+hash of the last tree synced for each scope is stored in the database and a
+sync only happens when the current tree hashes differently.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Optional
+
+import discord
+from discord.ext import commands
+
+
+def sync_scope(guild: Optional[discord.abc.Snowflake] = None) -> str:
+    return "global" if guild is None else f"guild:{guild.id}"
+
+
+def command_tree_hash(
+    tree: discord.app_commands.CommandTree,
+    guild: Optional[discord.abc.Snowflake] = None,
+) -> str:
+    """
+    Return a stable hash of the payload `tree.sync(guild=guild)` would upload.
+
+    :param tree: The command tree.
+    :param guild: The guild scope, or `None` for global commands.
+    """
+    payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands(guild=guild)),
+        key=lambda command: (command.get("type", 1), command["name"]),
+    )
+    serialized = json.dumps(
+        {"application_id": tree.client.application_id, "commands": payload},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+async def sync_commands(
+    bot: commands.Bot,
+    guild: Optional[discord.abc.Snowflake] = None,
+    *,
+    force: bool = False,
+) -> bool:
+    """
+    Sync the command tree for a scope when it changed since the last sync.
+
+    :param bot: The bot, its `database` stores the hash of the last sync.
+    :param guild: The guild to sync, or `None` to sync global commands.
+    :param force: Sync even when the hash is unchanged.
+    :return: Whether the tree was synced.
+    """
+    scope = sync_scope(guild)
+    digest = command_tree_hash(bot.tree, guild)
+    if not force and await bot.database.get_command_hash(scope) == digest:
+        return False
+    await bot.tree.sync(guild=guild)
+    await bot.database.set_command_hash(scope, digest)
+    return True
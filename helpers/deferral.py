@@ -0,0 +1,115 @@
+"""
+Automatic deferral of slash commands that would miss the acknowledgement deadline.
+
+Discord drops an interaction that is not acknowledged within 3 seconds of being
+created. Before a command runs, `LatencyBudget` compares what is left of that
+budget with the command's recent running time and defers the interaction when
+the command is not expected to answer in time. Commands that answer privately
+set `extras={"ephemeral_defer": True}`, since a deferral decides whether the
+reply that follows it is ephemeral.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, Optional
+
+import discord
+from discord.ext.commands import Context
+
+from helpers.metrics import Counter, Histogram
+
+# Discord invalidates an interaction that is not acknowledged within this many seconds.
+INTERACTION_DEADLINE = 3.0
+
+
+def remaining_budget(interaction: discord.Interaction) -> float:
+    """Return the seconds left before an interaction must be acknowledged."""
+    age = (datetime.now(timezone.utc) - interaction.created_at).total_seconds()
+    return INTERACTION_DEADLINE - max(age, 0.0)
+
+
+class LatencyBudget:
+    def __init__(
+        self,
+        *,
+        margin: float = 0.5,
+        samples: int = 50,
+        quantile: float = 0.9,
+        deferrals: Optional[Counter] = None,
+        remaining: Optional[Histogram] = None,
+    ) -> None:
+        """
+        :param margin: Seconds kept free before the deadline for the response to reach Discord.
+        :param samples: Running times kept per command.
+        :param quantile: Quantile of the kept running times used as the projected latency.
+        :param deferrals: Optional counter of automatic deferrals, labelled by command.
+        :param remaining: Optional histogram of the budget left at invocation, labelled by command.
+        """
+        self.margin = margin
+        self.samples = samples
+        self.quantile = quantile
+        self.deferrals = deferrals
+        self.remaining = remaining
+        self._durations: Dict[str, Deque[float]] = {}
+
+    def projected(self, command: str) -> float:
+        """Return the expected running time of a command, 0 until it has run once."""
+        durations = self._durations.get(command)
+        if not durations:
+            return 0.0
+        ordered = sorted(durations)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.quantile))]
+
+    def observe(self, context: Context) -> None:
+        """Record the running time of a command that completed."""
+        started = getattr(context, "budget_started", None)
+        if started is None or context.command is None:
+            return
+        self.record(context.command.qualified_name, time.perf_counter() - started)
+
+    def record(self, command: str, duration: float) -> None:
+        """Record the running time of a command or component handler, in seconds."""
+        durations = self._durations.get(command)
+        if durations is None:
+            durations = self._durations[command] = deque(maxlen=self.samples)
+        durations.append(duration)
+
+    def _is_late(self, command: str, interaction: discord.Interaction) -> bool:
+        remaining = remaining_budget(interaction)
+        if self.remaining is not None:
+            self.remaining.observe(max(remaining, 0.0), command)
+        return self.projected(command) >= remaining - self.margin
+
+    async def before_invoke(self, context: Context) -> None:
+        """
+        Bot-wide before-invoke hook, it runs after the cog hooks so admission waits are accounted for.
+        """
+        context.budget_started = time.perf_counter()
+        interaction = context.interaction
+        if interaction is None or interaction.response.is_done():
+            return
+        name = context.command.qualified_name
+        if self._is_late(name, interaction):
+            await context.defer(
+                ephemeral=context.command.extras.get("ephemeral_defer", False)
+            )
+            if self.deferrals is not None:
+                self.deferrals.inc(name)
+
+    async def defer_component(
+        self, interaction: discord.Interaction, command: str, *, ephemeral: bool = False
+    ) -> None:
+        """
+        Defer a component interaction, such as a button click, when its handler is not expected
+        to answer in time. The handler then answers with a followup.
+
+        :param command: The name the handler's running times are recorded under.
+        """
+        if interaction.response.is_done() or not self._is_late(command, interaction):
+            return
+        await interaction.response.defer(ephemeral=ephemeral, thinking=True)
+        if self.deferrals is not None:
+            self.deferrals.inc(command)
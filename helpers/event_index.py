@@ -0,0 +1,84 @@
+"""
+In-memory event lookups for app-command autocomplete.
+
+Autocomplete runs on every keystroke, so suggestions come from sorted lists
+searched with `bisect` instead of the database. Each guild's index matches the
+typed text as a prefix of the event ID, of the whole event name, or of any
+word in the name, in that order.
+"""
+
+from __future__ import annotations
+
+import heapq
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Tuple
+
+# Discord shows at most 25 autocomplete choices.
+MAX_CHOICES = 25
+
+
+def _prefixed(keys: List[Tuple[str, int]], prefix: str) -> Iterator[int]:
+    start = bisect_left(keys, (prefix,))
+    for key, event_id in keys[start:]:
+        if not key.startswith(prefix):
+            return
+        yield event_id
+
+
+class EventIndex:
+    """Prefix and word lookups over the events of one guild."""
+
+    def __init__(self, events: Iterable[Mapping[str, Any]] = ()) -> None:
+        self.names: Dict[int, str] = {}
+        self._ids: List[Tuple[str, int]] = []
+        self._names: List[Tuple[str, int]] = []
+        self._words: List[Tuple[str, int]] = []
+        # Build unsorted and sort once, inserting in order is quadratic.
+        for event in events:
+            self._insert(int(event["id"]), event["name"], append=True)
+        self._ids.sort()
+        self._names.sort()
+        self._words.sort()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _insert(self, event_id: int, name: str, *, append: bool = False) -> None:
+        self.names[event_id] = name
+        key = name.casefold()
+        entries = [(self._ids, str(event_id)), (self._names, key)]
+        entries.extend((self._words, word) for word in set(key.split()))
+        for keys, entry in entries:
+            if append:
+                keys.append((entry, event_id))
+            else:
+                insort(keys, (entry, event_id))
+
+    def add(self, event_id: int, name: str) -> None:
+        """Index an event created after the index was built."""
+        if event_id not in self.names:
+            self._insert(event_id, name)
+
+    def search(self, text: str, limit: int = MAX_CHOICES) -> List[Tuple[int, str]]:
+        """
+        Return up to `limit` events matching the typed text, as `(event_id, name)` pairs.
+
+        Empty text suggests the most recently created events.
+        """
+        text = text.strip().lstrip("#").casefold()
+        if not text:
+            recent = heapq.nlargest(limit, self.names)
+            return [(event_id, self.names[event_id]) for event_id in recent]
+
+        found: Dict[int, None] = {}
+        sources = [self._names, self._words]
+        if text.isdigit():
+            sources.insert(0, self._ids)
+        for keys in sources:
+            for event_id in _prefixed(keys, text):
+                found.setdefault(event_id)
+                if len(found) >= limit:
+                    break
+            if len(found) >= limit:
+                break
+        return [(event_id, self.names[event_id]) for event_id in found]
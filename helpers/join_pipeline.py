@@ -0,0 +1,109 @@
+"""
+Micro-batched queue joins.
+
+Joins for the same event are collected while a batch is being written and
+handed to `add_buyers_to_queue` together, so a burst of `/queue_join` costs one
+commit per batch instead of one per user. The collection window adapts to
+load: an idle event is flushed on the next loop iteration, and every batch
+that carried more than one join doubles the window up to `max_window`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Callable, Dict, List, Optional, Tuple
+
+from database import QUEUE_BATCH_LIMIT, StorageBackend
+
+
+class _EventBatch:
+    __slots__ = ("pending", "task", "window")
+
+    def __init__(self) -> None:
+        self.pending: List[Tuple[int, asyncio.Future]] = []
+        self.task: Optional[asyncio.Task] = None
+        self.window = 0.0
+
+
+class JoinPipeline:
+    def __init__(
+        self,
+        backend: Callable[[], StorageBackend],
+        *,
+        max_window: float = 0.05,
+        min_window: float = 0.002,
+        max_batch: int = QUEUE_BATCH_LIMIT,
+    ) -> None:
+        """
+        :param backend: Returns the storage backend to write to, read at flush time.
+        :param max_window: The longest time a join waits for others to share its batch.
+        :param min_window: Windows shorter than this are dropped to zero.
+        :param max_batch: The most joins written by one batch.
+        """
+        self.backend = backend
+        self.max_window = max_window
+        self.min_window = min_window
+        self.max_batch = max_batch
+        self._events: Dict[int, _EventBatch] = {}
+
+    async def join(self, event_id: int, user_id: int) -> Tuple[bool, int]:
+        """
+        Queue a join and wait for the batch carrying it to be written.
+
+        :return: Whether the user was added, and their position.
+        """
+        batch = self._events.get(event_id)
+        if batch is None:
+            batch = self._events[event_id] = _EventBatch()
+        future = asyncio.get_running_loop().create_future()
+        batch.pending.append((user_id, future))
+        if batch.task is None:
+            batch.task = asyncio.create_task(self._run(event_id, batch))
+        return await asyncio.shield(future)
+
+    async def _run(self, event_id: int, batch: _EventBatch) -> None:
+        try:
+            while batch.pending:
+                await asyncio.sleep(batch.window)
+                entries = batch.pending[: self.max_batch]
+                del batch.pending[: self.max_batch]
+                try:
+                    results = await self.backend().add_buyers_to_queue(
+                        event_id, [user_id for user_id, _ in entries]
+                    )
+                except asyncio.CancelledError:
+                    for _, future in entries:
+                        future.cancel()
+                    raise
+                except Exception as error:
+                    for _, future in entries:
+                        if not future.done():
+                            future.set_exception(error)
+                    continue
+                for (_, future), result in zip(entries, results):
+                    if not future.done():
+                        future.set_result(result)
+                if len(entries) > 1:
+                    batch.window = min(
+                        self.max_window, max(batch.window * 2, self.min_window)
+                    )
+                else:
+                    batch.window /= 2
+                    if batch.window < self.min_window:
+                        batch.window = 0.0
+        finally:
+            batch.task = None
+            if batch.window == 0.0 and not batch.pending:
+                self._events.pop(event_id, None)
+
+    async def close(self) -> None:
+        """Stop flushing and fail the joins that were not written."""
+        tasks = [batch.task for batch in self._events.values() if batch.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for batch in self._events.values():
+            for _, future in batch.pending:
+                if not future.done():
+                    future.cancel()
+        self._events.clear()
@@ -0,0 +1,146 @@
+"""
+Logging setup for the bot: cached formatters, rotation and a background writer.
+
+Records are put on a queue by the handler attached to the bot's logger and
+written to the console and log files by a `QueueListener` thread, so a slow
+disk never stalls the event loop.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+from datetime import datetime, timezone
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+    TimedRotatingFileHandler,
+)
+from typing import List, Tuple
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class LoggingFormatter(logging.Formatter):
+    # Colors
+    black = "\x1b[30m"
+    red = "\x1b[31m"
+    green = "\x1b[32m"
+    yellow = "\x1b[33m"
+    blue = "\x1b[34m"
+    gray = "\x1b[38m"
+    # Styles
+    reset = "\x1b[0m"
+    bold = "\x1b[1m"
+
+    COLORS = {
+        logging.DEBUG: gray + bold,
+        logging.INFO: blue + bold,
+        logging.WARNING: yellow + bold,
+        logging.ERROR: red,
+        logging.CRITICAL: red + bold,
+    }
+
+    def __init__(self) -> None:
+        super().__init__()
+        # Build one formatter per level up front instead of one per record.
+        self._formatters = {
+            level: logging.Formatter(self._template(color), DATE_FORMAT, style="{")
+            for level, color in self.COLORS.items()
+        }
+        self._fallback = logging.Formatter(
+            self._template(self.reset), DATE_FORMAT, style="{"
+        )
+
+    def _template(self, log_color: str) -> str:
+        format = "(black){asctime}(reset) (levelcolor){levelname:<8}(reset) (green){name}(reset) {message}"
+        format = format.replace("(black)", self.black + self.bold)
+        format = format.replace("(reset)", self.reset)
+        format = format.replace("(levelcolor)", log_color)
+        format = format.replace("(green)", self.green + self.bold)
+        return format
+
+    def format(self, record):
+        return self._formatters.get(record.levelno, self._fallback).format(record)
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as a single JSON object per line."""
+
+    def format(self, record):
+        payload = {
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False)
+
+
+def _file_handler(filename: str) -> logging.Handler:
+    directory = os.path.dirname(filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    when = os.getenv("LOG_ROTATE_WHEN")
+    backup_count = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+    if when:
+        return TimedRotatingFileHandler(
+            filename, when=when, backupCount=backup_count, encoding="utf-8"
+        )
+    return RotatingFileHandler(
+        filename,
+        maxBytes=int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+        backupCount=backup_count,
+        encoding="utf-8",
+    )
+
+
+def setup_logging(name: str = "discord_bot") -> Tuple[logging.Logger, QueueListener]:
+    """
+    Configure the bot logger and start its background writer.
+
+    Settings come from the environment:
+    - `LOG_LEVEL` – minimum level, defaults to `INFO`
+    - `LOG_FILE` – text log file, defaults to `discord.log`
+    - `LOG_MAX_BYTES` / `LOG_BACKUP_COUNT` – size-based rotation (10 MiB, 5 files)
+    - `LOG_ROTATE_WHEN` – time-based rotation instead (e.g. `midnight`)
+    - `LOG_JSON_FILE` – optional JSON-lines log file for ingestion
+
+    :param name: The name of the logger to configure.
+    :return: The logger and the listener, which must be stopped on shutdown.
+    """
+    handlers: List[logging.Handler] = []
+
+    # Console handler
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(LoggingFormatter())
+    handlers.append(console_handler)
+
+    # File handler
+    file_handler = _file_handler(os.getenv("LOG_FILE", "discord.log"))
+    file_handler.setFormatter(
+        logging.Formatter(
+            "[{asctime}] [{levelname:<8}] {name}: {message}", DATE_FORMAT, style="{"
+        )
+    )
+    handlers.append(file_handler)
+
+    json_file = os.getenv("LOG_JSON_FILE")
+    if json_file:
+        json_handler = _file_handler(json_file)
+        json_handler.setFormatter(JsonFormatter())
+        handlers.append(json_handler)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+
+    logger = logging.getLogger(name)
+    logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    logger.addHandler(QueueHandler(log_queue))
+    listener.start()
+    return logger, listener
@@ -0,0 +1,142 @@
+"""
+Memory snapshots and growth reports for the running bot.
+
+`tracemalloc` attributes allocations to source lines and `gc` counts live
+objects by type; both are compared against a baseline taken earlier so a
+report shows what grew rather than everything that exists.
+"""
+
+from __future__ import annotations
+
+import gc
+import os
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+IGNORED_FILES = (tracemalloc.__file__, "<frozen importlib._bootstrap>", "<unknown>")
+
+
+def rss_bytes() -> Optional[int]:
+    """Return the resident set size of the process, when the platform exposes it."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def format_size(size: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} B"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+def count_object_types() -> Counter:
+    return Counter(type(obj).__qualname__ for obj in gc.get_objects())
+
+
+class MemoryReport:
+    def __init__(
+        self,
+        *,
+        rss: Optional[int],
+        traced: Tuple[int, int],
+        allocations: List[str],
+        types: List[Tuple[str, int, int]],
+        caches: Dict[str, int],
+    ) -> None:
+        """
+        :param rss: The resident set size in bytes, if known.
+        :param traced: The current and peak size of traced allocations.
+        :param allocations: The allocation sites that grew the most, formatted.
+        :param types: `(type name, count, growth)` for the object types that grew the most.
+        :param caches: Entry counts of the bot's caches.
+        """
+        self.rss = rss
+        self.traced = traced
+        self.allocations = allocations
+        self.types = types
+        self.caches = caches
+
+    def render(self) -> str:
+        lines = [
+            f"RSS: {format_size(self.rss) if self.rss is not None else 'unknown'}",
+            f"Traced: {format_size(self.traced[0])} (peak {format_size(self.traced[1])})",
+            "",
+            "Top allocation sites since baseline:",
+            *self.allocations,
+            "",
+            "Object types since baseline:",
+            *(f"{name}: {count} ({growth:+d})" for name, count, growth in self.types),
+            "",
+            "Caches:",
+            *(f"{name}: {size}" for name, size in self.caches.items()),
+        ]
+        return "\n".join(lines) + "\n"
+
+
+class MemoryTracker:
+    """Keeps the baseline snapshot and object counts that reports are diffed against."""
+
+    def __init__(self, *, frames: int = 10) -> None:
+        self.frames = frames
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self.baseline_types: Counter = Counter()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self) -> None:
+        """
+        Start tracing allocations and take the baseline. This is blocking, run it in a thread.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self.reset_baseline()
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+        self.baseline = None
+        self.baseline_types = Counter()
+
+    def reset_baseline(self) -> None:
+        self.baseline = self._snapshot()
+        self.baseline_types = count_object_types()
+
+    def report(self, caches: Dict[str, int], *, limit: int = 15) -> MemoryReport:
+        """
+        Diff the current state against the baseline. This is blocking, run it in a thread.
+
+        :param caches: Entry counts of the bot's caches to include in the report.
+        :param limit: How many allocation sites and object types to report.
+        """
+        if self.baseline is None:
+            raise RuntimeError("Memory tracing has not been started.")
+        snapshot = self._snapshot()
+        allocations = [
+            f"{format_size(stat.size_diff):>10} ({stat.count_diff:+d} blocks) {stat.traceback[0]}"
+            for stat in snapshot.compare_to(self.baseline, "lineno")[:limit]
+        ]
+        current_types = count_object_types()
+        growth = Counter(current_types)
+        growth.subtract(self.baseline_types)
+        types = [
+            (name, current_types[name], delta)
+            for name, delta in growth.most_common(limit)
+        ]
+        return MemoryReport(
+            rss=rss_bytes(),
+            traced=tracemalloc.get_traced_memory(),
+            allocations=allocations,
+            types=types,
+            caches=caches,
+        )
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, filename) for filename in IGNORED_FILES]
+        )
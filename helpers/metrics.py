@@ -0,0 +1,347 @@
+"""
+In-process metrics registry with a Prometheus text exposition endpoint.
+
+The registry is deliberately small: every metric keeps its samples in a plain
+dictionary keyed by the tuple of label values, so recording a sample on a hot
+path costs one dictionary lookup and an addition.
+"""
+
+from __future__ import annotations
+
+import functools
+import inspect
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import aiohttp
+from aiohttp import web
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+Collector = Callable[[], Union[None, Awaitable[None]]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labelvalues: Tuple[Any, ...]) -> Tuple[str, ...]:
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {labelvalues!r}"
+            )
+        return tuple(str(value) for value in labelvalues)
+
+    def _header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {_escape(self.documentation)}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, value in self._values.items():
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Counter(_Metric):
+    """A monotonically increasing value."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: Any, amount: float = 1.0) -> None:
+        key = self._key(labelvalues)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, *labelvalues: Any) -> float:
+        return self._values.get(self._key(labelvalues), 0.0)
+
+
+class Gauge(_Metric):
+    """A value that can go up and down."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labelvalues: Any) -> None:
+        self._values[self._key(labelvalues)] = float(value)
+
+    def inc(self, *labelvalues: Any, amount: float = 1.0) -> None:
+        key = self._key(labelvalues)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, *labelvalues: Any, amount: float = 1.0) -> None:
+        self.inc(*labelvalues, amount=-amount)
+
+    def get(self, *labelvalues: Any) -> float:
+        return self._values.get(self._key(labelvalues), 0.0)
+
+    def clear(self) -> None:
+        self._values.clear()
+
+
+class Histogram(_Metric):
+    """Bucketed observations; bucket counts are only made cumulative when rendered."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Each series is [per-bucket counts (+Inf last), sum, count].
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, *labelvalues: Any) -> None:
+        key = self._key(labelvalues)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def time(self, *labelvalues: Any) -> "_Timer":
+        return _Timer(self, labelvalues)
+
+    def count(self, *labelvalues: Any) -> int:
+        series = self._series.get(self._key(labelvalues))
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        bucket_labels = self.labelnames + ("le",)
+        for key, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(bucket_labels, key + (_format_value(bound),))} {cumulative}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_labelvalues", "_start")
+
+    def __init__(self, histogram: Histogram, labelvalues: Tuple[Any, ...]) -> None:
+        self._histogram = histogram
+        self._labelvalues = labelvalues
+        self._start = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._histogram.observe(time.perf_counter() - self._start, *self._labelvalues)
+
+
+class MetricsRegistry:
+    """Holds every metric of the process and renders them in Prometheus text format."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Collector] = []
+
+    def _get_or_create(self, cls: type, name: str, *args: Any, **kwargs: Any) -> Any:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, *args, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def add_collector(self, collector: Collector) -> None:
+        """
+        Register a callback that refreshes gauges right before each scrape.
+
+        :param collector: A function or coroutine function taking no arguments.
+        """
+        self._collectors.append(collector)
+
+    def remove_collector(self, collector: Collector) -> None:
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+
+    async def collect(self) -> None:
+        for collector in list(self._collectors):
+            result = collector()
+            if inspect.isawaitable(result):
+                await result
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def instrument(target: Any, histogram: Histogram, names: Optional[Iterable[str]] = None) -> None:
+    """
+    Wrap the public coroutine methods of ``target`` so each call is timed.
+
+    The wrappers are bound on the instance, leaving the class untouched.
+
+    :param target: The object whose methods should be timed.
+    :param histogram: A histogram with a single label receiving the method name.
+    :param names: Method names to wrap. Defaults to every public coroutine method.
+    """
+    if names is None:
+        names = [
+            name
+            for name in dir(type(target))
+            if not name.startswith("_")
+            and inspect.iscoroutinefunction(getattr(type(target), name, None))
+        ]
+
+    for name in names:
+        method = getattr(target, name)
+
+        def _wrap(method: Callable[..., Awaitable[Any]], name: str) -> Callable[..., Awaitable[Any]]:
+            @functools.wraps(method)
+            async def timed(*args: Any, **kwargs: Any) -> Any:
+                start = time.perf_counter()
+                try:
+                    return await method(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start, name)
+
+            return timed
+
+        setattr(target, name, _wrap(method, name))
+
+
+def http_trace_config(histogram: Histogram) -> aiohttp.TraceConfig:
+    """
+    Build an aiohttp trace config that records request durations.
+
+    :param histogram: A histogram labelled by ``host``, ``method`` and ``status``.
+    """
+    trace_config = aiohttp.TraceConfig()
+
+    async def on_request_start(session, context, params) -> None:
+        context.start = time.perf_counter()
+
+    async def on_request_end(session, context, params) -> None:
+        histogram.observe(
+            time.perf_counter() - context.start,
+            params.url.host or "",
+            params.method,
+            params.response.status,
+        )
+
+    async def on_request_exception(session, context, params) -> None:
+        histogram.observe(
+            time.perf_counter() - context.start,
+            params.url.host or "",
+            params.method,
+            type(params.exception).__name__,
+        )
+
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    return trace_config
+
+
+class MetricsServer:
+    """Serves ``/metrics`` from a registry on a local HTTP port."""
+
+    def __init__(self, registry: MetricsRegistry, *, host: str = "127.0.0.1", port: int = 9100) -> None:
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        await self.registry.collect()
+        return web.Response(
+            body=self.registry.render().encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
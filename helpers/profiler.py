@@ -0,0 +1,150 @@
+"""
+Low-overhead sampling CPU profiler for the running bot.
+
+A daemon thread periodically reads the current stack of the event-loop thread
+through `sys._current_frames()`. Nothing is hooked into the interpreter, so
+the bot pays only for the sampling thread taking the GIL briefly once per
+interval. Samples are exported as collapsed stacks, the input format of
+flamegraph.pl and speedscope, and as a pstats file readable by `pstats` and
+snakeviz.
+"""
+
+from __future__ import annotations
+
+import marshal
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+FunctionKey = Tuple[str, int, str]
+
+
+class ProfileResult:
+    """Stacks collected by a `SamplingProfiler` run."""
+
+    def __init__(
+        self, stacks: Counter, interval: float, duration: float
+    ) -> None:
+        self.stacks = stacks
+        self.interval = interval
+        self.duration = duration
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def collapsed(self) -> str:
+        """Return one `frame;frame;frame count` line per distinct stack, outermost frame first."""
+        lines = []
+        for stack, count in self.stacks.most_common():
+            frames = ";".join(
+                f"{name} ({filename}:{line})" for filename, _, name, line in stack
+            )
+            lines.append(f"{frames} {count}")
+        return "\n".join(lines) + "\n"
+
+    def stats(self) -> Dict[FunctionKey, tuple]:
+        """
+        Build a dictionary in the format written by `cProfile`, with times estimated from sample counts.
+        """
+        own: Counter = Counter()
+        cumulative: Counter = Counter()
+        callers: Dict[FunctionKey, Counter] = {}
+        for stack, count in self.stacks.items():
+            functions = [frame[:3] for frame in stack]
+            own[functions[-1]] += count
+            for function in set(functions):
+                cumulative[function] += count
+            for caller, callee in zip(functions, functions[1:]):
+                callers.setdefault(callee, Counter())[caller] += count
+
+        stats = {}
+        for function, total in cumulative.items():
+            own_time = own[function] * self.interval
+            stats[function] = (
+                total,
+                total,
+                own_time,
+                total * self.interval,
+                {
+                    caller: (calls, calls, 0.0, calls * self.interval)
+                    for caller, calls in callers.get(function, {}).items()
+                },
+            )
+        return stats
+
+    def top(self, limit: int = 10) -> List[Tuple[str, int]]:
+        """Return the functions with the most samples on top of the stack."""
+        own: Counter = Counter()
+        for stack, count in self.stacks.items():
+            filename, _, name, _ = stack[-1]
+            own[f"{name} ({filename})"] += count
+        return own.most_common(limit)
+
+    def write_collapsed(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(self.collapsed())
+
+    def write_pstats(self, path: str) -> None:
+        with open(path, "wb") as file:
+            marshal.dump(self.stats(), file)
+
+
+class SamplingProfiler:
+    def __init__(self, *, interval: float = 0.01, thread_id: Optional[int] = None) -> None:
+        """
+        :param interval: Seconds between two samples.
+        :param thread_id: The thread to sample. Defaults to the thread calling `start`.
+        """
+        self.interval = interval
+        self.thread_id = thread_id
+        self._stacks: Counter = Counter()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._started_at = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        if self.running:
+            raise RuntimeError("The profiler is already running.")
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+        self._stacks = Counter()
+        self._stopped.clear()
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(
+            target=self._sample, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> ProfileResult:
+        if not self.running:
+            raise RuntimeError("The profiler is not running.")
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+        return ProfileResult(
+            self._stacks, self.interval, time.perf_counter() - self._started_at
+        )
+
+    def _sample(self) -> None:
+        own_thread = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None or self.thread_id == own_thread:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                # Functions are keyed by definition line, the sampled line is kept for collapsed stacks.
+                stack.append(
+                    (code.co_filename, code.co_firstlineno, code.co_name, frame.f_lineno)
+                )
+                frame = frame.f_back
+            stack.reverse()
+            self._stacks[tuple(stack)] += 1
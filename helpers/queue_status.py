@@ -0,0 +1,113 @@
+"""
+Debounced live queue status messages.
+
+Every queue change marks its event's status message as stale. One task per
+stale event re-renders the message and edits it, at most once every
+`interval` seconds, so a drop with hundreds of joins costs a handful of edits
+instead of one per join. Edits whose rendered content did not change are
+skipped.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+
+class StatusMessage:
+    __slots__ = ("event_id", "channel_id", "message_id", "content", "edited_at")
+
+    def __init__(
+        self,
+        event_id: int,
+        channel_id: int,
+        message_id: int,
+        content: Optional[str] = None,
+    ) -> None:
+        self.event_id = event_id
+        self.channel_id = channel_id
+        self.message_id = message_id
+        # What the message currently shows, None when unknown.
+        self.content = content
+        self.edited_at = float("-inf")
+
+
+class QueueStatusBoard:
+    def __init__(
+        self,
+        render: Callable[[int], Awaitable[str]],
+        publish: Callable[[StatusMessage, str], Awaitable[bool]],
+        *,
+        interval: float = 5.0,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        """
+        :param render: Returns the status content of an event.
+        :param publish: Edits a status message, returning False when the message is gone.
+        :param interval: The shortest time between two edits of the same message, in seconds.
+        :param logger: Where failed refreshes are reported.
+        """
+        self.render = render
+        self.publish = publish
+        self.interval = interval
+        self.logger = logger or logging.getLogger("discord_bot")
+        self.messages: Dict[int, StatusMessage] = {}
+        self.edits = 0
+        self.skipped = 0
+        self._stale: Set[int] = set()
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def track(self, message: StatusMessage) -> None:
+        """Keep a status message up to date, replacing the event's previous one."""
+        self.messages[message.event_id] = message
+
+    def untrack(self, event_id: int) -> Optional[StatusMessage]:
+        self._stale.discard(event_id)
+        return self.messages.pop(event_id, None)
+
+    def changed(self, event_id: int) -> None:
+        """Mark an event's status as stale, scheduling a refresh if none is pending."""
+        if event_id not in self.messages:
+            return
+        self._stale.add(event_id)
+        if event_id not in self._tasks:
+            self._tasks[event_id] = asyncio.create_task(self._refresh(event_id))
+
+    async def _refresh(self, event_id: int) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while event_id in self._stale:
+                message = self.messages.get(event_id)
+                if message is None:
+                    return
+                delay = message.edited_at + self.interval - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                # Changes from here on are not in this render and need another pass.
+                self._stale.discard(event_id)
+                content = await self.render(event_id)
+                if content == message.content:
+                    self.skipped += 1
+                    continue
+                if not await self.publish(message, content):
+                    if self.messages.get(event_id) is message:
+                        self.untrack(event_id)
+                    return
+                message.content = content
+                message.edited_at = loop.time()
+                self.edits += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.logger.exception(f"Could not refresh the queue status of event {event_id}")
+        finally:
+            self._tasks.pop(event_id, None)
+
+    async def close(self) -> None:
+        """Cancel pending refreshes."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._stale.clear()
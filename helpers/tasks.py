@@ -0,0 +1,73 @@
+"""
+Supervised background work for cogs.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Coroutine, Optional, Set
+
+from helpers.metrics import Counter
+
+
+class BackgroundTasks:
+    """
+    Runs coroutines after a command has answered, at most `limit` at a time.
+
+    Failures are logged and counted instead of disappearing with the task, and
+    `close` cancels whatever is still pending or running.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        limit: int = 10,
+        logger: Optional[logging.Logger] = None,
+        errors: Optional[Counter] = None,
+    ) -> None:
+        """
+        :param name: Used in log messages and as the metric label.
+        :param limit: How many tasks run at once, the others wait for a slot.
+        :param logger: Where failures are reported.
+        :param errors: Optional counter of failed tasks, labelled by group and task name.
+        """
+        self.name = name
+        self.logger = logger or logging.getLogger("discord_bot")
+        self.errors = errors
+        self._slots = asyncio.Semaphore(limit)
+        self._tasks: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def spawn(self, coroutine: Coroutine[Any, Any, Any], *, name: str) -> asyncio.Task:
+        """
+        Schedule a coroutine in the group.
+
+        :param coroutine: The work to run.
+        :param name: A short description of the work, used when it fails.
+        """
+        task = asyncio.create_task(self._run(coroutine, name), name=f"{self.name}:{name}")
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        # A task cancelled before it started never awaited its coroutine.
+        task.add_done_callback(lambda task: task.cancelled() and coroutine.close())
+        return task
+
+    async def _run(self, coroutine: Coroutine[Any, Any, Any], name: str) -> None:
+        try:
+            async with self._slots:
+                await coroutine
+        except Exception:
+            self.logger.exception(f"Background task {name} of {self.name} failed")
+            if self.errors is not None:
+                self.errors.inc(self.name, name)
+
+    async def close(self) -> None:
+        """Cancel every pending and running task and wait for them to finish."""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,120 @@
+"""
+Startup cache warm-up for the events cog.
+
+After a restart the first commands for a busy event would all go to the
+database at once. The warm-up preloads the events that are likely to be used
+(dated today or later, or active recently), the membership index of their
+queues and the members shown at the head of each queue, within a time budget
+and a cap on the number of queue entries held in memory.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict
+
+import discord
+from discord.ext import commands
+
+
+class WarmupReport:
+    """What a warm-up loaded."""
+
+    def __init__(self) -> None:
+        self.events = 0
+        self.queues = 0
+        self.buyers = 0
+        self.members = 0
+        self.skipped_queues = 0
+        self.timed_out = False
+        self.duration = 0.0
+
+    def __str__(self) -> str:
+        summary = (
+            f"{self.events} events, {self.queues} queues ({self.buyers} buyers) "
+            f"and {self.members} members in {self.duration:.2f}s"
+        )
+        if self.skipped_queues:
+            summary += f", skipped {self.skipped_queues} queues over the entry budget"
+        if self.timed_out:
+            summary += ", stopped at the time budget"
+        return summary
+
+
+async def warm_up(
+    bot: commands.Bot,
+    event_cache: Dict[int, Dict[str, Any]],
+    *,
+    timeout: float = 10.0,
+    max_entries: int = 200_000,
+    concurrency: int = 4,
+    activity_days: float = 7.0,
+    head_size: int = 15,
+) -> WarmupReport:
+    """
+    Preload active events into `event_cache` and their queues into the storage backend.
+
+    :param bot: The bot, its `database` must be open.
+    :param event_cache: Filled with the active events, keyed by event ID.
+    :param timeout: Seconds the warm-up may take, work still running after it is cancelled.
+    :param max_entries: The most queue entries loaded, larger queues are skipped once it is reached.
+    :param concurrency: Queues loaded at the same time.
+    :param activity_days: Events joined, listed or created in this many days count as active.
+    :param head_size: Queue entries whose members are loaded, the size of the queue view.
+    """
+    report = WarmupReport()
+    started = time.perf_counter()
+    since = (datetime.now(timezone.utc) - timedelta(days=activity_days)).strftime(
+        "%Y-%m-%d %H:%M:%S"
+    )
+    slots = asyncio.Semaphore(concurrency)
+
+    async def warm_queue(event: Dict[str, Any]) -> None:
+        async with slots:
+            report.buyers += await bot.database.get_queue_size(event["id"])
+            report.queues += 1
+            head = await bot.database.list_queue(event["id"], 0, head_size)
+            guild = bot.get_guild(int(event["guild_id"]))
+            if guild is None:
+                return
+            missing = [
+                int(entry["user_id"])
+                for entry in head
+                if guild.get_member(int(entry["user_id"])) is None
+            ]
+            if missing:
+                try:
+                    members = await guild.query_members(user_ids=missing, cache=True)
+                except (discord.ClientException, asyncio.TimeoutError):
+                    return
+                report.members += len(members)
+
+    async def run() -> None:
+        events = await bot.database.list_active_events(since)
+        for event in events:
+            event_cache[event["id"]] = event
+        report.events = len(events)
+
+        sizes = await bot.database.queue_sizes()
+        planned = []
+        budget = max_entries
+        # Bigger queues are the ones a drop hits, so they are loaded first.
+        for event in sorted(events, key=lambda event: -sizes.get(event["id"], 0)):
+            size = sizes.get(event["id"], 0)
+            if not size:
+                continue
+            if size > budget:
+                report.skipped_queues += 1
+                continue
+            budget -= size
+            planned.append(event)
+        await asyncio.gather(*(warm_queue(event) for event in planned))
+
+    try:
+        await asyncio.wait_for(run(), timeout)
+    except asyncio.TimeoutError:
+        report.timed_out = True
+    report.duration = time.perf_counter() - started
+    return report
@@ -0,0 +1,113 @@
+"""
+Event-loop lag monitor and blocking-call detector.
+
+A coroutine sleeps for a fixed interval and measures how late it wakes up,
+which is the scheduling lag every other coroutine sees. A daemon thread
+watches the heartbeat of that coroutine; when the loop stops beating for
+longer than the threshold it captures the stack of the loop thread while the
+blocking call is still running, so the report points at the offending code.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from helpers.metrics import Counter, Histogram
+
+
+class LoopWatchdog:
+    def __init__(
+        self,
+        *,
+        logger: logging.Logger,
+        interval: float = 0.5,
+        threshold: float = 0.25,
+        lag_histogram: Optional[Histogram] = None,
+        stall_counter: Optional[Counter] = None,
+    ) -> None:
+        """
+        :param logger: The logger receiving stall reports.
+        :param interval: How often, in seconds, the loop lag is sampled.
+        :param threshold: The lag, in seconds, above which the loop is considered blocked.
+        :param lag_histogram: Optional histogram receiving every lag sample.
+        :param stall_counter: Optional counter incremented for every detected stall.
+        """
+        self.logger = logger
+        self.interval = interval
+        self.threshold = threshold
+        self.lag_histogram = lag_histogram
+        self.stall_counter = stall_counter
+        self.max_lag = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """
+        Start monitoring the running event loop. Must be called from inside the loop.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = self._loop.create_task(self._measure(), name="loop-watchdog")
+        self._thread = threading.Thread(
+            target=self._detect, name="loop-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _measure(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self._heartbeat = time.monotonic()
+            self.max_lag = max(self.max_lag, lag)
+            if self.lag_histogram is not None:
+                self.lag_histogram.observe(lag)
+
+    def _detect(self) -> None:
+        reported_heartbeat = None
+        poll = min(self.interval, self.threshold) / 2
+        while not self._stopped.wait(poll):
+            heartbeat = self._heartbeat
+            stalled_for = time.monotonic() - heartbeat - self.interval
+            if stalled_for < self.threshold or heartbeat == reported_heartbeat:
+                continue
+            # Only report each stall once, while it is still happening.
+            reported_heartbeat = heartbeat
+            if self.stall_counter is not None:
+                self.stall_counter.inc()
+            self.logger.warning(
+                f"Event loop blocked for over {stalled_for:.3f}s{self._describe_task()}\n"
+                f"{self._capture_stack()}"
+            )
+
+    def _describe_task(self) -> str:
+        # Reading the loop's current task from another thread is a plain dictionary lookup.
+        task = asyncio.current_task(self._loop) if self._loop is not None else None
+        if task is None:
+            return ""
+        return f" in task {task.get_name()} running {task.get_coro()!r}"
+
+    def _capture_stack(self) -> str:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return "(loop thread stack unavailable)"
+        return "".join(traceback.format_stack(frame))
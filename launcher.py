@@ -0,0 +1,127 @@
+"""
+Description:
+Runs the bot as a cluster: one database owner process and several bot worker processes, each
+handling its own group of shards. SQLite only takes one writer, so workers send their writes to
+the owner over a Unix socket and read through their own connection.
+
+Configuration:
+- `CLUSTER_WORKERS` – the number of bot processes, defaults to the number of CPU cores
+- `SHARD_COUNT` – the total number of shards, defaults to one per worker
+"""
+
+import asyncio
+import os
+import signal
+import sys
+
+from dotenv import load_dotenv
+
+from database.remote import cluster_storage_problem
+from helpers.logger import setup_logging
+
+load_dotenv()
+
+ROOT = os.path.realpath(os.path.dirname(__file__))
+DATABASE_PATH = f"{ROOT}/database/database.db"
+SOCKET_PATH = os.getenv("DATABASE_SOCKET", f"{ROOT}/database/database.sock")
+RESTART_DELAY = 5.0
+
+logger, log_listener = setup_logging("discord_bot.launcher")
+
+
+def worker_environment(worker_id: int, workers: int, shard_count: int) -> dict:
+    """
+    Build the environment of a worker, giving it every `workers`-th shard starting at its ID.
+    """
+    environment = dict(os.environ)
+    environment["SHARD_COUNT"] = str(shard_count)
+    environment["SHARD_IDS"] = ",".join(
+        str(shard_id) for shard_id in range(worker_id, shard_count, workers)
+    )
+    environment["DATABASE_SOCKET"] = SOCKET_PATH
+    # Each process rotates its own log file, and needs its own metrics port.
+    log_file, extension = os.path.splitext(os.getenv("LOG_FILE", "discord.log"))
+    environment["LOG_FILE"] = f"{log_file}-worker-{worker_id}{extension}"
+    if os.getenv("METRICS_PORT"):
+        environment["METRICS_PORT"] = str(int(os.getenv("METRICS_PORT")) + worker_id)
+    return environment
+
+
+async def supervise_worker(
+    worker_id: int, workers: int, shard_count: int, stopping: asyncio.Event
+) -> None:
+    """
+    Run a worker and restart it whenever it exits, until the cluster is stopping.
+    """
+    environment = worker_environment(worker_id, workers, shard_count)
+    while not stopping.is_set():
+        logger.info(f"Starting worker {worker_id} with shards {environment['SHARD_IDS']}")
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, f"{ROOT}/bot.py", env=environment
+        )
+        try:
+            code = await process.wait()
+        except asyncio.CancelledError:
+            process.terminate()
+            await process.wait()
+            raise
+        if stopping.is_set():
+            return
+        logger.warning(
+            f"Worker {worker_id} exited with code {code}, restarting in {RESTART_DELAY} seconds"
+        )
+        await asyncio.sleep(RESTART_DELAY)
+
+
+async def main() -> None:
+    workers = int(os.getenv("CLUSTER_WORKERS") or os.cpu_count() or 1)
+    shard_count = int(os.getenv("SHARD_COUNT") or workers)
+    if shard_count < workers:
+        raise SystemExit("SHARD_COUNT must be at least CLUSTER_WORKERS")
+    problem = cluster_storage_problem(os.environ)
+    if problem:
+        raise SystemExit(problem)
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+
+    logger.info(f"Starting the database owner on {SOCKET_PATH}")
+    owner = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-m",
+        "database.remote",
+        "--database",
+        DATABASE_PATH,
+        "--socket",
+        SOCKET_PATH,
+        cwd=ROOT,
+    )
+    supervisors = [
+        asyncio.create_task(supervise_worker(worker_id, workers, shard_count, stopping))
+        for worker_id in range(workers)
+    ]
+    owner_exit = asyncio.create_task(owner.wait())
+    stop_requested = asyncio.create_task(stopping.wait())
+    await asyncio.wait({owner_exit, stop_requested}, return_when=asyncio.FIRST_COMPLETED)
+    if owner_exit.done():
+        logger.error(f"The database owner exited with code {owner.returncode}, stopping the cluster")
+        stopping.set()
+
+    # Stop the workers before the owner so their last writes still go through.
+    for supervisor in supervisors:
+        supervisor.cancel()
+    await asyncio.gather(*supervisors, return_exceptions=True)
+    if owner.returncode is None:
+        owner.terminate()
+        await owner.wait()
+    stop_requested.cancel()
+    logger.info("Cluster stopped")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    finally:
+        log_listener.stop()
@@ -0,0 +1,105 @@
+import asyncio
+from pathlib import Path
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from helpers.admission import AdmissionController, AdmissionRejected
+
+
+def make_context(user_id: int, guild_id: int = 1):
+    return SimpleNamespace(
+        author=SimpleNamespace(id=user_id),
+        guild=SimpleNamespace(id=guild_id),
+        interaction=None,
+    )
+
+
+def test_user_bucket_rejects_bursts():
+    async def runner():
+        controller = AdmissionController(user_rate=0.5, user_burst=2)
+        for _ in range(2):
+            context = make_context(1)
+            await controller.admit(context)
+            controller.release(context)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.admit(make_context(1))
+        assert rejected.value.reason == "user_rate"
+        assert rejected.value.retry_after == 2
+
+        # Other users have their own bucket.
+        await controller.admit(make_context(2))
+
+    asyncio.run(runner())
+
+
+def test_excess_work_waits_then_is_shed():
+    async def runner():
+        controller = AdmissionController(
+            global_concurrency=1, guild_concurrency=10, reserve=2.8
+        )
+        # Commands finish quickly, so waiting for a slot is worth it.
+        controller.global_limiter.average_hold = 0.05
+        first = make_context(1)
+        await controller.admit(first)
+
+        # A free slot within the wait budget admits the waiting command.
+        second = make_context(2)
+        waiter = asyncio.create_task(controller.admit(second))
+        await asyncio.sleep(0.05)
+        controller.release(first)
+        await waiter
+        assert controller.in_flight == 1
+
+        # No slot before the deadline sheds the command.
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.admit(make_context(3))
+        assert rejected.value.reason == "overloaded"
+        assert controller.global_limiter.waiting == 0
+
+        controller.release(second)
+        controller.release(second)
+        assert controller.in_flight == 0
+
+    asyncio.run(runner())
+
+
+def test_long_expected_wait_is_shed_immediately():
+    async def runner():
+        controller = AdmissionController(global_concurrency=1, reserve=1)
+        controller.global_limiter.average_hold = 5.0
+        await controller.admit(make_context(1))
+
+        started = time.monotonic()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.admit(make_context(2))
+        assert time.monotonic() - started < 0.1
+        assert (rejected.value.reason, rejected.value.retry_after) == ("overloaded", 5)
+        assert controller.global_limiter.waiting == 0
+
+    asyncio.run(runner())
+
+
+def test_guild_cap_and_live_tuning():
+    async def runner():
+        controller = AdmissionController(guild_concurrency=1, reserve=3)
+        first = make_context(1)
+        await controller.admit(first)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.admit(make_context(2))
+        assert rejected.value.reason == "guild_busy"
+
+        # Another guild is not affected by the first one's cap.
+        await controller.admit(make_context(3, guild_id=2))
+
+        controller.configure("guild_concurrency", 2)
+        await controller.admit(make_context(4))
+        with pytest.raises(ValueError):
+            controller.configure("unknown", 1)
+
+    asyncio.run(runner())
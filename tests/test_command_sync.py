@@ -0,0 +1,54 @@
+import asyncio
+from pathlib import Path
+import sys
+from types import SimpleNamespace
+
+import discord
+from discord import app_commands
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from database.memory import MemoryDatabaseManager
+from helpers.command_sync import command_tree_hash, sync_commands
+
+
+def test_sync_only_when_tree_changes():
+    async def runner():
+        client = discord.Client(intents=discord.Intents.none())
+        client._connection.application_id = 1234
+        tree = app_commands.CommandTree(client)
+        uploads = []
+
+        async def sync(*, guild=None):
+            uploads.append(guild)
+            return []
+
+        tree.sync = sync
+
+        @tree.command(name="ping", description="Ping.")
+        async def ping(interaction: discord.Interaction) -> None:
+            return
+
+        bot = SimpleNamespace(tree=tree, database=MemoryDatabaseManager())
+        assert await sync_commands(bot) is True
+        assert await sync_commands(bot) is False
+        assert await sync_commands(bot, force=True) is True
+        assert len(uploads) == 2
+
+        first = command_tree_hash(tree)
+
+        @tree.command(name="pong", description="Pong.")
+        async def pong(interaction: discord.Interaction) -> None:
+            return
+
+        assert command_tree_hash(tree) != first
+        assert await sync_commands(bot) is True
+
+        # Guild scopes are tracked separately from the global one.
+        guild = discord.Object(id=42)
+        assert await sync_commands(bot, guild) is True
+        assert uploads[-1] is guild
+        await client.close()
+
+    asyncio.run(runner())
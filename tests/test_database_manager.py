@@ -3,27 +3,33 @@ from pathlib import Path
 import sys
 
 import aiosqlite
+import pytest
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 sys.path.append(str(PROJECT_ROOT))
 
-from database import DatabaseManager
+import database
+from database import SCHEMA_VERSION, DatabaseManager, StorageBackend, ensure_schema
+from database.memory import MemoryDatabaseManager
 
+BACKENDS = ["sqlite", "memory"]
 
-async def create_manager() -> DatabaseManager:
-    schema_path = PROJECT_ROOT / "database" / "schema.sql"
+
+async def create_manager(backend: str = "sqlite") -> StorageBackend:
+    if backend == "memory":
+        return MemoryDatabaseManager()
     connection = await aiosqlite.connect(":memory:")
     connection.row_factory = aiosqlite.Row
-    with open(schema_path, "r", encoding="utf-8") as schema_file:
-        await connection.executescript(schema_file.read())
+    await ensure_schema(connection)
     manager = DatabaseManager(connection=connection)
     await manager.enable_foreign_keys()
     return manager
 
 
-def test_create_event_and_list():
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_create_event_and_list(backend):
     async def runner():
-        manager = await create_manager()
+        manager = await create_manager(backend)
         try:
             event_id = await manager.create_event(
                 guild_id=123,
@@ -48,9 +54,10 @@ def test_create_event_and_list():
     asyncio.run(runner())
 
 
-def test_queue_operations():
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_queue_operations(backend):
     async def runner():
-        manager = await create_manager()
+        manager = await create_manager(backend)
         try:
             event_id = await manager.create_event(
                 guild_id=999,
@@ -75,6 +82,8 @@ def test_queue_operations():
 
             queue = await manager.list_queue(event_id)
             assert [entry["user_id"] for entry in queue] == ["1", "2"]
+            assert [entry["user_id"] for entry in await manager.list_queue(event_id, 1)] == ["2"]
+            assert [entry["user_id"] for entry in await manager.list_queue(event_id, 0, 1)] == ["1"]
 
             next_buyer = await manager.get_next_buyer(event_id)
             assert next_buyer is not None
@@ -90,9 +99,108 @@ def test_queue_operations():
     asyncio.run(runner())
 
 
-def test_ticket_listing():
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_queue_position(backend):
     async def runner():
-        manager = await create_manager()
+        manager = await create_manager(backend)
+        try:
+            event_id = await manager.create_event(
+                guild_id=999, name="Queue Event", created_by=222, source="manual"
+            )
+            for user_id in (1, 2, 3):
+                await manager.add_buyer_to_queue(event_id, user_id)
+            await manager.remove_buyer_from_queue(event_id, 1)
+
+            assert await manager.get_queue_position(event_id, 3) == 2
+            assert await manager.get_queue_position(event_id, 1) == 0
+            assert await manager.add_buyer_to_queue(event_id, 1) == (True, 3)
+            page = await manager.list_queue(event_id, 1, 5)
+            assert [entry["user_id"] for entry in page] == ["3", "1"]
+            assert await manager.get_queue_size(event_id) == 3
+            assert await manager.add_buyer_to_queue(event_id + 1, 1) == (False, 0)
+        finally:
+            await manager.close()
+
+    asyncio.run(runner())
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_add_buyers_in_batch(backend):
+    async def runner():
+        manager = await create_manager(backend)
+        try:
+            event_id = await manager.create_event(
+                guild_id=1, name="Drop", created_by=1, source="manual"
+            )
+            await manager.add_buyer_to_queue(event_id, 7)
+
+            results = await manager.add_buyers_to_queue(event_id, [1, 7, 2, 1])
+            assert results == [(True, 2), (False, 1), (True, 3), (False, 2)]
+            queue = await manager.list_queue(event_id)
+            assert [entry["user_id"] for entry in queue] == ["7", "1", "2"]
+        finally:
+            await manager.close()
+
+    asyncio.run(runner())
+
+
+def test_duplicate_join_skips_sqlite():
+    async def runner():
+        manager = await create_manager("sqlite")
+        try:
+            event_id = await manager.create_event(
+                guild_id=1, name="Drop", created_by=1, source="manual"
+            )
+            await manager.add_buyer_to_queue(event_id, 1)
+
+            statements = []
+            await manager.connection.set_trace_callback(statements.append)
+            assert await manager.add_buyer_to_queue(event_id, 1) == (False, 1)
+            assert await manager.get_queue_position(event_id, 1) == 1
+            await manager.connection.set_trace_callback(None)
+            assert statements == []
+
+            # Joins from a fresh manager load the index from the table.
+            reopened = DatabaseManager(connection=manager.connection)
+            assert await reopened.add_buyer_to_queue(event_id, 2) == (True, 2)
+        finally:
+            await manager.close()
+
+    asyncio.run(runner())
+
+
+def test_batch_conflict_only_skips_the_conflicting_buyer():
+    async def runner():
+        manager = await create_manager("sqlite")
+        try:
+            event_id = await manager.create_event(
+                guild_id=1, name="Drop", created_by=1, source="manual"
+            )
+            await manager.add_buyer_to_queue(event_id, 1)
+            # Written behind the membership index's back.
+            await manager.connection.execute(
+                "INSERT INTO buyer_queue(event_id, user_id) VALUES (?, ?)", (event_id, "3")
+            )
+            await manager.connection.commit()
+
+            results = await manager.add_buyers_to_queue(event_id, [2, 3, 4, 2])
+            assert results == [(True, 3), (False, 2), (True, 4), (False, 3)]
+            assert [entry["user_id"] for entry in await manager.list_queue(event_id)] == [
+                "1",
+                "3",
+                "2",
+                "4",
+            ]
+        finally:
+            await manager.close()
+
+    asyncio.run(runner())
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_ticket_listing(backend):
+    async def runner():
+        manager = await create_manager(backend)
         try:
             event_id = await manager.create_event(
                 guild_id=55,
@@ -113,3 +221,346 @@ def test_ticket_listing():
             await manager.close()
 
     asyncio.run(runner())
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_queue_sizes(backend):
+    async def runner():
+        manager = await create_manager(backend)
+        try:
+            first = await manager.create_event(
+                guild_id=1, name="First", created_by=1, source="manual"
+            )
+            second = await manager.create_event(
+                guild_id=1, name="Second", created_by=1, source="manual"
+            )
+            await manager.add_buyer_to_queue(first, 10)
+            await manager.add_buyer_to_queue(first, 11)
+            await manager.add_buyer_to_queue(second, 10)
+
+            assert await manager.queue_sizes() == {first: 2, second: 1}
+        finally:
+            await manager.close()
+
+    asyncio.run(runner())
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_command_hashes(backend):
+    async def runner():
+        manager = await create_manager(backend)
+        try:
+            assert await manager.get_command_hash("global") is None
+            await manager.set_command_hash("global", "abc")
+            await manager.set_command_hash("global", "def")
+            await manager.set_command_hash("guild:1", "abc")
+            assert await manager.get_command_hash("global") == "def"
+            assert await manager.get_command_hash("guild:1") == "abc"
+        finally:
+            await manager.close()
+
+    asyncio.run(runner())
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_status_messages(backend):
+    async def runner():
+        manager = await create_manager(backend)
+        try:
+            first = await manager.create_event(
+                guild_id=1, name="First", created_by=1, source="manual"
+            )
+            second = await manager.create_event(
+                guild_id=1, name="Second", created_by=1, source="manual"
+            )
+            await manager.set_status_message(second, 10, 100)
+            await manager.set_status_message(first, 10, 101)
+            await manager.set_status_message(first, 11, 102)
+            assert await manager.list_status_messages() == [
+                {"event_id": first, "channel_id": "11", "message_id": "102", "guild_id": "1"},
+                {"event_id": second, "channel_id": "10", "message_id": "100", "guild_id": "1"},
+            ]
+            await manager.remove_status_message(second)
+            assert [row["event_id"] for row in await manager.list_status_messages()] == [first]
+        finally:
+            await manager.close()
+
+    asyncio.run(runner())
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_search_events(backend):
+    async def runner():
+        manager = await create_manager(backend)
+        try:
+            async def create(name, venue=None, city=None, guild_id=1):
+                return await manager.create_event(
+                    guild_id=guild_id,
+                    name=name,
+                    created_by=1,
+                    source="manual",
+                    venue=venue,
+                    city=city,
+                )
+
+            rocks = await create("Illenium", "Red Rocks Amphitheatre", "Morrison")
+            red = await create("Red Rocks Takeover", "Echostage", "Washington")
+            gorge = await create("Porter Robinson", "Gorge Amphitheatre", "George")
+            await create("Red Rocks Late Show", "Red Rocks Amphitheatre", guild_id=2)
+
+            async def search(text):
+                return [event["id"] for event in await manager.search_events(1, text)]
+
+            # Matches in the name rank above matches in the venue.
+            assert await search("red roc") == [red, rocks]
+            assert await search("amphitheatres") == []
+            assert await search("AMPHITHEATRE") == [rocks, gorge]
+            # When no event matches every word, events matching some are returned.
+            assert await search("red rocks show") == [red, rocks]
+            assert await search("morrison george") == [rocks, gorge]
+            assert await search("  ") == []
+            assert await search("zedd") == []
+            assert [event["name"] for event in await manager.search_events(1, "gorge")] == [
+                "Porter Robinson"
+            ]
+            assert await manager.search_events(1, "red", limit=1) == [
+                (await manager.search_events(1, "red"))[0]
+            ]
+        finally:
+            await manager.close()
+
+    asyncio.run(runner())
+
+
+def test_search_scan_limit_keeps_full_matches(monkeypatch):
+    async def runner():
+        manager = await create_manager("sqlite")
+        try:
+            for number in range(5):
+                await manager.create_event(
+                    guild_id=1, name=f"Red Night {number}", created_by=1, source="manual"
+                )
+            both = await manager.create_event(
+                guild_id=1, name="Red Rocks", created_by=1, source="manual"
+            )
+            # Fewer events are scanned than match any word, the full match must be among them.
+            monkeypatch.setattr(database, "SEARCH_SCAN_LIMIT", 2)
+            assert [event["id"] for event in await manager.search_events(1, "red rocks")] == [both]
+        finally:
+            await manager.close()
+
+    asyncio.run(runner())
+
+
+def test_search_index_is_rebuilt_for_existing_events(tmp_path):
+    async def runner():
+        path = tmp_path / "database.db"
+        async with aiosqlite.connect(path) as connection:
+            await ensure_schema(connection)
+            # Recreate a database from before the search index.
+            for trigger in ("insert", "delete", "update"):
+                await connection.execute(f"DROP TRIGGER events_fts_{trigger}")
+            await connection.execute("DROP TABLE events_fts")
+            await connection.execute(
+                "INSERT INTO events(guild_id, name, source, created_by) "
+                "VALUES ('1', 'Old Event', 'manual', '1')"
+            )
+            await connection.execute("PRAGMA user_version = 0")
+            await connection.commit()
+        async with aiosqlite.connect(path) as connection:
+            assert await ensure_schema(connection) is True
+            manager = DatabaseManager(connection=connection)
+            assert [event["name"] for event in await manager.search_events(1, "old")] == [
+                "Old Event"
+            ]
+
+    asyncio.run(runner())
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_events_by_date(backend):
+    async def runner():
+        manager = await create_manager(backend)
+        try:
+            async def create(name, date):
+                return await manager.create_event(
+                    guild_id=1, name=name, created_by=1, source="manual", date=date
+                )
+
+            later = await create("Later", "Saturday, June 14th, 2025")
+            undated = await create("Undated", "sometime soon")
+            today = await create("Today", "2025-06-01T21:00:00Z")
+            past = await create("Past", "05/20/2025")
+            older = await create("Older", "2024-12-31")
+            soon = await create("Soon", "June 3, 2025")
+
+            events = await manager.list_events_with_stats(1)
+            assert [event["id"] for event in events] == [older, past, today, soon, later, undated]
+            assert events[1]["date"] == "05/20/2025"
+            assert events[1]["starts_at"] == 1747699200
+            assert events[-1]["starts_at"] is None
+
+            # 2025-06-01 at noon UTC.
+            now = 1748779200
+            upcoming = await manager.list_upcoming_events(1, now=now)
+            assert [event["id"] for event in upcoming] == [today, soon, later]
+            within = await manager.list_upcoming_events(1, days=7, now=now)
+            assert [event["id"] for event in within] == [today, soon]
+            assert [event["id"] for event in await manager.list_past_events(1, now=now)] == [
+                past,
+                older,
+            ]
+            assert len(await manager.list_past_events(1, limit=1, now=now)) == 1
+            assert await manager.list_upcoming_events(2, now=now) == []
+        finally:
+            await manager.close()
+
+    asyncio.run(runner())
+
+
+def test_event_dates_are_parsed_on_upgrade(tmp_path):
+    async def runner():
+        path = tmp_path / "database.db"
+        async with aiosqlite.connect(path) as connection:
+            # A database from before starts_at existed.
+            await connection.executescript(
+                """
+                CREATE TABLE events (
+                  id INTEGER PRIMARY KEY AUTOINCREMENT, guild_id TEXT NOT NULL,
+                  name TEXT NOT NULL, date TEXT, venue TEXT, city TEXT, url TEXT,
+                  source TEXT NOT NULL, source_id TEXT, created_by TEXT NOT NULL,
+                  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                  UNIQUE(guild_id, source, source_id)
+                );
+                INSERT INTO events(guild_id, name, date, source, created_by)
+                VALUES ('1', 'Old', '2025-06-14', 'manual', '1');
+                PRAGMA user_version = 5;
+                """
+            )
+        async with aiosqlite.connect(path) as connection:
+            connection.row_factory = aiosqlite.Row
+            assert await ensure_schema(connection) is True
+            manager = DatabaseManager(connection=connection)
+            events = await manager.list_upcoming_events(1, now=1748779200)
+            assert [(event["name"], event["starts_at"]) for event in events] == [
+                ("Old", 1749859200)
+            ]
+
+    asyncio.run(runner())
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_list_active_events(backend):
+    async def runner():
+        manager = await create_manager(backend)
+        try:
+            upcoming = await manager.create_event(
+                guild_id=1, name="Upcoming", created_by=1, source="manual", date="2999-01-01"
+            )
+            past = await manager.create_event(
+                guild_id=2, name="Past", created_by=1, source="manual", date="2000-01-01"
+            )
+            await manager.add_buyer_to_queue(past, 5)
+
+            recent = await manager.list_active_events("2000-01-01 00:00:00")
+            assert [event["id"] for event in recent] == [upcoming, past]
+            # Nothing happened after this timestamp, so only the dated event is active.
+            later = await manager.list_active_events("2999-01-01 00:00:00")
+            assert [event["id"] for event in later] == [upcoming]
+            # Events can be named as active, as the queue journal does for its joins.
+            named = await manager.list_active_events("2999-01-01 00:00:00", [past])
+            assert [event["id"] for event in named] == [upcoming, past]
+            assert await manager.get_queue_size(past) == 1
+        finally:
+            await manager.close()
+
+    asyncio.run(runner())
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_warnings(backend):
+    async def runner():
+        manager = await create_manager(backend)
+        try:
+            assert await manager.add_warn(1, 2, 3, "first") == 1
+            assert await manager.add_warn(1, 2, 3, "second") == 2
+            warnings = await manager.get_warnings(1, 2)
+            assert [(warning[3], warning[5]) for warning in warnings] == [
+                ("first", 1),
+                ("second", 2),
+            ]
+            assert int(warnings[0][4]) > 0
+            assert await manager.remove_warn(1, 1, 2) == 1
+        finally:
+            await manager.close()
+
+    asyncio.run(runner())
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_duplicate_source_is_ignored(backend):
+    async def runner():
+        manager = await create_manager(backend)
+        try:
+            first = await manager.create_event(
+                guild_id=7, name="Imported", created_by=1, source="edmtrain", source_id="42"
+            )
+            second = await manager.create_event(
+                guild_id=7, name="Imported", created_by=1, source="edmtrain", source_id="42"
+            )
+            assert first == second
+            assert len(await manager.list_events_with_stats(7)) == 1
+            event = await manager.get_event_by_source(7, "edmtrain", "42")
+            assert event["id"] == first
+            assert await manager.get_event(8, first) is None
+        finally:
+            await manager.close()
+
+    asyncio.run(runner())
+
+
+def test_memory_snapshot_round_trip(tmp_path):
+    async def runner():
+        snapshot_path = str(tmp_path / "snapshot.json")
+        manager = MemoryDatabaseManager(snapshot_path=snapshot_path)
+        event_id = await manager.create_event(
+            guild_id=1, name="Saved", created_by=1, source="manual"
+        )
+        await manager.add_buyer_to_queue(event_id, 10)
+        await manager.add_buyer_to_queue(event_id, 11)
+        await manager.remove_buyer_from_queue(event_id, 10)
+        await manager.add_buyer_to_queue(event_id, 12)
+        await manager.add_warn(5, 1, 6, "spam")
+        await manager.close()
+
+        restored = MemoryDatabaseManager(snapshot_path=snapshot_path)
+        queue = await restored.list_queue(event_id)
+        assert [entry["user_id"] for entry in queue] == ["11", "12"]
+        assert (await restored.get_event(1, event_id))["name"] == "Saved"
+        assert len(await restored.get_warnings(5, 1)) == 1
+        other = await restored.create_event(
+            guild_id=1, name="Next", created_by=1, source="manual"
+        )
+        assert other == event_id + 1
+
+    asyncio.run(runner())
+
+
+def test_schema_is_applied_once(tmp_path):
+    async def runner():
+        path = tmp_path / "database.db"
+        async with aiosqlite.connect(path) as connection:
+            assert await ensure_schema(connection) is True
+            await connection.execute("DROP TABLE tickets")
+            await connection.commit()
+        async with aiosqlite.connect(path) as connection:
+            # The recorded version is trusted, so the dropped table is not recreated.
+            assert await ensure_schema(connection) is False
+            async with connection.execute("PRAGMA user_version") as cursor:
+                assert (await cursor.fetchone())[0] == SCHEMA_VERSION
+            async with connection.execute(
+                "SELECT name FROM sqlite_master WHERE name = 'tickets'"
+            ) as cursor:
+                assert await cursor.fetchone() is None
+
+    asyncio.run(runner())
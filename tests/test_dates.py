@@ -0,0 +1,38 @@
+from pathlib import Path
+import sys
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from database.dates import parse_event_date, start_of_day
+
+JUNE_14 = 1749859200
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("2025-06-14", JUNE_14),
+        ("2025-06-14T20:00:00", JUNE_14 + 20 * 3600),
+        ("2025-06-14T20:00:00Z", JUNE_14 + 20 * 3600),
+        ("2025-06-14T20:00:00-06:00", JUNE_14 + 26 * 3600),
+        ("2025-06-14 20:00", JUNE_14 + 20 * 3600),
+        ("06/14/2025", JUNE_14),
+        ("Saturday, June 14th, 2025", JUNE_14),
+        ("Sat, Jun 14 2025", JUNE_14),
+        ("14 June 2025", JUNE_14),
+        ("  June 14, 2025 ", JUNE_14),
+        ("sometime soon", None),
+        ("", None),
+        (None, None),
+    ],
+)
+def test_parse_event_date(text, expected):
+    assert parse_event_date(text) == expected
+
+
+def test_start_of_day():
+    assert start_of_day(JUNE_14 + 20 * 3600 + 59) == JUNE_14
+    assert start_of_day(JUNE_14) == JUNE_14
@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import sys
+from types import SimpleNamespace
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from helpers.deferral import LatencyBudget
+from helpers.metrics import MetricsRegistry
+
+
+class FakeContext:
+    def __init__(self, age: float, extras=None) -> None:
+        self.command = SimpleNamespace(qualified_name="queue_join", extras=extras or {})
+        self.deferred = False
+        self.ephemeral = None
+        created_at = datetime.now(timezone.utc) - timedelta(seconds=age)
+        self.interaction = SimpleNamespace(
+            created_at=created_at,
+            response=SimpleNamespace(is_done=lambda: self.deferred),
+        )
+
+    async def defer(self, ephemeral: bool = False) -> None:
+        self.deferred = True
+        self.ephemeral = ephemeral
+
+
+def test_defers_when_projected_latency_exceeds_budget():
+    async def runner():
+        registry = MetricsRegistry()
+        deferrals = registry.counter("deferrals", "", ("command",))
+        budget = LatencyBudget(margin=0.5, deferrals=deferrals)
+
+        # Nothing is known about the command yet, so it is left alone.
+        fresh = FakeContext(age=0.1)
+        await budget.before_invoke(fresh)
+        assert not fresh.deferred
+
+        fresh.budget_started -= 1.0
+        budget.observe(fresh)
+        assert 0.9 < budget.projected("queue_join") < 1.5
+
+        # 2.9 seconds left is enough for a one second command, 1.2 seconds is not.
+        early = FakeContext(age=0.1)
+        await budget.before_invoke(early)
+        assert not early.deferred
+        late = FakeContext(age=1.8)
+        await budget.before_invoke(late)
+        assert late.deferred and late.ephemeral is False
+        assert 'deferrals{command="queue_join"} 1' in registry.render()
+
+    asyncio.run(runner())
+
+
+def test_private_commands_defer_ephemerally():
+    async def runner():
+        budget = LatencyBudget(margin=0.5)
+        context = FakeContext(age=0.1)
+        await budget.before_invoke(context)
+        context.budget_started -= 3.0
+        budget.observe(context)
+
+        private = FakeContext(age=0.1, extras={"ephemeral_defer": True})
+        await budget.before_invoke(private)
+        assert private.deferred and private.ephemeral is True
+
+    asyncio.run(runner())
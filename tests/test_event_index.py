@@ -0,0 +1,41 @@
+from pathlib import Path
+import sys
+import time
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from helpers.event_index import MAX_CHOICES, EventIndex
+
+
+def test_search_matches_ids_names_and_words():
+    index = EventIndex(
+        [
+            {"id": 12, "name": "Deadmau5 Live"},
+            {"id": 120, "name": "Live at the Gorge"},
+            {"id": 7, "name": "Porter Robinson"},
+        ]
+    )
+    assert index.search("12") == [(12, "Deadmau5 Live"), (120, "Live at the Gorge")]
+    assert index.search("#7") == [(7, "Porter Robinson")]
+    # Whole-name prefixes come before word prefixes.
+    assert [event_id for event_id, _ in index.search("LIVE")] == [120, 12]
+    assert [event_id for event_id, _ in index.search("live at")] == [120]
+    assert index.search("rob") == [(7, "Porter Robinson")]
+    assert index.search("zedd") == []
+    assert [event_id for event_id, _ in index.search("")] == [120, 12, 7]
+
+    index.add(3, "Robin Schulz")
+    index.add(3, "Robin Schulz")
+    assert len(index) == 4
+    assert [event_id for event_id, _ in index.search("robin")] == [3, 7]
+
+
+def test_search_is_bounded_for_large_guilds():
+    index = EventIndex(
+        {"id": event_id, "name": f"Show {event_id}"} for event_id in range(1, 20001)
+    )
+    started = time.perf_counter()
+    for text in ("show", "1", "show 19", "s"):
+        assert len(index.search(text)) == MAX_CHOICES
+    assert time.perf_counter() - started < 0.5
@@ -0,0 +1,291 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import logging
+from pathlib import Path
+import sqlite3
+import sys
+from types import SimpleNamespace
+
+import discord
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from cogs.events import EventTicketing, QueueButton
+from database.memory import MemoryDatabaseManager
+from helpers.admission import AdmissionController
+from helpers.deferral import LatencyBudget
+
+
+def create_cog(database, **limits):
+    bot = SimpleNamespace(
+        database=database,
+        logger=logging.getLogger("test_event_list"),
+        background_task_errors=None,
+        admission=AdmissionController(**limits),
+        latency_budget=LatencyBudget(),
+    )
+    return EventTicketing(bot)
+
+
+class FakeClick:
+    """A button click answered with `response.send_message`, or a followup once deferred."""
+
+    def __init__(self, replies, guild_id=1, user_id=5, age=0.0):
+        self.guild = SimpleNamespace(id=guild_id)
+        self.user = SimpleNamespace(id=user_id)
+        self.created_at = datetime.now(timezone.utc) - timedelta(seconds=age)
+        self.deferred = None
+        self.response = SimpleNamespace(
+            is_done=lambda: self.deferred is not None,
+            defer=self.defer,
+            send_message=self.reply,
+        )
+        self.followup = SimpleNamespace(send=self.reply)
+        self.replies = replies
+
+    async def defer(self, ephemeral=False, thinking=False):
+        self.deferred = (ephemeral, thinking)
+
+    async def reply(self, content, ephemeral=False):
+        self.replies.append(content)
+
+
+def test_event_list_pages_and_filters():
+    async def runner():
+        database = MemoryDatabaseManager()
+        for number in range(12):
+            await database.create_event(
+                guild_id=1,
+                name=f"Event {number}",
+                created_by=1,
+                source="manual",
+                date="2999-01-01" if number % 2 else "2000-01-01",
+                city="Denver" if number < 3 else "Austin",
+            )
+        cog = create_cog(database)
+
+        async def uncounted(event_id):
+            raise AssertionError("queue sizes come with the event list")
+
+        database.get_queue_size = uncounted
+        embed, total, page = await cog.event_list_page(1, 0)
+        assert (total, page, len(embed.fields)) == (12, 0, 10)
+        assert embed.footer.text == "Page 1/2 · 12 events"
+
+        # Pages past the end show the last one.
+        embed, total, page = await cog.event_list_page(1, 5)
+        assert (page, len(embed.fields)) == (1, 2)
+
+        async def unfiltered(guild_id):
+            raise AssertionError("upcoming events are listed by the database")
+
+        listed = database.list_events_with_stats
+        database.list_events_with_stats = unfiltered
+        cog.guild_events.clear()
+        embed, total, _ = await cog.event_list_page(1, 0, upcoming=True)
+        assert total == 6
+        database.list_events_with_stats = listed
+        cog.guild_events.clear()
+        embed, total, _ = await cog.event_list_page(1, 0, city="denver")
+        # Events are listed by date.
+        assert [field.name.split(" — ")[1] for field in embed.fields] == [
+            "Event 0",
+            "Event 2",
+            "Event 1",
+        ]
+        embed, total, _ = await cog.event_list_page(1, 0, upcoming=True, city="Denver")
+        assert total == 1
+
+        _, total, _ = await cog.event_list_page(2, 0)
+        assert total == 0
+
+    asyncio.run(runner())
+
+
+def test_event_list_cache_is_invalidated():
+    async def runner():
+        database = MemoryDatabaseManager()
+        event_id = await database.create_event(
+            guild_id=1, name="Drop", created_by=1, source="manual"
+        )
+        cog = create_cog(database)
+        event = await database.get_event(1, event_id)
+
+        first, _, _ = await cog.event_list_page(1, 0)
+        assert (await cog.event_list_page(1, 0))[0] is first
+        assert "Queue length: 0" in first.fields[0].value
+
+        await database.add_buyer_to_queue(event_id, 5)
+        cog._queue_changed(event)
+        embed, _, _ = await cog.event_list_page(1, 0)
+        assert "Queue length: 1" in embed.fields[0].value
+
+        second = await database.create_event(
+            guild_id=1, name="Second", created_by=1, source="manual"
+        )
+        assert (await cog.event_list_page(1, 0))[1] == 1
+        cog._event_added(1, second, "Second")
+        assert (await cog.event_list_page(1, 0))[1] == 2
+
+    asyncio.run(runner())
+
+
+def test_queue_buttons_route_by_custom_id():
+    async def runner():
+        database = MemoryDatabaseManager()
+        event_id = await database.create_event(
+            guild_id=1, name="Drop", created_by=1, source="manual"
+        )
+        cog = create_cog(database, user_burst=10)
+
+        view = QueueButton.view(event_id)
+        custom_ids = [item.item.custom_id for item in view.children]
+        assert custom_ids == [
+            f"queue:join:{event_id}",
+            f"queue:leave:{event_id}",
+            f"queue:position:{event_id}",
+        ]
+        match = QueueButton.__discord_ui_compiled_template__.fullmatch(custom_ids[0])
+        button = await QueueButton.from_custom_id(None, None, match)
+        assert (button.action, button.event_id) == ("join", event_id)
+
+        replies = []
+
+        def click(action, clicked_event_id=event_id, guild_id=1):
+            interaction = FakeClick(replies, guild_id=guild_id)
+            return cog.queue_button(interaction, action, clicked_event_id)
+
+        await click("join")
+        await click("join")
+        await click("position")
+        await click("leave")
+        await click("leave")
+        await click("join", guild_id=2)
+        assert replies == [
+            "You joined the queue for **Drop** at position `1`.",
+            "You're already in the queue for **Drop** at position `1`.",
+            "You're at position `1` of 1 in the queue for **Drop**.",
+            "Removed you from the queue for **Drop**.",
+            "You're not in the queue for **Drop**.",
+            "This event no longer exists.",
+        ]
+        assert cog.bot.admission.in_flight == 0
+        await cog.join_pipeline.close()
+
+    asyncio.run(runner())
+
+
+def test_queue_buttons_are_admitted_deferred_and_fail_gracefully():
+    async def runner():
+        database = MemoryDatabaseManager()
+        event_id = await database.create_event(
+            guild_id=1, name="Drop", created_by=1, source="manual"
+        )
+        cog = create_cog(database, user_rate=0.5, user_burst=1)
+        replies = []
+
+        # A slow handler on an old click is deferred privately and answered with a followup.
+        cog.bot.latency_budget.record("queue_button position", 2.0)
+        late = FakeClick(replies, age=1.0)
+        await cog.queue_button(late, "position", event_id)
+        assert late.deferred == (True, True)
+        assert replies == ["You're not in the queue for **Drop**."]
+
+        # The user's only token is spent, so the next click is shed.
+        await cog.queue_button(FakeClick(replies), "position", event_id)
+        assert replies[-1].startswith("The bot is busy right now")
+
+        async def broken(event_id, user_id):
+            raise sqlite3.OperationalError("database is locked")
+
+        cog = create_cog(database)
+
+        async def not_added(event_id, user_id):
+            return False, 0
+
+        cog.join_pipeline.join = not_added
+        await cog.queue_button(FakeClick(replies), "join", event_id)
+        assert replies[-1] == "I couldn't add you to the queue for **Drop**, please try again."
+
+        database.get_queue_position = broken
+        await cog.queue_button(FakeClick(replies), "position", event_id)
+        assert replies[-1] == "Queues are unavailable right now, please try again later."
+
+        async def rejected_defer(ephemeral=False, thinking=False):
+            raise discord.HTTPException(SimpleNamespace(status=500, reason="error"), "error")
+
+        cog.bot.latency_budget.record("queue_button leave", 5.0)
+        click = FakeClick(replies)
+        click.response.defer = rejected_defer
+        await cog.queue_button(click, "leave", event_id)
+        assert replies[-1] == "Queues are unavailable right now, please try again later."
+        assert cog.bot.admission.in_flight == 0
+        await cog.join_pipeline.close()
+
+    asyncio.run(runner())
+
+
+def test_status_messages_restore_only_owned_guilds():
+    async def runner():
+        database = MemoryDatabaseManager()
+        # Two shards, this process runs shard 0.
+        owned, other = 2 << 22, 1 << 22
+        upcoming = await database.create_event(
+            guild_id=owned, name="Upcoming", created_by=1, source="manual", date="2999-01-01"
+        )
+        over = await database.create_event(
+            guild_id=owned, name="Over", created_by=1, source="manual", date="2000-01-01"
+        )
+        elsewhere = await database.create_event(
+            guild_id=other, name="Elsewhere", created_by=1, source="manual"
+        )
+        for event_id in (upcoming, over, elsewhere, 999):
+            await database.set_status_message(event_id, 10, 100 + event_id)
+
+        cog = create_cog(database)
+
+        async def ready():
+            pass
+
+        cog.bot.wait_until_ready = ready
+        cog.bot.shard_ids, cog.bot.shard_count = [0], 2
+        refreshed = []
+        cog.status_board.changed = refreshed.append
+        await cog.restore_status_messages()
+
+        assert list(cog.status_board.messages) == [upcoming] == refreshed
+        # Rows of gone or past events are dropped, those of other shards are left alone.
+        assert [row["event_id"] for row in await database.list_status_messages()] == [
+            upcoming,
+            elsewhere,
+        ]
+        await cog.join_pipeline.close()
+
+    asyncio.run(runner())
+
+
+def test_event_id_autocomplete():
+    async def runner():
+        database = MemoryDatabaseManager()
+        first = await database.create_event(
+            guild_id=1, name="Porter Robinson", created_by=1, source="manual"
+        )
+        cog = create_cog(database)
+        interaction = SimpleNamespace(guild=SimpleNamespace(id=1))
+
+        choices = await cog.event_id_autocomplete(interaction, "rob")
+        assert [(choice.name, choice.value) for choice in choices] == [
+            (f"Porter Robinson (#{first})", first)
+        ]
+
+        # New events are added to the built index without reloading the guild.
+        second = await database.create_event(
+            guild_id=1, name="Robin Schulz " + "x" * 120, created_by=1, source="manual"
+        )
+        cog._event_added(1, second, "Robin Schulz " + "x" * 120)
+        choices = await cog.event_id_autocomplete(interaction, "robin")
+        assert [choice.value for choice in choices] == [second, first]
+        assert len(choices[0].name) == 100 and choices[0].name.endswith(f"(#{second})")
+
+    asyncio.run(runner())
@@ -0,0 +1,56 @@
+import asyncio
+from pathlib import Path
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from database.memory import MemoryDatabaseManager
+from helpers.join_pipeline import JoinPipeline
+
+
+class CountingBackend(MemoryDatabaseManager):
+    def __init__(self) -> None:
+        super().__init__()
+        self.batches = []
+
+    async def add_buyers_to_queue(self, event_id, user_ids):
+        self.batches.append(list(user_ids))
+        return await super().add_buyers_to_queue(event_id, user_ids)
+
+
+def test_burst_is_written_in_batches():
+    async def runner():
+        backend = CountingBackend()
+        event_id = await backend.create_event(
+            guild_id=1, name="Drop", created_by=1, source="manual"
+        )
+        pipeline = JoinPipeline(lambda: backend, max_window=0.01)
+
+        results = await asyncio.gather(
+            *(pipeline.join(event_id, user_id) for user_id in [1, 2, 3, 2, 4])
+        )
+        assert results == [(True, 1), (True, 2), (True, 3), (False, 2), (True, 4)]
+        assert backend.batches == [[1, 2, 3, 2, 4]]
+
+        # A single join on an idle event is written on its own without waiting.
+        await asyncio.sleep(0.05)
+        assert await pipeline.join(event_id, 5) == (True, 5)
+        await pipeline.close()
+
+    asyncio.run(runner())
+
+
+def test_errors_reach_every_waiting_join():
+    async def runner():
+        class FailingBackend(MemoryDatabaseManager):
+            async def add_buyers_to_queue(self, event_id, user_ids):
+                raise RuntimeError("database is locked")
+
+        pipeline = JoinPipeline(lambda: FailingBackend())
+        results = await asyncio.gather(
+            pipeline.join(1, 1), pipeline.join(1, 2), return_exceptions=True
+        )
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    asyncio.run(runner())
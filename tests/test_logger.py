@@ -0,0 +1,33 @@
+import json
+import logging
+from pathlib import Path
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from helpers.logger import JsonFormatter, LoggingFormatter
+
+
+def make_record(level: int, message: str) -> logging.LogRecord:
+    return logging.LogRecord("discord_bot", level, __file__, 1, message, None, None)
+
+
+def test_console_formatter_colors_by_level():
+    formatter = LoggingFormatter()
+    info = formatter.format(make_record(logging.INFO, "hello"))
+    error = formatter.format(make_record(logging.ERROR, "boom"))
+
+    assert info.endswith("hello")
+    assert LoggingFormatter.blue in info
+    assert LoggingFormatter.red in error
+
+
+def test_json_formatter_emits_one_object_per_line():
+    line = JsonFormatter().format(make_record(logging.WARNING, "queue full"))
+
+    assert "\n" not in line
+    payload = json.loads(line)
+    assert payload["level"] == "WARNING"
+    assert payload["logger"] == "discord_bot"
+    assert payload["message"] == "queue full"
@@ -0,0 +1,27 @@
+from pathlib import Path
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from helpers.memory import MemoryTracker
+
+
+class Leaky:
+    pass
+
+
+def test_report_shows_growth_since_baseline():
+    tracker = MemoryTracker()
+    tracker.start()
+    try:
+        leaked = [Leaky() for _ in range(500)]
+        report = tracker.report({"guilds": 3})
+    finally:
+        tracker.stop()
+
+    growth = {name: delta for name, _, delta in report.types}
+    assert growth.get("Leaky", 0) >= 500
+    assert report.allocations
+    assert "guilds: 3" in report.render()
+    assert len(leaked) == 500
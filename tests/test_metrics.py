@@ -0,0 +1,76 @@
+import asyncio
+from pathlib import Path
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+import aiohttp
+from aiohttp import web
+
+from helpers.metrics import MetricsRegistry, http_trace_config, instrument
+
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry()
+    counter = registry.counter("commands_total", "Commands.", ("command",))
+    histogram = registry.histogram(
+        "latency_seconds", "Latency.", ("command",), buckets=(0.1, 1.0)
+    )
+    counter.inc("queue_join")
+    counter.inc("queue_join")
+    histogram.observe(0.05, "queue_join")
+    histogram.observe(0.5, "queue_join")
+    histogram.observe(5, "queue_join")
+
+    text = registry.render()
+    assert "# TYPE commands_total counter" in text
+    assert 'commands_total{command="queue_join"} 2' in text
+    assert 'latency_seconds_bucket{command="queue_join",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{command="queue_join",le="1"} 2' in text
+    assert 'latency_seconds_bucket{command="queue_join",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{command="queue_join"} 3' in text
+
+
+def test_instrument_times_coroutine_methods():
+    class Target:
+        async def fetch(self, value):
+            return value * 2
+
+    registry = MetricsRegistry()
+    histogram = registry.histogram("calls_seconds", "Calls.", ("method",))
+    target = Target()
+    instrument(target, histogram)
+
+    assert asyncio.run(target.fetch(21)) == 42
+    assert histogram.count("fetch") == 1
+
+
+def test_http_trace_config_records_requests():
+    async def handler(request):
+        return web.json_response({})
+
+    async def runner():
+        registry = MetricsRegistry()
+        histogram = registry.histogram(
+            "http_seconds", "HTTP.", ("host", "method", "status")
+        )
+        app = web.Application()
+        app.router.add_get("/api/v10/gateway", handler)
+        server = web.AppRunner(app)
+        await server.setup()
+        site = web.TCPSite(server, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            async with aiohttp.ClientSession(
+                trace_configs=[http_trace_config(histogram)]
+            ) as session:
+                async with session.get(f"http://127.0.0.1:{port}/api/v10/gateway") as response:
+                    assert response.status == 200
+        finally:
+            await server.cleanup()
+        text = registry.render()
+        assert 'http_seconds_count{host="127.0.0.1",method="GET",status="200"} 1' in text
+
+    asyncio.run(runner())
@@ -0,0 +1,33 @@
+import pstats
+from pathlib import Path
+import sys
+import threading
+import time
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from helpers.profiler import SamplingProfiler
+
+
+def spin(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(100))
+
+
+def test_profiler_samples_target_thread(tmp_path):
+    worker = threading.Thread(target=spin, args=(0.3,))
+    worker.start()
+    profiler = SamplingProfiler(interval=0.002, thread_id=worker.ident)
+    profiler.start()
+    worker.join()
+    result = profiler.stop()
+
+    assert result.samples > 0
+    assert any("spin" in line for line in result.collapsed().splitlines())
+
+    pstats_path = tmp_path / "profile.pstats"
+    result.write_pstats(str(pstats_path))
+    stats = pstats.Stats(str(pstats_path))
+    assert any(function[2] == "spin" for function in stats.stats)
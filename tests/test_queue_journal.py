@@ -0,0 +1,217 @@
+import asyncio
+import os
+from pathlib import Path
+import sys
+import time
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from database.journal import RECORD, JournaledQueueManager, QueueJournal
+from database.memory import MemoryDatabaseManager
+
+
+async def open_journal(directory: Path, **kwargs) -> QueueJournal:
+    journal = QueueJournal(str(directory), flush_interval=0, **kwargs)
+    await journal.open()
+    return journal
+
+
+def test_journal_replays_after_restart(tmp_path):
+    async def runner():
+        journal = await open_journal(tmp_path)
+        results = await asyncio.gather(*(journal.join(1, user_id) for user_id in range(5)))
+        assert sorted(position for _, position in results) == [1, 2, 3, 4, 5]
+        assert await journal.join(1, 0) == (False, 1)
+        await journal.leave(1, 2)
+        await journal.join(2, 9)
+        await journal.close()
+
+        restored = await open_journal(tmp_path)
+        assert [entry["user_id"] for entry in restored.entries(1)] == ["0", "1", "3", "4"]
+        assert restored.head(2)["user_id"] == "9"
+        assert await restored.join(1, 7) == (True, 5)
+        await restored.close()
+
+    asyncio.run(runner())
+
+
+def test_journal_compacts_into_snapshots(tmp_path):
+    async def runner():
+        journal = await open_journal(tmp_path, snapshot_every=10)
+        for user_id in range(25):
+            await journal.join(1, user_id)
+        for user_id in range(0, 25, 2):
+            await journal.leave(1, user_id)
+        await journal.close()
+        assert journal.generation > 0
+        assert len(list(tmp_path.glob("*.snapshot"))) == 1
+
+        restored = await open_journal(tmp_path, snapshot_every=10)
+        assert [entry["user_id"] for entry in restored.entries(1)] == [
+            str(user_id) for user_id in range(1, 25, 2)
+        ]
+        await restored.close()
+
+    asyncio.run(runner())
+
+
+def test_torn_record_is_dropped(tmp_path):
+    async def runner():
+        journal = await open_journal(tmp_path)
+        await journal.join(1, 1)
+        await journal.join(1, 2)
+        await journal.close()
+        path = tmp_path / "queues-0.journal"
+        with open(path, "r+b") as file:
+            file.truncate(RECORD.size * 2 - 5)
+
+        restored = await open_journal(tmp_path)
+        assert [entry["user_id"] for entry in restored.entries(1)] == ["1"]
+        assert os.path.getsize(path) == RECORD.size
+        assert await restored.join(1, 3) == (True, 2)
+        await restored.close()
+
+    asyncio.run(runner())
+
+
+def test_failed_write_leaves_queue_unchanged(tmp_path):
+    async def runner():
+        journal = await open_journal(tmp_path)
+        await journal.join(1, 1)
+
+        def fail(file, data):
+            raise OSError("disk full")
+
+        journal._write = fail
+        for change in (journal.join(1, 2), journal.leave(1, 1)):
+            try:
+                await change
+            except OSError:
+                pass
+            else:
+                raise AssertionError("the failed write was not reported")
+        assert [entry["user_id"] for entry in journal.entries(1)] == ["1"]
+
+        del journal._write
+        assert await journal.join(1, 2) == (True, 2)
+        await journal.close()
+
+        restored = await open_journal(tmp_path)
+        assert [entry["user_id"] for entry in restored.entries(1)] == ["1", "2"]
+        await restored.close()
+
+    asyncio.run(runner())
+
+
+def test_torn_write_is_cut_off_and_later_records_are_written(tmp_path):
+    async def runner():
+        journal = await open_journal(tmp_path)
+        await journal.join(1, 1)
+
+        def torn(file, data):
+            del journal._write
+            time.sleep(0.05)
+            file.write(data[: RECORD.size // 2])
+            raise OSError("disk full")
+
+        journal._write = torn
+        failed = asyncio.create_task(journal.join(1, 2))
+        await asyncio.sleep(0.02)
+        # Appended while the failing batch is being written.
+        later = asyncio.create_task(journal.join(1, 3))
+        try:
+            await failed
+        except OSError:
+            pass
+        else:
+            raise AssertionError("the failed write was not reported")
+        assert await asyncio.wait_for(later, 1) == (True, 2)
+        await journal.close()
+        assert os.path.getsize(tmp_path / "queues-0.journal") == RECORD.size * 2
+
+        restored = await open_journal(tmp_path)
+        assert [entry["user_id"] for entry in restored.entries(1)] == ["1", "3"]
+        await restored.close()
+
+    asyncio.run(runner())
+
+
+def test_join_after_pending_leave_rejoins(tmp_path):
+    async def runner():
+        journal = await open_journal(tmp_path)
+        await journal.join(1, 1)
+        await journal.join(1, 2)
+        # Both records share one flush, the leave is not applied when the join is answered.
+        _, rejoined = await asyncio.gather(journal.leave(1, 1), journal.join(1, 1))
+        assert rejoined == (True, 2)
+        assert [entry["user_id"] for entry in journal.entries(1)] == ["2", "1"]
+        await journal.close()
+
+    asyncio.run(runner())
+
+
+def test_manager_reports_events_joined_in_the_journal_as_active(tmp_path):
+    async def runner():
+        backend = MemoryDatabaseManager()
+        manager = JournaledQueueManager(backend, await open_journal(tmp_path))
+        old = await manager.create_event(
+            guild_id=1, name="Old", created_by=1, source="manual", date="2000-01-01"
+        )
+        idle = await manager.create_event(
+            guild_id=1, name="Idle", created_by=1, source="manual", date="2000-01-01"
+        )
+        for event_id in (old, idle):
+            backend._events[event_id]["created_at"] = "2000-01-01 00:00:00"
+        await manager.add_buyer_to_queue(old, 5)
+
+        events = await manager.list_active_events("2020-01-01 00:00:00")
+        assert [event["id"] for event in events] == [old]
+        await manager.close()
+
+    asyncio.run(runner())
+
+
+def test_manager_serves_queue_from_journal(tmp_path):
+    async def runner():
+        manager = JournaledQueueManager(
+            MemoryDatabaseManager(), await open_journal(tmp_path)
+        )
+        event_id = await manager.create_event(
+            guild_id=1, name="Journaled", created_by=1, source="manual"
+        )
+        assert await manager.add_buyer_to_queue(event_id, 5) == (True, 1)
+        assert await manager.add_buyer_to_queue(event_id, 6) == (True, 2)
+        await manager.remove_buyer_from_queue(event_id, 5)
+        assert (await manager.get_next_buyer(event_id))["user_id"] == "6"
+        events = await manager.list_events_with_stats(1)
+        assert events[0]["queue_size"] == 1
+        await manager.close()
+
+    asyncio.run(runner())
+
+
+def test_manager_batch_joins_share_one_flush(tmp_path):
+    async def runner():
+        journal = QueueJournal(str(tmp_path), flush_interval=0.02)
+        await journal.open()
+        manager = JournaledQueueManager(MemoryDatabaseManager(), journal)
+        writes = []
+        write = journal._write
+
+        def counted(file, data):
+            writes.append(len(data))
+            write(file, data)
+
+        journal._write = counted
+        started = time.monotonic()
+        results = await manager.add_buyers_to_queue(1, [*range(200), 3])
+        elapsed = time.monotonic() - started
+        assert results[:200] == [(True, position) for position in range(1, 201)]
+        assert results[200] == (False, 4)
+        assert writes == [RECORD.size * 201]
+        # One flush interval, not one per join.
+        assert elapsed < 0.5
+        await manager.close()
+
+    asyncio.run(runner())
@@ -0,0 +1,60 @@
+import asyncio
+from pathlib import Path
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from helpers.queue_status import QueueStatusBoard, StatusMessage
+
+
+def test_changes_are_coalesced_and_unchanged_content_is_skipped():
+    async def runner():
+        sizes = {1: 0}
+        edits = []
+
+        async def render(event_id):
+            return f"{sizes[event_id]} waiting"
+
+        async def publish(message, content):
+            edits.append(content)
+            return True
+
+        board = QueueStatusBoard(render, publish, interval=0.2)
+        board.track(StatusMessage(1, 10, 100, "0 waiting"))
+        board.changed(2)  # Untracked events are ignored.
+
+        for _ in range(50):
+            sizes[1] += 1
+            board.changed(1)
+            await asyncio.sleep(0.002)
+        await asyncio.sleep(0.3)
+        # The first change is published at once, the rest share one edit after the interval.
+        assert len(edits) <= 3
+        assert edits[-1] == "50 waiting"
+
+        board.changed(1)
+        await asyncio.sleep(0.3)
+        assert edits[-1] == "50 waiting" and board.skipped >= 1
+        assert board.edits == len(edits)
+        await board.close()
+
+    asyncio.run(runner())
+
+
+def test_deleted_messages_are_untracked():
+    async def runner():
+        async def render(event_id):
+            return "content"
+
+        async def publish(message, content):
+            return False
+
+        board = QueueStatusBoard(render, publish, interval=0)
+        board.track(StatusMessage(1, 10, 100))
+        board.changed(1)
+        await asyncio.sleep(0.01)
+        assert board.messages == {}
+        await board.close()
+
+    asyncio.run(runner())
@@ -0,0 +1,103 @@
+import asyncio
+from pathlib import Path
+import sys
+
+import aiosqlite
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from database import DatabaseManager
+from database.remote import DatabaseServer, RemoteDatabaseManager, cluster_storage_problem
+
+
+async def create_owner(database_path: Path) -> DatabaseManager:
+    schema_path = PROJECT_ROOT / "database" / "schema.sql"
+    connection = await aiosqlite.connect(database_path)
+    await connection.execute("PRAGMA journal_mode=WAL")
+    with open(schema_path, "r", encoding="utf-8") as schema_file:
+        await connection.executescript(schema_file.read())
+    manager = DatabaseManager(connection=connection)
+    await manager.enable_foreign_keys()
+    return manager
+
+
+async def create_worker(database_path: Path, socket_path: Path) -> RemoteDatabaseManager:
+    manager = RemoteDatabaseManager(
+        connection=await aiosqlite.connect(database_path),
+        socket_path=str(socket_path),
+    )
+    await manager.connect(timeout=5)
+    return manager
+
+
+def test_workers_write_through_owner_and_read_locally(tmp_path):
+    async def runner():
+        database_path = tmp_path / "database.db"
+        socket_path = tmp_path / "database.sock"
+        owner = await create_owner(database_path)
+        server = DatabaseServer(owner, str(socket_path))
+        await server.start()
+        workers = [
+            await create_worker(database_path, socket_path) for _ in range(2)
+        ]
+        try:
+            event_id = await workers[0].create_event(
+                guild_id=1, name="Cluster Event", created_by=1, source="manual"
+            )
+            event = await workers[1].get_event(1, event_id)
+            assert event is not None
+            assert event["name"] == "Cluster Event"
+
+            results = await asyncio.gather(
+                *(
+                    workers[user_id % 2].add_buyer_to_queue(event_id, user_id)
+                    for user_id in range(20)
+                )
+            )
+            assert all(added for added, _ in results)
+            assert sorted(position for _, position in results) == list(range(1, 21))
+
+            added, position = await workers[1].add_buyer_to_queue(event_id, 0)
+            assert added is False
+            assert position == results[0][1]
+
+            queue = await workers[1].list_queue(event_id)
+            assert len(queue) == 20
+        finally:
+            for worker in workers:
+                await worker.close()
+            await server.close()
+            await owner.close()
+
+    asyncio.run(runner())
+
+
+def test_read_methods_are_not_served(tmp_path):
+    async def runner():
+        database_path = tmp_path / "database.db"
+        socket_path = tmp_path / "database.sock"
+        owner = await create_owner(database_path)
+        server = DatabaseServer(owner, str(socket_path))
+        await server.start()
+        worker = await create_worker(database_path, socket_path)
+        try:
+            try:
+                await worker._call("close")
+            except RuntimeError as e:
+                assert "cannot be called remotely" in str(e)
+            else:
+                raise AssertionError("close should not be callable remotely")
+        finally:
+            await worker.close()
+            await server.close()
+            await owner.close()
+
+    asyncio.run(runner())
+
+
+def test_process_local_storage_is_refused_in_cluster_mode():
+    assert cluster_storage_problem({}) is None
+    assert cluster_storage_problem({"DATABASE_BACKEND": "sqlite", "QUEUE_ENGINE": "sqlite"}) is None
+    assert "DATABASE_BACKEND=memory" in cluster_storage_problem({"DATABASE_BACKEND": "Memory"})
+    assert "QUEUE_ENGINE=journal" in cluster_storage_problem({"QUEUE_ENGINE": "journal"})
@@ -0,0 +1,126 @@
+import asyncio
+from pathlib import Path
+import sqlite3
+import sys
+
+import aiosqlite
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from database import DatabaseManager
+from database.sharding import (
+    ShardedDatabaseManager,
+    shard_for_event,
+    shard_for_guild,
+    split_database,
+)
+
+
+def test_events_are_routed_to_their_guild_shard(tmp_path):
+    async def runner():
+        manager = ShardedDatabaseManager(directory=str(tmp_path), shards=3, max_open=2)
+        try:
+            event_ids = {}
+            for guild_id in range(10, 20):
+                event_ids[guild_id] = await manager.create_event(
+                    guild_id=guild_id,
+                    name=f"Event {guild_id}",
+                    created_by=1,
+                    source="manual",
+                )
+                assert len(manager.open_shards) <= 2
+
+            assert len(set(event_ids.values())) == len(event_ids)
+            for guild_id, event_id in event_ids.items():
+                assert shard_for_event(event_id, 3) == shard_for_guild(guild_id, 3)
+                event = await manager.get_event(guild_id, event_id)
+                assert event is not None
+                assert event["name"] == f"Event {guild_id}"
+
+            event_id = event_ids[10]
+            assert await manager.get_event(11, event_id) is None
+            assert await manager.add_buyer_to_queue(event_id, 1) == (True, 1)
+            assert await manager.add_buyer_to_queue(event_id, 2) == (True, 2)
+            assert await manager.add_buyer_to_queue(event_id, 1) == (False, 1)
+            next_buyer = await manager.get_next_buyer(event_id)
+            assert next_buyer["user_id"] == "1"
+            assert (await manager.queue_sizes())[event_id] == 2
+        finally:
+            await manager.close()
+
+    asyncio.run(runner())
+
+
+def test_split_database(tmp_path):
+    async def runner():
+        source = tmp_path / "database.db"
+        connection = await aiosqlite.connect(source)
+        with open(PROJECT_ROOT / "database" / "schema.sql", encoding="utf-8") as file:
+            await connection.executescript(file.read())
+        single = DatabaseManager(connection=connection)
+        old_ids = {}
+        for guild_id in (1, 2, 3, 4):
+            old_ids[guild_id] = await single.create_event(
+                guild_id=guild_id, name=f"Event {guild_id}", created_by=1, source="manual"
+            )
+            await single.add_buyer_to_queue(old_ids[guild_id], 100)
+            await single.add_buyer_to_queue(old_ids[guild_id], 200)
+        await single.add_warn(5, 2, 6, "spam")
+        await single.close()
+
+        mapping = split_database(str(source), str(tmp_path / "shards"), 2)
+
+        manager = ShardedDatabaseManager(directory=str(tmp_path / "shards"), shards=2)
+        try:
+            for guild_id, old_id in old_ids.items():
+                new_id = mapping[old_id]
+                event = await manager.get_event(guild_id, new_id)
+                assert event["name"] == f"Event {guild_id}"
+                queue = await manager.list_queue(new_id)
+                assert [entry["user_id"] for entry in queue] == ["100", "200"]
+            assert len(await manager.get_warnings(5, 2)) == 1
+        finally:
+            await manager.close()
+
+    asyncio.run(runner())
+
+
+def test_split_database_fills_start_times_of_old_databases(tmp_path):
+    async def runner():
+        source = tmp_path / "database.db"
+        connection = sqlite3.connect(source)
+        with open(PROJECT_ROOT / "database" / "schema.sql", encoding="utf-8") as file:
+            connection.executescript(file.read())
+        # Databases from before starts_at existed.
+        connection.executescript(
+            """
+            DROP INDEX idx_events_guild_starts_at;
+            DROP INDEX idx_events_starts_at;
+            ALTER TABLE events DROP COLUMN starts_at;
+            """
+        )
+        connection.execute(
+            "INSERT INTO events (guild_id, name, date, source, created_by) VALUES (?, ?, ?, ?, ?)",
+            ("1", "Dated", "2999-01-01", "manual", "1"),
+        )
+        connection.execute(
+            "INSERT INTO events (guild_id, name, date, source, created_by) VALUES (?, ?, ?, ?, ?)",
+            ("1", "Undated", "soon", "manual", "1"),
+        )
+        connection.commit()
+        connection.close()
+
+        mapping = split_database(str(source), str(tmp_path / "shards"), 2)
+
+        manager = ShardedDatabaseManager(directory=str(tmp_path / "shards"), shards=2)
+        try:
+            dated = await manager.get_event(1, mapping[1])
+            assert dated["starts_at"] == 32472144000
+            assert (await manager.get_event(1, mapping[2]))["starts_at"] is None
+            upcoming = await manager.list_upcoming_events(1)
+            assert [event["name"] for event in upcoming] == ["Dated"]
+        finally:
+            await manager.close()
+
+    asyncio.run(runner())
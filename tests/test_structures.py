@@ -0,0 +1,31 @@
+from pathlib import Path
+import random
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from database.structures import RankedQueue
+
+
+def test_ranked_queue_matches_a_list():
+    generator = random.Random(1234)
+    queue = RankedQueue()
+    expected = []
+    for key in range(2000):
+        if expected and generator.random() < 0.4:
+            removed = generator.choice(expected)
+            expected.remove(removed)
+            assert queue.remove(removed)
+        else:
+            assert queue.append(key, key * 2) == len(expected) + 1
+            expected.append(key)
+
+    assert len(queue) == len(expected)
+    assert [key for key, _ in queue] == expected
+    for position, key in enumerate(expected, start=1):
+        assert queue.rank(key) == position
+        assert queue.select(position) == (key, key * 2)
+    assert [key for key, _ in queue.slice(10, 5)] == expected[9:14]
+    assert queue.rank(-1) == 0
+    assert queue.select(len(expected) + 1) is None
@@ -0,0 +1,45 @@
+import asyncio
+import logging
+from pathlib import Path
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from helpers.metrics import MetricsRegistry
+from helpers.tasks import BackgroundTasks
+
+
+def test_background_tasks_limit_report_and_cancel(caplog):
+    async def runner():
+        registry = MetricsRegistry()
+        errors = registry.counter("errors", "", ("group", "task"))
+        tasks = BackgroundTasks("events", limit=2, errors=errors)
+        running = 0
+        peak = 0
+
+        async def work():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        async def fail():
+            raise RuntimeError("DMs are closed")
+
+        for _ in range(5):
+            tasks.spawn(work(), name="work")
+        tasks.spawn(fail(), name="notify")
+        await asyncio.sleep(0.1)
+        assert peak == 2
+        assert len(tasks) == 0
+        assert 'errors{group="events",task="notify"} 1' in registry.render()
+
+        blocked = tasks.spawn(asyncio.sleep(60), name="sleep")
+        await tasks.close()
+        assert blocked.cancelled()
+
+    with caplog.at_level(logging.ERROR):
+        asyncio.run(runner())
+    assert "Background task notify of events failed" in caplog.text
@@ -0,0 +1,41 @@
+import asyncio
+from pathlib import Path
+import sys
+from types import SimpleNamespace
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from database.memory import MemoryDatabaseManager
+from helpers.warmup import warm_up
+
+
+def test_warm_up_loads_active_events_within_budget():
+    async def runner():
+        database = MemoryDatabaseManager()
+        upcoming = await database.create_event(
+            guild_id=1, name="Upcoming", created_by=1, source="manual", date="2999-01-01"
+        )
+        busy = await database.create_event(
+            guild_id=1, name="Busy", created_by=1, source="manual"
+        )
+        stale = await database.create_event(
+            guild_id=1, name="Stale", created_by=1, source="manual", date="2000-01-01"
+        )
+        for event_id in (upcoming, busy, stale):
+            database._events[event_id]["created_at"] = "2000-01-01 00:00:00"
+        await database.add_buyers_to_queue(busy, range(10))
+        await database.add_buyers_to_queue(upcoming, range(3))
+
+        bot = SimpleNamespace(database=database, get_guild=lambda guild_id: None)
+        cache = {}
+        report = await warm_up(bot, cache, max_entries=5)
+
+        assert sorted(cache) == [upcoming, busy]
+        assert report.events == 2
+        assert report.queues == 1 and report.buyers == 3
+        assert report.skipped_queues == 1
+        assert not report.timed_out
+        assert "2 events" in str(report)
+
+    asyncio.run(runner())
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+from pathlib import Path
+import sys
+import time
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from helpers.metrics import MetricsRegistry
+from helpers.watchdog import LoopWatchdog
+
+
+class ListHandler(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.messages.append(record.getMessage())
+
+
+def create_watchdog():
+    logger = logging.getLogger("test_watchdog")
+    logger.propagate = False
+    handler = ListHandler()
+    logger.handlers = [handler]
+    registry = MetricsRegistry()
+    stalls = registry.counter("stalls_total", "Stalls.")
+    watchdog = LoopWatchdog(
+        logger=logger, interval=0.02, threshold=0.1, stall_counter=stalls
+    )
+    return watchdog, handler, registry
+
+
+def blocking_call():
+    time.sleep(0.4)
+
+
+def test_blocked_loop_is_reported_with_stack():
+    async def runner():
+        watchdog, handler, registry = create_watchdog()
+        watchdog.start()
+        try:
+            await asyncio.sleep(0.05)
+            blocking_call()
+            await asyncio.sleep(0.05)
+        finally:
+            watchdog.stop()
+
+        assert len(handler.messages) == 1
+        assert handler.messages[0].startswith("Event loop blocked for over")
+        # The stack is captured while the blocking call is still running.
+        assert "blocking_call" in handler.messages[0]
+        assert "stalls_total 1" in registry.render()
+        assert watchdog.max_lag >= 0.3
+
+    asyncio.run(runner())
+
+
+def test_healthy_loop_reports_nothing():
+    async def runner():
+        watchdog, handler, registry = create_watchdog()
+        watchdog.start()
+        try:
+            for _ in range(20):
+                await asyncio.sleep(0.01)
+        finally:
+            watchdog.stop()
+
+        assert handler.messages == []
+        assert "stalls_total 1" not in registry.render()
+        assert watchdog.max_lag < 0.1
+
+    asyncio.run(runner())